@@ -34,7 +34,7 @@ class BankAccountAdmin(admin.ModelAdmin):
 
 @admin.register(SalaryComponent)
 class SalaryComponentAdmin(admin.ModelAdmin):
-    list_display = ("name", "code", "component_type", "mode")
+    list_display = ("name", "code", "component_type", "mode", "formula")
     search_fields = ("name", "code")
 
 
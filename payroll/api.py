@@ -0,0 +1,292 @@
+"""
+Read-only JSON API over employees, salary structures and monthly salaries.
+
+Every resource is listed in ``(updated_at, id)`` order with keyset cursors:
+the ``next`` cursor of a page points after its last row, so a sync that
+keeps the last cursor it received later pulls only the rows created or
+changed since. Writes to lines and adjustments touch their parent's
+``updated_at`` so they are picked up too. Deleting a row through the ORM
+leaves a DeletedRecord, listed the same way by the ``deleted`` resource.
+
+``updated_at`` is set before the writing transaction commits, so a row may
+become visible with a timestamp older than rows already synced. Pages
+therefore stop ``PAYROLL_API_SYNC_LAG_SECONDS`` in the past, which must
+exceed the longest write transaction.
+
+``?fields=`` selects the fields to return; only the columns and nested lists
+asked for are read, and a page costs one query plus one per nested list,
+whatever its size. ``Page.etag`` is known after the first query, before any
+nested list is read or the page is rendered.
+"""
+
+import base64
+import hashlib
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import (
+    DeletedRecord,
+    Employee,
+    MonthlySalary,
+    MonthlySalaryLine,
+    PayrollAdjustment,
+    SalaryStructure,
+    SalaryStructureLine,
+)
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+DEFAULT_SYNC_LAG_SECONDS = 60
+# Resource listing the tombstones of the others.
+DELETED = "deleted"
+
+
+class ApiError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Nested:
+    """A list of child rows embedded in each parent row."""
+
+    model: type
+    parent: str
+    fields: dict
+
+
+@dataclass(frozen=True)
+class Resource:
+    model: type
+    # Public field name -> column or lookup passed to ``values()``.
+    fields: dict
+    nested: dict = field(default_factory=dict)
+    # Query parameter -> lookup it filters on.
+    filters: dict = field(default_factory=dict)
+    # Column the keyset cursor follows, with ``id``.
+    timestamp: str = "updated_at"
+
+
+LINE_FIELDS = {"component": "salary_component__code", "amount": "amount"}
+
+RESOURCES = {
+    "employees": Resource(
+        model=Employee,
+        fields={
+            "id": "id",
+            "employee_id": "employee_id",
+            "name": "name",
+            "is_active": "is_active",
+            "updated_at": "updated_at",
+        },
+        filters={"is_active": "is_active"},
+    ),
+    "salary_structures": Resource(
+        model=SalaryStructure,
+        fields={
+            "id": "id",
+            "employee": "employee__employee_id",
+            "effective_date": "effective_date",
+            "end_date": "end_date",
+            "is_active": "is_active",
+            "basic_pay": "basic_pay",
+            "gross_amount": "gross_amount",
+            "net_amount": "net_amount",
+            "total_earnings": "total_earnings",
+            "total_deductions": "total_deductions",
+            "description": "description",
+            "updated_at": "updated_at",
+        },
+        nested={
+            "lines": Nested(SalaryStructureLine, "salary_structure_id", LINE_FIELDS)
+        },
+        filters={"employee": "employee__employee_id", "is_active": "is_active"},
+    ),
+    "monthly_salaries": Resource(
+        model=MonthlySalary,
+        fields={
+            "id": "id",
+            "employee": "employee__employee_id",
+            "salary_structure": "salary_structure_id",
+            "payroll_run": "payroll_run_id",
+            "month": "month",
+            "year": "year",
+            "gross_amount": "gross_amount",
+            "net_amount": "net_amount",
+            "updated_at": "updated_at",
+        },
+        nested={
+            "lines": Nested(MonthlySalaryLine, "monthly_salary_id", LINE_FIELDS),
+            "adjustments": Nested(
+                PayrollAdjustment,
+                "monthly_salary_id",
+                {
+                    "amount": "adjustment_amount",
+                    "reason": "reason",
+                    "salary_structure": "salary_structure_id",
+                    "created_at": "created_at",
+                },
+            ),
+        },
+        filters={"employee": "employee__employee_id", "month": "month", "year": "year"},
+    ),
+    DELETED: Resource(
+        model=DeletedRecord,
+        fields={
+            "id": "id",
+            "resource": "resource",
+            "object_id": "object_id",
+            "deleted_at": "deleted_at",
+        },
+        filters={"resource": "resource"},
+        timestamp="deleted_at",
+    ),
+}
+
+
+def record_deletion(sender, instance, **kwargs):
+    """Signal receiver leaving a DeletedRecord for a row of a resource."""
+    for name, resource in RESOURCES.items():
+        if resource.model is sender:
+            DeletedRecord.objects.create(resource=name, object_id=instance.pk)
+
+
+def encode_cursor(updated_at, pk):
+    payload = json.dumps([updated_at.isoformat(), pk]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return the ``(updated_at, id)`` a cursor points after."""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        updated_at, pk = json.loads(payload)
+        return datetime.fromisoformat(updated_at), int(pk)
+    except (ValueError, TypeError):
+        raise ApiError(f"Invalid cursor {cursor!r}.")
+
+
+def _selected_fields(resource, fields):
+    if not fields:
+        return list(resource.fields), list(resource.nested)
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = set(names) - resource.fields.keys() - resource.nested.keys()
+    if unknown:
+        raise ApiError(f"Unknown fields: {', '.join(sorted(unknown))}.")
+    return (
+        [name for name in names if name in resource.fields],
+        [name for name in names if name in resource.nested],
+    )
+
+
+def _nested_rows(nested, parent_ids):
+    rows = {}
+    names = list(nested.fields)
+    for parent_id, *values in (
+        nested.model.objects.filter(**{f"{nested.parent}__in": parent_ids})
+        .order_by(nested.parent, "id")
+        .values_list(nested.parent, *nested.fields.values())
+    ):
+        rows.setdefault(parent_id, []).append(dict(zip(names, values)))
+    return rows
+
+
+@dataclass
+class Page:
+    resource: Resource
+    columns: dict
+    nested: list
+    # ``(id, timestamp, *columns)`` of each row.
+    rows: list
+    has_more: bool
+    next: str
+
+    @property
+    def etag(self):
+        """
+        Fingerprint of the page from its rows' ids and timestamps, which
+        change with any field or nested row.
+        """
+        payload = repr(
+            (
+                list(self.columns),
+                self.nested,
+                [(pk, timestamp.isoformat()) for pk, timestamp, *_ in self.rows],
+                self.has_more,
+                self.next,
+            )
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def as_dict(self):
+        """The page as a JSON-ready dict, reading its nested lists."""
+        results = [dict(zip(self.columns, values)) for _, _, *values in self.rows]
+        for nested_name in self.nested:
+            children = _nested_rows(
+                self.resource.nested[nested_name], [row[0] for row in self.rows]
+            )
+            for (pk, *_), result in zip(self.rows, results):
+                result[nested_name] = children.get(pk, [])
+        return {"results": results, "next": self.next, "has_more": self.has_more}
+
+
+def read_page(name, params, now=None):
+    """
+    Read one page of the resource ``name`` with a single query. ``params``
+    holds ``fields``, ``cursor``, ``limit`` and the resource's filters. Raise
+    ApiError for bad parameters.
+    """
+    resource = RESOURCES[name]
+    fields, nested = _selected_fields(resource, params.get("fields"))
+    try:
+        limit = int(params.get("limit") or DEFAULT_LIMIT)
+    except ValueError:
+        raise ApiError("limit must be a number.")
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ApiError(f"limit must be between 1 and {MAX_LIMIT}.")
+
+    try:
+        queryset = resource.model.objects.filter(
+            **{
+                lookup: params[param]
+                for param, lookup in resource.filters.items()
+                if params.get(param)
+            }
+        )
+    except (ValueError, ValidationError) as exc:
+        raise ApiError(f"Invalid filter: {exc}")
+    timestamp = resource.timestamp
+    lag = getattr(settings, "PAYROLL_API_SYNC_LAG_SECONDS", DEFAULT_SYNC_LAG_SECONDS)
+    queryset = queryset.filter(
+        **{f"{timestamp}__lte": (now or timezone.now()) - timedelta(seconds=lag)}
+    )
+    cursor = params.get("cursor")
+    if cursor:
+        after, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(**{f"{timestamp}__gt": after}) | Q(**{timestamp: after, "pk__gt": pk})
+        )
+    columns = {name: resource.fields[name] for name in fields}
+    rows = list(
+        queryset.order_by(timestamp, "id").values_list(
+            "id", timestamp, *columns.values()
+        )[: limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        cursor = encode_cursor(rows[-1][1], rows[-1][0])
+    return Page(resource, columns, nested, rows, has_more, cursor or None)
+
+
+def list_page(name, params, now=None):
+    """
+    One page of the resource ``name`` as a JSON-ready dict with ``results``,
+    ``next`` and ``has_more``, see ``read_page``.
+    """
+    return read_page(name, params, now).as_dict()
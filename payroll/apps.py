@@ -4,3 +4,50 @@ from django.apps import AppConfig
 class PayrollConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'payroll'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from . import api, page_cache
+        from .models import (
+            BankAccount,
+            Employee,
+            SalaryComponent,
+            SalaryStructure,
+            SalaryStructureLine,
+        )
+        from .registry import invalidate_components
+
+        post_save.connect(
+            invalidate_components,
+            sender=SalaryComponent,
+            dispatch_uid="payroll.registry.save",
+        )
+        post_delete.connect(
+            invalidate_components,
+            sender=SalaryComponent,
+            dispatch_uid="payroll.registry.delete",
+        )
+
+        # Cached employee pages follow every model shown on them.
+        page_receivers = [
+            (SalaryComponent, page_cache.invalidate_components),
+            (Employee, page_cache.invalidate_employee),
+            (SalaryStructure, page_cache.invalidate_employee_of),
+            (BankAccount, page_cache.invalidate_employee_of),
+            (SalaryStructureLine, page_cache.invalidate_structure_employee),
+        ]
+        for model, receiver in page_receivers:
+            uid = f"payroll.page_cache.{model._meta.model_name}"
+            post_save.connect(receiver, sender=model, dispatch_uid=f"{uid}.save")
+            post_delete.connect(receiver, sender=model, dispatch_uid=f"{uid}.delete")
+
+        # Deleted rows of the sync API leave tombstones.
+        for name, resource in api.RESOURCES.items():
+            if name == api.DELETED:
+                continue
+            post_delete.connect(
+                api.record_deletion,
+                sender=resource.model,
+                dispatch_uid=f"payroll.api.{resource.model._meta.model_name}.delete",
+            )
@@ -0,0 +1,187 @@
+"""
+Arrears for back-dated salary structures.
+
+A month is paid from the structure in force on its first day. When a
+structure is created or changed after months it covers were paid, those
+salaries were computed from the wrong amounts. ``compute_arrears`` finds the
+paid months each structure covers with one range query per chunk of
+structures, calculates every structure once, and writes the difference
+between its net pay and what each month paid as a PayrollAdjustment linked to
+the structure, adding it to the month's net pay. The month was paid out
+already, so the bank file of the next payroll run to complete pays the
+arrears as a record of their own, see SalaryPayment. Arrears already written
+for a month count as paid, so running it again only adds what changed since.
+An incremental payroll rerun that recomputes a month replaces its arrears,
+see ``payroll.engine.compute_structures``.
+"""
+
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from . import money
+from .engine import (
+    DEFAULT_BACKEND,
+    DEFAULT_CHUNK_SIZE,
+    get_backend,
+    iter_structure_chunks,
+)
+from .models import (
+    MonthlySalary,
+    MonthlySalaryLine,
+    PayrollAdjustment,
+    SalaryComponent,
+    SalaryStructure,
+)
+from .registry import component_registry
+from .reports import refresh_summaries
+
+
+@dataclass
+class ArrearsResult:
+    dry_run: bool = False
+    structures: int = 0
+    salaries_checked: int = 0
+    adjustments_created: int = 0
+    total: Decimal = Decimal("0.00")
+    # Arrears per (year, month).
+    periods: dict = field(default_factory=dict)
+
+
+def first_covered_month(effective_date):
+    """``(year, month)`` of the first month starting on or after a date."""
+    if effective_date.day == 1:
+        return effective_date.year, effective_date.month
+    if effective_date.month == 12:
+        return effective_date.year + 1, 1
+    return effective_date.year, effective_date.month + 1
+
+
+def covers(effective_date, end_date, year, month):
+    """Whether a structure is in force on the first day of the month."""
+    start = date(year, month, 1)
+    return effective_date <= start and (end_date is None or end_date >= start)
+
+
+def _paid_totals(rows):
+    return {salary_id: total or 0 for salary_id, total in rows}
+
+
+def _arrears_chunk(chunk, calculate_structures, now, created_by, result):
+    """Return the adjustments owed for the salaries ``chunk`` covers."""
+    rows = (
+        SalaryStructure.objects.filter(pk__in=[structure[0] for structure in chunk])
+        .order_by()
+        .values_list("id", "effective_date", "end_date")
+    )
+    dates = {structure_id: (start, end) for structure_id, start, end in rows}
+    by_employee = {}
+    for structure, totals in zip(chunk, calculate_structures(chunk)):
+        structure_id, employee_id = structure[:2]
+        by_employee.setdefault(employee_id, []).append(
+            (structure_id, *dates[structure_id], money.to_minor(totals["net"]))
+        )
+
+    year, month = min(
+        first_covered_month(effective_date) for effective_date, _ in dates.values()
+    )
+    paid = MonthlySalary.objects.filter(employee_id__in=by_employee).filter(
+        Q(year__gt=year) | Q(year=year, month__gte=month)
+    )
+    deductions = _paid_totals(
+        MonthlySalaryLine.objects.filter(
+            monthly_salary__in=paid,
+            salary_component__component_type=SalaryComponent.DEDUCTION,
+        )
+        .order_by()
+        .values("monthly_salary_id")
+        .annotate(total=Sum(money.minor_units("amount")))
+        .values_list("monthly_salary_id", "total")
+    )
+    arrears = _paid_totals(
+        PayrollAdjustment.objects.filter(
+            monthly_salary__in=paid, salary_structure__isnull=False
+        )
+        .order_by()
+        .values("monthly_salary_id")
+        .annotate(total=Sum(money.minor_units("adjustment_amount")))
+        .values_list("monthly_salary_id", "total")
+    )
+
+    adjustments = []
+    for salary_id, employee_id, year, month, gross in (
+        paid.order_by("employee_id", "year", "month")
+        .annotate(gross_paise=money.minor_units("gross_amount"))
+        .values_list("id", "employee_id", "year", "month", "gross_paise")
+    ):
+        for structure_id, effective_date, end_date, net in by_employee[employee_id]:
+            if not covers(effective_date, end_date, year, month):
+                continue
+            result.salaries_checked += 1
+            owed = net - (gross - deductions.get(salary_id, 0))
+            owed -= arrears.get(salary_id, 0)
+            if owed:
+                amount = money.to_decimal(owed)
+                adjustments.append(
+                    PayrollAdjustment(
+                        monthly_salary_id=salary_id,
+                        salary_structure_id=structure_id,
+                        adjustment_amount=amount,
+                        reason=(
+                            f"Arrears for {month:02d}/{year}: salary structure "
+                            f"effective {effective_date}."
+                        ),
+                        created_at=now,
+                        created_by=created_by,
+                    )
+                )
+                result.total += amount
+                result.periods[(year, month)] = (
+                    result.periods.get((year, month), Decimal("0.00")) + amount
+                )
+    return adjustments
+
+
+def compute_arrears(
+    structures,
+    dry_run=False,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    backend=DEFAULT_BACKEND,
+    created_by=None,
+):
+    """
+    Write arrears for the months already paid that ``structures`` cover.
+
+    Each salary's arrears are the structure's net pay less the net the month
+    paid (gross less deduction lines) and less the arrears it already
+    received; nonzero ones become PayrollAdjustment rows linked to the
+    structure and are added to the salary's net pay. Structures are read and
+    calculated per chunk with a fixed number of queries, adjustments are
+    written with ``bulk_create``, and the summaries of affected months are
+    refreshed, all in one transaction. With ``dry_run`` nothing is written.
+    """
+    calculate_structures = get_backend(backend)
+    result = ArrearsResult(dry_run=dry_run)
+    components = component_registry.modes()
+    now = timezone.now()
+    with transaction.atomic():
+        for chunk in iter_structure_chunks(structures, components, chunk_size):
+            result.structures += len(chunk)
+            adjustments = _arrears_chunk(
+                chunk, calculate_structures, now, created_by, result
+            )
+            result.adjustments_created += len(adjustments)
+            if not dry_run:
+                PayrollAdjustment.objects.bulk_create(adjustments)
+                # bulk_create skips PayrollAdjustment.touch_salary().
+                MonthlySalary.objects.filter(
+                    pk__in=[adjustment.monthly_salary_id for adjustment in adjustments]
+                ).refresh_net(now)
+        if not dry_run:
+            for year, month in sorted(result.periods):
+                refresh_summaries(month, year)
+    return result
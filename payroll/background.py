@@ -0,0 +1,219 @@
+"""
+Payroll runs started from the web.
+
+``submit_payroll_run`` records a PayrollRun in ``pending`` status, which is
+the queue: once the request's transaction commits, the run is handed to a
+thread pool in the web process. ``process_payroll_run`` claims a pending run
+before paying it, so runs left pending by a restart can be picked up safely
+by the ``process_payroll_queue`` command. A run whose worker died stays in
+progress until ``requeue_stale_runs`` puts it back in the queue, after
+``PAYROLL_STALE_RUN_SECONDS`` without a checkpoint; it then resumes from its
+last checkpoint. The database allows one open run per period, see the
+``one_open_run_per_period`` constraint. Progress is read from the run's
+checkpoints, see ``payroll_progress``.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .engine import PayrollRunError, _next_run_version, resume_payroll, run_payroll
+from .models import PayrollRun, PayrollRunCheckpoint
+
+DEFAULT_STALE_RUN_SECONDS = 30 * 60
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+
+
+def _executor():
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(
+            max_workers=getattr(settings, "PAYROLL_BACKGROUND_WORKERS", 1),
+            thread_name_prefix="payroll-run",
+        )
+    return _pool
+
+
+def submit_payroll_run(month, year, as_of=None, incremental=False):
+    """
+    Create a pending PayrollRun for the period and run it in the background
+    after the current transaction commits. Raise PayrollRunError if a run for
+    the period is already pending or in progress; a stale one is requeued
+    and handed to the pool first.
+    """
+    if not 1 <= month <= 12:
+        raise ValueError(f"Invalid month: {month}")
+    for payroll_run_id in requeue_stale_runs(
+        PayrollRun.objects.filter(month=month, year=year)
+    ):
+        transaction.on_commit(partial(_executor().submit, _work, payroll_run_id))
+    with transaction.atomic():
+        active = PayrollRun.objects.filter(
+            month=month,
+            year=year,
+            status__in=[PayrollRun.PENDING, PayrollRun.IN_PROGRESS],
+        ).first()
+        if active is not None:
+            raise PayrollRunError(f"{active} is already {active.status}.")
+        try:
+            # The constraint settles a concurrent submission for the period.
+            with transaction.atomic():
+                payroll_run = PayrollRun.objects.create(
+                    run_date=timezone.now(),
+                    run_version=_next_run_version(month, year),
+                    status=PayrollRun.PENDING,
+                    month=month,
+                    year=year,
+                    as_of=as_of,
+                    incremental=incremental,
+                )
+        except IntegrityError:
+            raise PayrollRunError(
+                f"A payroll run for {month:02d}/{year} is already pending or in "
+                "progress."
+            )
+        transaction.on_commit(partial(_executor().submit, _work, payroll_run.pk))
+    return payroll_run
+
+
+def requeue_stale_runs(payroll_runs=None, now=None):
+    """
+    Put runs left in progress by a worker that died back in the queue: those
+    neither saved nor checkpointed in the last ``PAYROLL_STALE_RUN_SECONDS``.
+    Return their ids.
+    """
+    timeout = getattr(settings, "PAYROLL_STALE_RUN_SECONDS", DEFAULT_STALE_RUN_SECONDS)
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=timeout)
+    stale = (
+        (PayrollRun.objects.all() if payroll_runs is None else payroll_runs)
+        .filter(status=PayrollRun.IN_PROGRESS, updated_at__lt=cutoff)
+        .exclude(checkpoints__created_at__gte=cutoff)
+    )
+    ids = list(stale.values_list("pk", flat=True))
+    # Re-check in the UPDATE, so a run that just checkpointed keeps its worker.
+    PayrollRun.objects.filter(
+        pk__in=ids, status=PayrollRun.IN_PROGRESS, updated_at__lt=cutoff
+    ).exclude(checkpoints__created_at__gte=cutoff).update(
+        status=PayrollRun.PENDING, updated_at=now
+    )
+    return ids
+
+
+def process_payroll_run(payroll_run_id, **options):
+    """
+    Claim the pending run and pay it with ``run_payroll``, or continue it with
+    ``resume_payroll`` if it was requeued after starting. Return the
+    PayrollRunResult, or None if another process claimed the run first.
+
+    A run that fails is marked failed with the error and the exception
+    re-raised, also when it fails before the engine starts paying it.
+    """
+    claimed = PayrollRun.objects.filter(
+        pk=payroll_run_id, status=PayrollRun.PENDING
+    ).update(status=PayrollRun.IN_PROGRESS, updated_at=timezone.now())
+    if not claimed:
+        return None
+    try:
+        payroll_run = PayrollRun.objects.get(pk=payroll_run_id)
+        if payroll_run.started_at is not None:
+            return resume_payroll(payroll_run, **options)
+        return run_payroll(
+            payroll_run.month,
+            payroll_run.year,
+            payroll_run=payroll_run,
+            as_of=payroll_run.as_of,
+            incremental=payroll_run.incremental,
+            **options,
+        )
+    except Exception as exc:
+        # The engine marks the runs it started failed; this one is still ours.
+        now = timezone.now()
+        PayrollRun.objects.filter(
+            pk=payroll_run_id, status=PayrollRun.IN_PROGRESS
+        ).update(
+            status=PayrollRun.FAILED, notes=str(exc), finished_at=now, updated_at=now
+        )
+        raise
+
+
+def _work(payroll_run_id):
+    try:
+        process_payroll_run(payroll_run_id)
+    except Exception:
+        logger.exception("Payroll run %s failed.", payroll_run_id)
+    finally:
+        # Pool threads keep their own connection; do not leave it open idle.
+        connection.close()
+
+
+def payroll_progress(payroll_run, processed, now=None):
+    """
+    JSON-ready progress of ``payroll_run`` given the number of structures its
+    checkpoints have ``processed``: counts, throughput and estimated seconds
+    left while it runs.
+    """
+    total = payroll_run.total_structures
+    end = payroll_run.finished_at or now or timezone.now()
+    elapsed = (
+        (end - payroll_run.started_at).total_seconds()
+        if payroll_run.started_at
+        else 0.0
+    )
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    eta = None
+    if payroll_run.status == PayrollRun.IN_PROGRESS and total is not None and rate:
+        eta = round(max(total - processed, 0) / rate, 1)
+    return {
+        "id": payroll_run.pk,
+        "run_version": payroll_run.run_version,
+        "status": payroll_run.status,
+        "month": payroll_run.month,
+        "year": payroll_run.year,
+        "processed": processed,
+        "total": total,
+        "percent": round(100 * processed / total, 1) if total else None,
+        "elapsed_seconds": round(elapsed, 1),
+        "rows_per_second": round(rate, 1),
+        "eta_seconds": eta,
+        "error": payroll_run.notes if payroll_run.status == PayrollRun.FAILED else None,
+    }
+
+
+def processed_sum(prefix=""):
+    """Sum of structures paid, recomputed or skipped by committed chunks."""
+    return Sum(
+        F(f"{prefix}salaries_created")
+        + F(f"{prefix}salaries_updated")
+        + F(f"{prefix}skipped")
+    )
+
+
+def with_processed(payroll_runs):
+    """Annotate a PayrollRun queryset with ``processed``."""
+    return payroll_runs.annotate(processed=processed_sum("checkpoints__"))
+
+
+def processed_structures(payroll_run_id):
+    return (
+        PayrollRunCheckpoint.objects.filter(payroll_run_id=payroll_run_id).aggregate(
+            processed=processed_sum()
+        )["processed"]
+        or 0
+    )
+
+
+async def aprocessed_structures(payroll_run_id):
+    totals = await PayrollRunCheckpoint.objects.filter(
+        payroll_run_id=payroll_run_id
+    ).aaggregate(processed=processed_sum())
+    return totals["processed"] or 0
@@ -0,0 +1,264 @@
+"""
+Benchmark suite for the payroll hot paths.
+
+Each scale generates synthetic data with ``synthetic.generate_payroll_data``
+inside a transaction that is rolled back afterwards, times every case against
+it and leaves the database as it found it. Results are plain dicts so they can
+be written as JSON and compared between releases with ``compare_results``.
+"""
+
+import csv
+import io
+import os
+import platform
+import random
+from dataclasses import asdict, dataclass
+from datetime import timedelta
+
+import django
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.utils import timezone
+
+from . import vectorized
+from .engine import (
+    BACKENDS,
+    applicable_structures,
+    component_modes,
+    get_backend,
+    iter_structure_chunks,
+    run_payroll,
+)
+from .exports import iter_bank_transfer_csv
+from .importers import import_structures
+from .instrumentation import PhaseTiming, RunMetrics
+from .models import Employee, SalaryStructure
+from .synthetic import COMPONENTS, generate_payroll_data
+from .views import EmployeeListView, employee_detail
+
+SCALES = [1000, 10000, 100000, 1000000]
+CASES = [
+    "load_structures",
+    "calculate_decimal",
+    "calculate_numpy",
+    "list_view",
+    "detail_view",
+    "run_payroll",
+    "export_csv",
+    "import_csv",
+]
+# Pages walked by the list view case and employees opened by the detail case.
+LIST_PAGES = 10
+DETAIL_SAMPLE = 100
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+@dataclass
+class BenchmarkResult:
+    case: str
+    scale: int
+    seconds: float
+    queries: int
+    rows: int
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {**asdict(self), "rows_per_second": self.rows_per_second}
+
+
+def _load_structures(metrics, context):
+    chunks = iter_structure_chunks(
+        applicable_structures(), component_modes(), chunk_size=2000
+    )
+    for chunk in metrics.iterate("case", chunks):
+        pass
+
+
+def _calculate(backend):
+    def case(metrics, context):
+        calculate_structures = get_backend(backend)
+        chunks = iter_structure_chunks(
+            applicable_structures(), component_modes(), chunk_size=2000
+        )
+        for chunk in chunks:
+            with metrics.phase("case") as timing:
+                calculate_structures(chunk)
+                timing.rows += len(chunk)
+
+    return case
+
+
+def _list_view(metrics, context):
+    view = EmployeeListView.as_view()
+    params = {"show_pay": "1"}
+    for _ in range(LIST_PAGES):
+        with metrics.phase("case") as timing:
+            response = view(context["requests"].get("/employees/", params))
+            response.render()
+            timing.rows += len(response.context_data["employees"])
+        if not response.context_data["next_after"]:
+            break
+        params["after"] = response.context_data["next_after"]
+
+
+def _detail_view(metrics, context):
+    ids = context["employee_ids"]
+    sample = random.Random(context["seed"]).sample(ids, min(DETAIL_SAMPLE, len(ids)))
+    for employee_id in sample:
+        request = context["requests"].get(f"/employees/{employee_id}/")
+        with metrics.phase("case") as timing:
+            employee_detail(request, employee_id=int(employee_id))
+            timing.rows += 1
+
+
+def _run_payroll(metrics, context):
+    today = timezone.localdate()
+    with metrics.phase("case") as timing:
+        result = run_payroll(today.month, today.year)
+        timing.rows += result.salaries_created
+    context["payroll_run"] = result.payroll_run
+
+
+def _export_csv(metrics, context):
+    with metrics.phase("case") as timing:
+        for _ in iter_bank_transfer_csv(context["payroll_run"]):
+            timing.rows += 1
+
+
+def _import_csv(metrics, context):
+    # A revision for every employee, effective next month.
+    effective_date = timezone.localdate() + timedelta(days=31)
+    rng = random.Random(context["seed"])
+    csv_file = io.StringIO()
+    writer = csv.writer(csv_file)
+    codes = [code for code, *_ in COMPONENTS]
+    writer.writerow(["employee_id", "effective_date", "basic_pay", *codes])
+    for employee_id in context["employee_ids"]:
+        writer.writerow(
+            [
+                employee_id,
+                effective_date.isoformat(),
+                rng.randrange(15000, 90000, 100),
+                *(
+                    f"{low}" if rng.random() < share else ""
+                    for _, _, _, _, share, low, _ in COMPONENTS
+                ),
+            ]
+        )
+    csv_file.seek(0)
+    with metrics.phase("case") as timing:
+        result = import_structures(csv_file)
+        timing.rows += result.structures_created
+    if result.errors:
+        raise BenchmarkError(f"Import rejected rows: {result.errors[:3]}")
+
+
+CASE_FUNCTIONS = {
+    "load_structures": _load_structures,
+    "calculate_decimal": _calculate("decimal"),
+    "calculate_numpy": _calculate("numpy"),
+    "list_view": _list_view,
+    "detail_view": _detail_view,
+    "run_payroll": _run_payroll,
+    "export_csv": _export_csv,
+    "import_csv": _import_csv,
+}
+
+
+def available_cases():
+    """Cases whose dependencies are installed."""
+    cases = list(CASES)
+    if vectorized.np is None:
+        cases.remove("calculate_numpy")
+    return cases
+
+
+def run_scale(scale, cases, seed=0):
+    """Generate ``scale`` employees, run ``cases`` in order and roll back."""
+    results = []
+    with transaction.atomic():
+        generate_payroll_data(scale, seed=seed)
+        context = {
+            "seed": seed,
+            "requests": RequestFactory(),
+            "employee_ids": list(
+                Employee.objects.order_by("employee_id").values_list(
+                    "employee_id", flat=True
+                )
+            ),
+        }
+        for case in CASES:
+            if case not in cases:
+                continue
+            # Exports read the run that run_payroll created.
+            if case == "export_csv" and "payroll_run" not in context:
+                _run_payroll(RunMetrics(), context)
+            metrics = RunMetrics()
+            CASE_FUNCTIONS[case](metrics, context)
+            timing = metrics.phases.get("case", PhaseTiming())
+            results.append(
+                BenchmarkResult(
+                    case=case,
+                    scale=scale,
+                    seconds=timing.seconds,
+                    queries=timing.queries,
+                    rows=timing.rows,
+                )
+            )
+        transaction.set_rollback(True)
+    return results
+
+
+def run_benchmarks(scales=SCALES, cases=None, seed=0):
+    """
+    Run ``cases`` (all available ones by default) at every scale and return
+    the report: ``{"environment": {...}, "results": [...]}``.
+
+    The database must hold no employees, so every scale measures exactly the
+    data it generated.
+    """
+    if Employee.objects.exists() or SalaryStructure.objects.exists():
+        raise BenchmarkError("Benchmarks need a database without employees.")
+    cases = available_cases() if cases is None else cases
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        raise BenchmarkError(f"Unknown cases: {', '.join(sorted(unknown))}.")
+    results = []
+    for scale in scales:
+        results.extend(run_scale(scale, cases, seed=seed))
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "backends": sorted(BACKENDS),
+            "seed": seed,
+            "timestamp": timezone.now().isoformat(),
+        },
+        "results": [result.as_dict() for result in results],
+    }
+
+
+def compare_results(baseline, report, tolerance=0.2):
+    """
+    Return ``(case, scale, baseline_rate, rate)`` for every result whose rows
+    per second fell more than ``tolerance`` below the baseline report.
+    """
+    rates = {
+        (result["case"], result["scale"]): result["rows_per_second"]
+        for result in baseline["results"]
+    }
+    regressions = []
+    for result in report["results"]:
+        key = (result["case"], result["scale"])
+        if key in rates and result["rows_per_second"] < rates[key] * (1 - tolerance):
+            regressions.append((*key, rates[key], result["rows_per_second"]))
+    return regressions
@@ -0,0 +1,23 @@
+"""
+Upkeep after writes that bypass model signals.
+
+``bulk_create`` and ``QuerySet.update`` send no ``post_save`` signal, so the
+receivers connected in ``PayrollConfig.ready`` never see their rows: cached
+employee pages and the component registry would keep serving the old ones.
+Code writing those models in bulk calls ``after_bulk_write`` once the rows
+are written to do the receivers' work.
+"""
+
+from .page_cache import invalidate_all_employee_pages, invalidate_employee_pages
+from .registry import component_registry, invalidate_components
+
+
+def after_bulk_write(employee_ids=(), components=False):
+    """
+    Drop what the signals would have for the employees with these
+    ``employee_id``s, and for every component if ``components`` is set.
+    """
+    if components:
+        invalidate_components(sender=None)
+        invalidate_all_employee_pages()
+    invalidate_employee_pages(employee_ids)
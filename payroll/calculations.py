@@ -0,0 +1,84 @@
+from dataclasses import dataclass
+from decimal import Decimal
+
+from . import money
+from .models import SalaryComponent
+from .registry import component_registry
+
+PAISA = Decimal("0.01")
+
+
+@dataclass(frozen=True)
+class SalaryBreakdown:
+    """Computed amounts for one salary structure, keyed by component id."""
+
+    basic: Decimal
+    components: dict
+    earnings: Decimal
+    deductions: Decimal
+    gross: Decimal
+    net: Decimal
+
+
+def component_amount(mode, basic_pay, amount, rounding=money.DEFAULT_ROUNDING):
+    """
+    Resolve a structure line to its monthly amount. All amounts are in paise;
+    a percentage line's amount is its rate in hundredths of a percent, and the
+    result is rounded by ``rounding``.
+    """
+    if mode == SalaryComponent.PERCENTAGE:
+        return money.divide(basic_pay * amount, 10000, rounding)
+    return amount
+
+
+def calculate_structure(basic_pay, lines):
+    """
+    Calculate totals for one structure from plain values in integer paise.
+
+    ``lines`` is an iterable of ``(component_id, mode, component_type,
+    rounding, amount)`` tuples. Returns the per-component amounts along with
+    earnings, deductions, gross and net totals, as Decimals ready to store.
+    Structures with formula components go through the compiled evaluator of
+    their component set.
+    """
+    lines = list(lines)
+    values = None
+    if any(line[1] == SalaryComponent.FORMULA for line in lines):
+        values = component_registry.evaluator([line[0] for line in lines])(
+            basic_pay, {line[0]: line[4] for line in lines}
+        )
+    components = {}
+    earnings = 0
+    deductions = 0
+    for component_id, mode, component_type, rounding, amount in lines:
+        if values is None:
+            value = component_amount(mode, basic_pay, amount, rounding)
+        else:
+            value = values[component_id]
+        components[component_id] = money.to_decimal(value)
+        if component_type == SalaryComponent.EARNING:
+            earnings += value
+        else:
+            deductions += value
+    gross = basic_pay + earnings
+    return {
+        "components": components,
+        "earnings": money.to_decimal(earnings),
+        "deductions": money.to_decimal(deductions),
+        "gross": money.to_decimal(gross),
+        "net": money.to_decimal(gross - deductions),
+    }
+
+
+def calculate_structures(structures):
+    """
+    Calculate a batch of structures one at a time.
+
+    ``structures`` is a sequence of ``(structure_id, employee_id, basic_pay,
+    lines, ...)`` tuples in paise as produced by the payroll engine. Results
+    are returned in the same order.
+    """
+    return [
+        calculate_structure(basic_pay, lines)
+        for _, _, basic_pay, lines, *_ in structures
+    ]
@@ -0,0 +1,637 @@
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, fields
+from datetime import date
+from importlib import import_module
+
+import django
+from django.apps import apps
+from django.db import IntegrityError, connections, transaction
+from django.utils import timezone
+
+from . import money
+from .instrumentation import (
+    CALCULATE,
+    LOAD,
+    SUMMARIZE,
+    WRITE,
+    RunMetrics,
+    profiled,
+)
+from .models import (
+    MonthlySalary,
+    MonthlySalaryLine,
+    PayrollAdjustment,
+    PayrollRun,
+    PayrollRunCheckpoint,
+    PayrollRunMetric,
+    SalaryPayment,
+    SalaryStructure,
+    SalaryStructureLine,
+)
+from .registry import component_registry
+from .reports import refresh_summaries
+
+DEFAULT_CHUNK_SIZE = 2000
+# Several shards per worker keep the pool busy when shards finish unevenly.
+SHARDS_PER_WORKER = 4
+
+# Calculation backends share the ``calculate_structures(structures)`` signature.
+BACKENDS = {
+    "decimal": "payroll.calculations",
+    "numpy": "payroll.vectorized",
+}
+DEFAULT_BACKEND = "decimal"
+
+
+class PayrollRunError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class RunSpec:
+    """What a payroll run computes. Picklable, so shard workers receive it."""
+
+    payroll_run_id: int
+    month: int
+    year: int
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+    backend: str = DEFAULT_BACKEND
+    as_of: date = None
+    incremental: bool = False
+    # Directory for cProfile dumps of the run and of each shard, if any.
+    profile_dir: str = None
+
+
+@dataclass
+class PayrollCounts:
+    salaries_created: int = 0
+    salaries_updated: int = 0
+    lines_created: int = 0
+    skipped: int = 0
+
+    def add(self, other):
+        for counter in fields(PayrollCounts):
+            setattr(
+                self,
+                counter.name,
+                getattr(self, counter.name) + getattr(other, counter.name),
+            )
+
+
+@dataclass
+class PayrollRunResult(PayrollCounts):
+    payroll_run: PayrollRun = None
+    shards: int = 0
+    failed_shards: list = field(default_factory=list)
+    metrics: RunMetrics = field(default_factory=RunMetrics)
+
+
+def get_backend(name):
+    """Return the ``calculate_structures`` function of a calculation backend."""
+    try:
+        module = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown calculation backend: {name}")
+    return import_module(module).calculate_structures
+
+
+def component_modes():
+    """Map every component id to its ``(mode, component_type, rounding)``."""
+    return component_registry.modes()
+
+
+def iter_structure_chunks(structures, components, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Stream ``(structure_id, employee_id, basic_pay, lines, updated_at)``
+    tuples in chunks, with basic pay and line amounts in integer paise.
+
+    Structures and their lines are read with one query each, both ordered by
+    structure id, and merged as they stream so memory stays bounded by the
+    chunk size. ``components`` maps component id to ``(mode, component_type,
+    rounding)``.
+    """
+    structure_rows = (
+        structures.order_by("id")
+        .annotate(basic_paise=money.minor_units("basic_pay"))
+        .values_list("id", "employee_id", "basic_paise", "updated_at")
+        .iterator(chunk_size=chunk_size)
+    )
+    line_rows = (
+        SalaryStructureLine.objects.filter(salary_structure__in=structures)
+        .order_by("salary_structure_id", "id")
+        .annotate(amount_paise=money.minor_units("amount"))
+        .values_list("salary_structure_id", "salary_component_id", "amount_paise")
+        .iterator(chunk_size=chunk_size)
+    )
+    pending_line = next(line_rows, None)
+    chunk = []
+    for structure_id, employee_id, basic_pay, updated_at in structure_rows:
+        lines = []
+        while pending_line is not None and pending_line[0] <= structure_id:
+            _, component_id, amount = pending_line
+            if pending_line[0] == structure_id:
+                if component_id not in components:
+                    # Created after ``components`` was read.
+                    component = component_registry.get(component_id)
+                    components[component_id] = (
+                        component.mode,
+                        component.component_type,
+                        component.rounding,
+                    )
+                lines.append((component_id, *components[component_id], amount))
+            pending_line = next(line_rows, None)
+        chunk.append((structure_id, employee_id, basic_pay, lines, updated_at))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def input_hash(structure, adjustments=()):
+    """
+    Fingerprint everything a MonthlySalary is computed from: the structure id,
+    ``updated_at`` and basic pay, each line's component, mode, type, rounding
+    and amount, and the salary's adjustments.
+    """
+    structure_id, _, basic_pay, lines, updated_at = structure
+    payload = repr(
+        (
+            structure_id,
+            updated_at.isoformat(),
+            basic_pay,
+            sorted(lines),
+            sorted(adjustments),
+        )
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def applicable_structures(as_of=None):
+    """Structures to pay from: active ones, or those in force on ``as_of``."""
+    structures = SalaryStructure.objects.filter(employee__is_active=True)
+    if as_of is None:
+        return structures.filter(is_active=True)
+    return structures.effective_on(as_of)
+
+
+def compute_structures(spec, structures, metrics=None):
+    """
+    Yield ``(pending, results, skipped, last_structure_id)`` for every chunk
+    of ``structures``.
+
+    ``pending`` holds ``(structure, salary_id, input_hash, adjustment_total,
+    previous_net)`` for each salary to write, ``salary_id`` being None and
+    ``previous_net`` zero for new salaries.
+    Employees already paid for the period are skipped, unless the run is
+    incremental and their input hash changed. Employees seen earlier in the
+    stream are skipped too.
+
+    Arrears, the adjustments linked to a structure, make up the difference
+    between what a month paid and what its structure owed. A recomputed
+    month pays from the structure in force, so they are left out of its
+    hash and total and ``_write_chunk`` deletes them.
+
+    Time spent reading and calculating is recorded in ``metrics``.
+    """
+    metrics = metrics if metrics is not None else RunMetrics()
+    calculate_structures = get_backend(spec.backend)
+    period = {"month": spec.month, "year": spec.year}
+    employees = structures.values("employee_id")
+    with metrics.phase(LOAD):
+        components = component_modes()
+        existing = {
+            employee_id: (salary_id, digest, net)
+            for employee_id, salary_id, digest, net in MonthlySalary.objects.filter(
+                employee__in=employees, **period
+            )
+            .order_by()
+            .values_list(
+                "employee_id", "id", "input_hash", money.minor_units("net_amount")
+            )
+        }
+        adjustments = {}
+        if spec.incremental:
+            for salary_id, amount in (
+                PayrollAdjustment.objects.filter(
+                    monthly_salary__employee__in=employees,
+                    monthly_salary__month=spec.month,
+                    monthly_salary__year=spec.year,
+                    salary_structure__isnull=True,
+                )
+                .order_by()
+                .annotate(amount_paise=money.minor_units("adjustment_amount"))
+                .values_list("monthly_salary_id", "amount_paise")
+            ):
+                adjustments.setdefault(salary_id, []).append(amount)
+
+    seen = set()
+    chunks = iter_structure_chunks(structures, components, spec.chunk_size)
+    for chunk in metrics.iterate(LOAD, chunks):
+        pending = []
+        for structure in chunk:
+            employee_id = structure[1]
+            if employee_id in seen:
+                continue
+            seen.add(employee_id)
+            salary_id, previous_hash, previous_net = existing.get(
+                employee_id, (None, None, 0)
+            )
+            if salary_id is not None and not spec.incremental:
+                continue
+            salary_adjustments = adjustments.get(salary_id, [])
+            digest = input_hash(structure, salary_adjustments)
+            if digest == previous_hash:
+                continue
+            pending.append(
+                (structure, salary_id, digest, sum(salary_adjustments), previous_net)
+            )
+        with metrics.phase(CALCULATE) as timing:
+            results = (
+                calculate_structures([item[0] for item in pending]) if pending else []
+            )
+            timing.rows += len(pending)
+        yield pending, results, len(chunk) - len(pending), chunk[-1][0]
+
+
+def _write_chunk(spec, pending, results):
+    now = timezone.now()
+    salaries = [
+        MonthlySalary(
+            pk=salary_id,
+            employee_id=structure[1],
+            salary_structure_id=structure[0],
+            payroll_run_id=spec.payroll_run_id,
+            month=spec.month,
+            year=spec.year,
+            gross_amount=result["gross"],
+            net_amount=result["net"] + money.to_decimal(adjustment_total),
+            input_hash=digest,
+            created_at=now,
+            updated_at=now,
+        )
+        for (structure, salary_id, digest, adjustment_total, _), result in zip(
+            pending, results
+        )
+    ]
+    created = [salary for salary in salaries if salary.pk is None]
+    updated = [salary for salary in salaries if salary.pk is not None]
+    MonthlySalary.objects.bulk_create(created)
+    if updated:
+        MonthlySalary.objects.bulk_update(
+            updated,
+            [
+                "salary_structure",
+                "payroll_run",
+                "gross_amount",
+                "net_amount",
+                "input_hash",
+                "updated_at",
+            ],
+        )
+        MonthlySalaryLine.objects.filter(
+            monthly_salary__in=[salary.pk for salary in updated]
+        ).delete()
+        # The recomputed salaries already pay what their arrears made up for.
+        PayrollAdjustment.objects.filter(
+            monthly_salary__in=[salary.pk for salary in updated],
+            salary_structure__isnull=False,
+        ).delete()
+    lines = [
+        MonthlySalaryLine(
+            monthly_salary_id=salary.pk,
+            salary_component_id=component_id,
+            amount=amount,
+        )
+        for salary, result in zip(salaries, results)
+        for component_id, amount in result["components"].items()
+    ]
+    MonthlySalaryLine.objects.bulk_create(lines, batch_size=spec.chunk_size)
+    # The run's bank file pays a recomputed salary only what it did not pay.
+    payments = [
+        SalaryPayment(
+            monthly_salary_id=salary.pk,
+            payroll_run_id=spec.payroll_run_id,
+            amount=money.to_decimal(money.to_minor(salary.net_amount) - previous_net),
+            created_at=now,
+        )
+        for salary, (*_, previous_net) in zip(salaries, pending)
+        if money.to_minor(salary.net_amount) != previous_net
+    ]
+    SalaryPayment.objects.bulk_create(payments, batch_size=spec.chunk_size)
+    return PayrollCounts(
+        salaries_created=len(created),
+        salaries_updated=len(updated),
+        lines_created=len(lines),
+    )
+
+
+def write_structures(spec, computed):
+    """Write chunks produced by ``compute_structures`` and return the counts."""
+    counts = PayrollCounts()
+    for pending, results, skipped, _ in computed:
+        counts.skipped += skipped
+        if pending:
+            counts.add(_write_chunk(spec, pending, results))
+    return counts
+
+
+def _checkpoint(spec, chunk_index, counts, last_structure_id=None):
+    PayrollRunCheckpoint.objects.create(
+        payroll_run_id=spec.payroll_run_id,
+        chunk_index=chunk_index,
+        last_structure_id=last_structure_id,
+        salaries_created=counts.salaries_created,
+        salaries_updated=counts.salaries_updated,
+        lines_created=counts.lines_created,
+        skipped=counts.skipped,
+    )
+
+
+def _written(counts):
+    return counts.salaries_created + counts.salaries_updated + counts.lines_created
+
+
+def pay_structures(spec, structures, first_chunk_index=0, metrics=None):
+    """
+    Compute and write ``structures`` chunk by chunk.
+
+    Each chunk commits together with a PayrollRunCheckpoint recording the last
+    structure it covered, so an interrupted run can resume after it.
+    """
+    metrics = metrics if metrics is not None else RunMetrics()
+    counts = PayrollCounts()
+    for chunk_index, computed in enumerate(
+        compute_structures(spec, structures, metrics), start=first_chunk_index
+    ):
+        with metrics.phase(WRITE) as timing, transaction.atomic():
+            chunk_counts = write_structures(spec, [computed])
+            _checkpoint(spec, chunk_index, chunk_counts, last_structure_id=computed[3])
+            timing.rows += _written(chunk_counts)
+        counts.add(chunk_counts)
+    return counts
+
+
+def shard_employee_ids(employee_ids, shards):
+    """Split sorted employee ids into at most ``shards`` contiguous ranges."""
+    employee_ids = sorted(employee_ids)
+    size = -(-len(employee_ids) // shards) if employee_ids else 0
+    return [
+        (employee_ids[start], employee_ids[min(start + size, len(employee_ids)) - 1])
+        for start in range(0, len(employee_ids), size or 1)
+    ]
+
+
+def _init_worker(settings_module):
+    # Spawned workers start without Django configured; forked ones inherit it.
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    if not apps.ready:
+        django.setup()
+
+
+def _run_shard(spec, chunk_index, shard):
+    first_id, last_id = shard
+    structures = applicable_structures(spec.as_of).filter(
+        employee_id__gte=first_id, employee_id__lte=last_id
+    )
+    metrics = RunMetrics()
+    name = f"payroll-run-{spec.payroll_run_id}-shard-{chunk_index}"
+    try:
+        with profiled(spec.profile_dir, name):
+            # Compute before opening the write transaction so that shards only
+            # contend for the database while writing.
+            computed = list(compute_structures(spec, structures, metrics))
+            with metrics.phase(WRITE) as timing, transaction.atomic():
+                counts = write_structures(spec, computed)
+                _checkpoint(spec, chunk_index, counts)
+                timing.rows += _written(counts)
+        metrics.sample_memory()
+        return counts, metrics
+    finally:
+        connections.close_all()
+
+
+def _run_sharded(spec, workers, result, first_chunk_index=0):
+    employee_ids = (
+        applicable_structures(spec.as_of)
+        .order_by()
+        .values_list("employee_id", flat=True)
+        .distinct()
+    )
+    shards = shard_employee_ids(employee_ids, workers * SHARDS_PER_WORKER)
+    result.shards = len(shards)
+    # Workers must open their own connections rather than share the parent's.
+    connections.close_all()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(os.environ.get("DJANGO_SETTINGS_MODULE", ""),),
+    ) as executor:
+        futures = {
+            executor.submit(_run_shard, spec, chunk_index, shard): shard
+            for chunk_index, shard in enumerate(shards, start=first_chunk_index)
+        }
+        for future, shard in futures.items():
+            try:
+                counts, metrics = future.result()
+            except Exception as exc:
+                result.failed_shards.append((shard, str(exc)))
+            else:
+                result.add(counts)
+                result.metrics.add(metrics)
+
+
+def _next_run_version(month, year):
+    prefix = f"{year}-{month:02d}"
+    runs = PayrollRun.objects.filter(run_version__startswith=prefix).count()
+    return prefix if not runs else f"{prefix}-r{runs + 1}"
+
+
+def _save_open_run(payroll_run):
+    """
+    Save a pending or in-progress run. Raise PayrollRunError if another run
+    for the period is open, which the ``one_open_run_per_period`` constraint
+    forbids.
+    """
+    try:
+        with transaction.atomic():
+            payroll_run.save()
+    except IntegrityError:
+        raise PayrollRunError(
+            f"A payroll run for {payroll_run.month:02d}/{payroll_run.year} is "
+            "already pending or in progress."
+        )
+
+
+def _save_metrics(payroll_run, metrics):
+    metrics.sample_memory()
+    PayrollRunMetric.objects.bulk_create(
+        PayrollRunMetric(
+            payroll_run=payroll_run,
+            phase=name,
+            seconds=timing.seconds,
+            queries=timing.queries,
+            rows=timing.rows,
+            peak_memory=metrics.peak_memory,
+        )
+        for name, timing in metrics.phases.items()
+    )
+
+
+def _execute(payroll_run, spec, workers, structures, first_chunk_index=0):
+    # A pending or claimed run already holds the period; a failed one resumed
+    # must take it back.
+    reopened = payroll_run.status not in (PayrollRun.PENDING, PayrollRun.IN_PROGRESS)
+    payroll_run.status = PayrollRun.IN_PROGRESS
+    if payroll_run.started_at is None:
+        payroll_run.started_at = timezone.now()
+        payroll_run.total_structures = applicable_structures(spec.as_of).count()
+    payroll_run.finished_at = None
+    if reopened:
+        _save_open_run(payroll_run)
+    else:
+        payroll_run.save()
+    result = PayrollRunResult(payroll_run=payroll_run)
+    try:
+        if workers > 1:
+            _run_sharded(spec, workers, result, first_chunk_index)
+        else:
+            with profiled(spec.profile_dir, f"payroll-run-{payroll_run.pk}"):
+                result.add(
+                    pay_structures(spec, structures, first_chunk_index, result.metrics)
+                )
+        if result.failed_shards:
+            raise PayrollRunError(
+                "; ".join(
+                    f"shard {first_id}-{last_id}: {error}"
+                    for (first_id, last_id), error in result.failed_shards
+                )
+            )
+        # Adjustments and arrears written since the last run are paid by this
+        # one's bank file.
+        SalaryPayment.objects.filter(payroll_run__isnull=True).update(
+            payroll_run=payroll_run
+        )
+        with result.metrics.phase(SUMMARIZE) as timing:
+            timing.rows = refresh_summaries(spec.month, spec.year).employees
+    except Exception as exc:
+        _save_metrics(payroll_run, result.metrics)
+        payroll_run.status = PayrollRun.FAILED
+        payroll_run.notes = str(exc)
+        payroll_run.finished_at = timezone.now()
+        payroll_run.save()
+        raise
+
+    _save_metrics(payroll_run, result.metrics)
+    payroll_run.status = PayrollRun.COMPLETED
+    payroll_run.finished_at = timezone.now()
+    payroll_run.save()
+    return result
+
+
+def run_payroll(
+    month,
+    year,
+    payroll_run=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    backend=DEFAULT_BACKEND,
+    as_of=None,
+    workers=1,
+    incremental=False,
+    profile_dir=None,
+):
+    """
+    Generate MonthlySalary and MonthlySalaryLine rows for every active employee.
+
+    Employees are paid from their active salary structure, or from the
+    structure in force on ``as_of`` when a date is given. Employees that
+    already have a MonthlySalary for the period are skipped, so an interrupted
+    or repeated run never duplicates rows. The number of read queries is fixed
+    and writes are issued with ``bulk_create`` once per chunk, so the query
+    count depends on ``chunk_size`` rather than on headcount. Every chunk
+    commits with a checkpoint; see ``resume_payroll``.
+
+    With ``incremental``, existing salaries whose input hash no longer matches
+    their structure, lines, components or adjustments are recomputed and
+    moved to this run; unchanged ones are left alone. Net amounts include the
+    salary's adjustments. Each written salary gets a SalaryPayment for what
+    its net pay changed by, so this run's bank file pays a recomputed salary
+    only the difference from what earlier runs paid. It also pays the
+    adjustments and arrears written since the last run, see SalaryPayment.
+
+    ``backend`` selects the calculator, see ``BACKENDS``. With ``workers``
+    above one, employees are split into contiguous id shards computed in a
+    process pool; each shard commits on its own and the run is marked failed
+    if any shard fails, after the others have finished.
+
+    Wall time, query count and rows of the load, calculate and write phases,
+    and peak memory, are returned in ``result.metrics`` and stored as
+    PayrollRunMetric rows. With ``profile_dir``, the run (or each shard) is
+    profiled with cProfile and its stats are dumped there.
+    """
+    if not 1 <= month <= 12:
+        raise ValueError(f"Invalid month: {month}")
+    get_backend(backend)
+
+    if payroll_run is None:
+        payroll_run = PayrollRun(
+            run_date=timezone.now(), run_version=_next_run_version(month, year)
+        )
+    payroll_run.month = month
+    payroll_run.year = year
+    payroll_run.as_of = as_of
+    payroll_run.incremental = incremental
+    _save_open_run(payroll_run)
+    spec = RunSpec(
+        payroll_run_id=payroll_run.pk,
+        month=month,
+        year=year,
+        chunk_size=chunk_size,
+        backend=backend,
+        as_of=as_of,
+        incremental=incremental,
+        profile_dir=profile_dir,
+    )
+    return _execute(payroll_run, spec, workers, applicable_structures(as_of))
+
+
+def resume_payroll(
+    payroll_run,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    backend=DEFAULT_BACKEND,
+    workers=1,
+    profile_dir=None,
+):
+    """
+    Continue an interrupted or failed run from its last committed checkpoint.
+
+    A sequential resume starts after the last structure a checkpoint covered.
+    Sharded resumes revisit every shard; employees already paid are skipped,
+    so no MonthlySalary is written twice.
+    """
+    if payroll_run.status == PayrollRun.COMPLETED:
+        raise PayrollRunError(f"{payroll_run} is already completed.")
+    if payroll_run.month is None or payroll_run.year is None:
+        raise PayrollRunError(f"{payroll_run} has no recorded month and year.")
+    get_backend(backend)
+
+    spec = RunSpec(
+        payroll_run_id=payroll_run.pk,
+        month=payroll_run.month,
+        year=payroll_run.year,
+        chunk_size=chunk_size,
+        backend=backend,
+        as_of=payroll_run.as_of,
+        incremental=payroll_run.incremental,
+        profile_dir=profile_dir,
+    )
+    structures = applicable_structures(payroll_run.as_of)
+    last = payroll_run.checkpoints.order_by("-chunk_index").first()
+    first_chunk_index = 0
+    if last is not None:
+        first_chunk_index = last.chunk_index + 1
+        if last.last_structure_id is not None:
+            structures = structures.filter(pk__gt=last.last_structure_id)
+    return _execute(payroll_run, spec, workers, structures, first_chunk_index)
@@ -0,0 +1,201 @@
+import csv
+import unicodedata
+
+from django.db.models import FilteredRelation, Q, Sum
+from django.db.models.functions import Length
+
+from . import money
+from .models import MonthlySalary, SalaryPayment
+
+CSV = "csv"
+FIXED = "fixed"
+FORMATS = [CSV, FIXED]
+
+CSV_HEADER = [
+    "employee_id",
+    "beneficiary_name",
+    "account_number",
+    "ifsc_code",
+    "bank_name",
+    "amount",
+    "narration",
+]
+
+# Columns of ``bank_transfer_rows`` before the amount.
+ROW_LOOKUPS = [
+    "monthly_salary__employee__employee_id",
+    "monthly_salary__employee__name",
+    "primary_account__account_number",
+    "primary_account__ifsc_code",
+    "primary_account__bank_name",
+]
+
+# (width, align) for each column of a fixed-width NEFT record. Values are
+# written in ASCII and never truncated to fit: a cut account number could pay
+# the wrong account.
+FIXED_WIDTH_LAYOUT = [
+    (20, "<"),  # employee_id
+    (35, "<"),  # beneficiary_name
+    (20, "<"),  # account_number
+    (11, "<"),  # ifsc_code
+    (35, "<"),  # bank_name
+    (15, ">"),  # amount
+    (30, "<"),  # narration
+]
+
+STREAM_CHUNK_SIZE = 2000
+
+
+class BankFileError(Exception):
+    pass
+
+
+class Echo:
+    """File-like object whose ``write`` returns the value, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def _paid_to_primary_account(payroll_run):
+    """
+    The run's payments to a primary account, one row per salary with what
+    they add up to in paise. Salaries the run pays nothing more, or less, are
+    left out: a bank transfer cannot recover an overpayment.
+    """
+    return (
+        SalaryPayment.objects.filter(payroll_run=payroll_run)
+        .annotate(
+            primary_account=FilteredRelation(
+                "monthly_salary__employee__bank_accounts",
+                condition=Q(monthly_salary__employee__bank_accounts__is_primary=True),
+            )
+        )
+        .filter(primary_account__isnull=False)
+        .values("monthly_salary")
+        .annotate(paise=Sum(money.minor_units("amount")))
+        .filter(paise__gt=0)
+        .order_by(
+            "monthly_salary__employee__employee_id",
+            "monthly_salary__year",
+            "monthly_salary__month",
+        )
+    )
+
+
+def bank_transfer_rows(payroll_run):
+    """
+    Stream ``(employee_id, name, account_number, ifsc_code, bank_name, amount,
+    month, year)`` tuples for every salary the run pays to a primary account.
+    The amount is what the run's payments for the salary add up to: its net
+    pay if the run created it, the difference if the run recomputed it. Only
+    positive amounts are listed.
+
+    The primary account is joined in SQL and rows are read with ``iterator()``,
+    so memory use is constant regardless of headcount.
+    """
+    for *row, paise, month, year in (
+        _paid_to_primary_account(payroll_run)
+        .values_list(
+            *ROW_LOOKUPS, "paise", "monthly_salary__month", "monthly_salary__year"
+        )
+        .iterator(chunk_size=STREAM_CHUNK_SIZE)
+    ):
+        yield (*row, money.to_decimal(paise), month, year)
+
+
+def fixed_width_errors(payroll_run):
+    """
+    One message per value of the run too long for its fixed-width column,
+    found with a single query. The file must not be written while any exist.
+    """
+    columns = list(zip(CSV_HEADER, ROW_LOOKUPS, FIXED_WIDTH_LAYOUT))
+    too_long = Q()
+    for name, _, (width, _) in columns:
+        too_long |= Q(**{f"{name}_length__gt": width})
+    rows = (
+        _paid_to_primary_account(payroll_run)
+        .alias(**{f"{name}_length": Length(lookup) for name, lookup, _ in columns})
+        .filter(too_long)
+        .values_list(*ROW_LOOKUPS)
+        .distinct()
+    )
+    # ASCII spellings are never longer, so the query finds every candidate.
+    return [
+        f"{row[0]}: {name} {value!r} is longer than {width} characters."
+        for row in rows
+        for (name, _, (width, _)), value in zip(columns, row)
+        if len(_ascii(value)) > width
+    ]
+
+
+def missing_primary_accounts(payroll_run):
+    """Salaries the run pays whose employee has no primary bank account."""
+    return (
+        MonthlySalary.objects.filter(payments__payroll_run=payroll_run)
+        .exclude(employee__bank_accounts__is_primary=True)
+        .distinct()
+    )
+
+
+def _record(payroll_run, row):
+    """
+    The values of a bank file record for a ``bank_transfer_rows`` row. Pay
+    for an earlier period, such as arrears, is narrated as such.
+    """
+    *values, amount, month, year = row
+    kind = "SALARY"
+    # Runs from before periods were stored only paid their own.
+    if payroll_run.month is not None and (month, year) != (
+        payroll_run.month,
+        payroll_run.year,
+    ):
+        kind = "ARREARS"
+    return [*values, f"{amount:.2f}", f"{kind} {month:02d}/{year}"]
+
+
+def iter_bank_transfer_csv(payroll_run):
+    """Yield the bank transfer file as CSV lines."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for row in bank_transfer_rows(payroll_run):
+        yield writer.writerow(_record(payroll_run, row))
+
+
+def _ascii(value):
+    """``value`` with accents dropped and other non-ASCII characters removed."""
+    return (
+        unicodedata.normalize("NFD", str(value))
+        .encode("ascii", "ignore")
+        .decode("ascii")
+    )
+
+
+def _fixed_width_record(values):
+    fields = []
+    for name, value, (width, align) in zip(CSV_HEADER, values, FIXED_WIDTH_LAYOUT):
+        value = _ascii(value).upper()
+        if len(value) > width:
+            raise BankFileError(
+                f"{values[0]}: {name} {value!r} is longer than {width} characters."
+            )
+        fields.append(f"{value:{align}{width}}")
+    return "".join(fields) + "\r\n"
+
+
+def iter_bank_transfer_fixed(payroll_run):
+    """
+    Yield the bank transfer file as fixed-width NEFT records. Raise
+    BankFileError at the first value too long for its column; check
+    ``fixed_width_errors`` before streaming to report them all up front.
+    """
+    for row in bank_transfer_rows(payroll_run):
+        yield _fixed_width_record(_record(payroll_run, row))
+
+
+def iter_bank_transfer_file(payroll_run, file_format=CSV):
+    if file_format == CSV:
+        return iter_bank_transfer_csv(payroll_run)
+    if file_format == FIXED:
+        return iter_bank_transfer_fixed(payroll_run)
+    raise ValueError(f"Unknown bank transfer format: {file_format}")
@@ -0,0 +1,277 @@
+"""
+Salary components computed from formulas.
+
+A formula component's amount is an arithmetic expression over ``basic``
+pay, other components by code, ``gross`` pay (basic plus every earning) and
+the line's own ``amount``, all in rupees, for example ``(basic + DA) * 12 /
+100`` or ``slabs(gross, 0, 25000, 5, 50000, 20)``. Arithmetic is exact
+(fractions) and the result is rounded to paise by the component's rounding
+rule. A component missing from a structure counts as zero; a name that is
+no component at all is an error, and so is dividing by zero.
+
+Formulas are parsed and checked for unknown names and cycles whenever a
+component is saved or deleted, so no change can break another component's
+formula, and a change is rolled back if it fails on a stored structure. For
+each set of components that appears on a structure, the formulas are put in
+dependency order and compiled once into a Python function, which the
+component registry caches, so evaluating a structure resolves nothing.
+"""
+
+import ast
+from decimal import Decimal, InvalidOperation
+from fractions import Fraction
+from graphlib import CycleError, TopologicalSorter
+
+from . import money
+from .models import SalaryComponent
+
+BASIC = "basic"
+GROSS = "gross"
+AMOUNT = "amount"
+RESERVED_NAMES = {BASIC, GROSS, AMOUNT}
+
+BINARY_OPERATORS = {ast.Add: "+", ast.Sub: "-", ast.Mult: "*", ast.Div: "/"}
+UNARY_OPERATORS = {ast.USub: "-", ast.UAdd: "+"}
+# Literals are kept within 10**-MAX_EXPONENT..10**MAX_EXPONENT; a literal
+# such as 1e999999999 would otherwise become a fraction of enormous integers.
+MAX_EXPONENT = 15
+
+
+class FormulaError(Exception):
+    pass
+
+
+def slabs(value, *bands):
+    """
+    Progressive rates: ``slabs(x, r0, l1, r1, l2, r2)`` is ``r0`` percent of
+    ``x`` up to ``l1``, ``r1`` percent of the part between ``l1`` and ``l2``
+    and ``r2`` percent of the rest.
+    """
+    if len(bands) % 2 == 0:
+        raise FormulaError("slabs() takes a value, then rates and limits.")
+    total = 0
+    lower = 0
+    rates = bands[0::2]
+    limits = bands[1::2] + (None,)
+    for rate, upper in zip(rates, limits):
+        if value <= lower:
+            break
+        portion = value - lower if upper is None else min(value, upper) - lower
+        total += portion * rate / 100
+        lower = upper
+    return total
+
+
+FUNCTIONS = {"min": min, "max": max, "slabs": slabs}
+
+
+def parse_formula(formula):
+    """
+    Parse ``formula`` and return the set of names it references. Raise
+    FormulaError if it is not a supported expression.
+    """
+    references = set()
+    _to_source(_parse(formula), formula, {}, references)
+    return references
+
+
+def _parse(formula):
+    try:
+        return ast.parse((formula or "").strip(), mode="eval").body
+    except SyntaxError as exc:
+        raise FormulaError(f"Invalid formula {formula!r}: {exc.msg}.")
+
+
+def _to_source(node, formula, constants, references, name=str):
+    """
+    Translate a formula AST into Python source over the supported subset,
+    collecting constants into ``constants`` and names into ``references``;
+    ``name`` maps each referenced name to the expression that reads it.
+    """
+
+    def recurse(child):
+        return _to_source(child, formula, constants, references, name)
+
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+        operator = BINARY_OPERATORS[type(node.op)]
+        return f"({recurse(node.left)} {operator} {recurse(node.right)})"
+    if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+        return f"({UNARY_OPERATORS[type(node.op)]}{recurse(node.operand)})"
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        # Read the literal text so 0.1 is exactly one tenth.
+        literal = ast.get_source_segment(formula.strip(), node)
+        try:
+            value = Decimal(literal.replace("_", ""))
+        except InvalidOperation:
+            raise FormulaError(f"Unsupported number {literal} in formula {formula!r}.")
+        if value and not -MAX_EXPONENT <= value.adjusted() <= MAX_EXPONENT:
+            raise FormulaError(f"Number {literal} out of range in formula {formula!r}.")
+        key = f"c{len(constants)}"
+        constants[key] = Fraction(value)
+        return key
+    if isinstance(node, ast.Name):
+        references.add(node.id)
+        return name(node.id)
+    if (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Name)
+        and node.func.id in FUNCTIONS
+        and not node.keywords
+        and node.args
+    ):
+        args = ", ".join(recurse(arg) for arg in node.args)
+        return f"{node.func.id}({args})"
+    raise FormulaError(
+        f"Unsupported expression {ast.get_source_segment(formula.strip(), node)!r}"
+        f" in formula {formula!r}."
+    )
+
+
+def _graph(components, formulas):
+    """
+    Dependencies between the codes of ``components``, given the codes each
+    formula references in ``formulas``. When a formula uses ``gross``, the
+    ``gross`` pseudo-component depends on every earning.
+    """
+    graph = {component.code: set() for component in components}
+    graph.update(formulas)
+    if any(GROSS in references for references in formulas.values()):
+        graph[GROSS] = {
+            component.code
+            for component in components
+            if component.component_type == SalaryComponent.EARNING
+        }
+    return graph
+
+
+def _order(graph):
+    try:
+        return list(TopologicalSorter(graph).static_order())
+    except CycleError as exc:
+        raise FormulaError(
+            f"Formulas depend on each other: {' -> '.join(exc.args[1])}."
+        )
+
+
+def check_formulas(components):
+    """
+    Check every formula of ``components`` for syntax, unknown codes and
+    cycles, raising FormulaError for the first problem found.
+    """
+    codes = {component.code for component in components}
+    formulas = {}
+    for component in components:
+        if component.mode != SalaryComponent.FORMULA:
+            continue
+        references = parse_formula(component.formula)
+        unknown = references - codes - RESERVED_NAMES
+        if unknown:
+            raise FormulaError(
+                f"{component.code}: unknown component {', '.join(sorted(unknown))}."
+            )
+        formulas[component.code] = references & (codes | {GROSS})
+    _order(_graph(components, formulas))
+
+
+def compile_evaluator(components, known_codes=()):
+    """
+    Compile a function ``evaluate(basic, amounts)`` for a structure whose
+    lines are ``components``. ``basic`` and ``amounts``, a dict of component
+    id to line amount, are in paise; it returns the amount of each component
+    in paise, keyed by id.
+
+    A formula may name components of ``known_codes`` that the structure
+    lacks, which count as zero; any other unknown name raises FormulaError.
+    The function raises FormulaError if a formula divides by zero.
+    """
+    by_code = {component.code: component for component in components}
+    known_codes = set(known_codes) | by_code.keys()
+    formulas = {}
+    sources = {}
+    constants = {}
+    used = set()
+    for component in components:
+        if component.mode != SalaryComponent.FORMULA:
+            continue
+        references = set()
+        sources[component.pk] = _to_source(
+            _parse(component.formula),
+            component.formula,
+            constants,
+            references,
+            name=lambda name, component=component: _read(
+                name, component, by_code, known_codes
+            ),
+        )
+        used |= references
+        formulas[component.code] = references & (by_code.keys() | {GROSS})
+
+    referenced = set().union(*formulas.values())
+    body = []
+    if BASIC in used:
+        body.append("r_basic = Fraction(basic, 100)")
+    for code in _order(_graph(components, formulas)):
+        if code == GROSS:
+            earnings = " + ".join(
+                f"v{component.pk}"
+                for component in components
+                if component.component_type == SalaryComponent.EARNING
+            )
+            body.append(f"r_gross = Fraction(basic + {earnings or 0}, 100)")
+            continue
+        component = by_code[code]
+        pk = component.pk
+        if component.mode == SalaryComponent.FORMULA:
+            body.extend(
+                [
+                    "try:",
+                    f"    v{pk} = to_paise({sources[pk]}, {component.rounding!r})",
+                    "except ZeroDivisionError:",
+                    f"    raise FormulaError({f'{code}: division by zero.'!r})",
+                ]
+            )
+        elif component.mode == SalaryComponent.PERCENTAGE:
+            body.append(
+                f"v{pk} = divide(basic * amounts[{pk}], 10000, {component.rounding!r})"
+            )
+        else:
+            body.append(f"v{pk} = amounts[{pk}]")
+        if code in referenced:
+            body.append(f"r{pk} = Fraction(v{pk}, 100)")
+    results = ", ".join(f"{component.pk}: v{component.pk}" for component in components)
+    body.append(f"return {{{results}}}")
+    source = "def evaluate(basic, amounts):\n" + "".join(
+        f"    {line}\n" for line in body
+    )
+
+    namespace = {
+        "Fraction": Fraction,
+        "divide": money.divide,
+        "to_paise": _to_paise,
+        "FormulaError": FormulaError,
+        "r_zero": Fraction(0),
+        **FUNCTIONS,
+        **constants,
+    }
+    exec(compile(source, "<salary formulas>", "exec"), namespace)
+    return namespace["evaluate"]
+
+
+def _read(name, component, by_code, known_codes):
+    pk = component.pk
+    if name == BASIC:
+        return "r_basic"
+    if name == GROSS:
+        return "r_gross"
+    if name == AMOUNT:
+        return f"Fraction(amounts[{pk}], 100)"
+    if name in by_code:
+        return f"r{by_code[name].pk}"
+    if name in known_codes:
+        return "r_zero"
+    raise FormulaError(f"{component.code}: unknown component {name}.")
+
+
+def _to_paise(rupees, rounding):
+    rupees = Fraction(rupees)
+    return money.divide(rupees.numerator * 100, rupees.denominator, rounding)
@@ -0,0 +1,230 @@
+import csv
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import money
+from .bulk import after_bulk_write
+from .calculations import calculate_structure
+from .models import Employee, SalaryComponent, SalaryStructure, SalaryStructureLine
+from .registry import component_registry
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Columns that describe the structure itself. Every other column must be the
+# code of a SalaryComponent and holds the line amount (or percentage).
+STRUCTURE_COLUMNS = {
+    "employee_id",
+    "name",
+    "effective_date",
+    "end_date",
+    "basic_pay",
+    "description",
+}
+REQUIRED_COLUMNS = {"employee_id", "effective_date", "basic_pay"}
+
+
+class ImportRowError(Exception):
+    pass
+
+
+@dataclass
+class ImportResult:
+    structures_created: int = 0
+    lines_created: int = 0
+    employees_created: int = 0
+    errors: list = field(default_factory=list)
+
+
+def _parse_date(value, column):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise ImportRowError(f"{column}: invalid date {value!r}.")
+
+
+def _parse_amount(value, column):
+    try:
+        amount = money.parse_amount(value)
+    except ValueError:
+        raise ImportRowError(
+            f"{column}: invalid number {value!r}; use at most two decimals."
+        )
+    if amount < 0:
+        raise ImportRowError(f"{column}: must be a positive number.")
+    return amount
+
+
+def parse_row(row, components):
+    """Validate one CSV row and return a dict ready for import."""
+    employee_id = (row.get("employee_id") or "").strip()
+    if not employee_id:
+        raise ImportRowError("employee_id: required.")
+    effective_date = _parse_date(
+        (row.get("effective_date") or "").strip(), "effective_date"
+    )
+    end_date = (row.get("end_date") or "").strip()
+    if end_date:
+        end_date = _parse_date(end_date, "end_date")
+        if end_date < effective_date:
+            raise ImportRowError("end_date: must be after effective date.")
+    else:
+        end_date = None
+    lines = []
+    for code, component in components.items():
+        value = (row.get(code) or "").strip()
+        if value:
+            lines.append((component, _parse_amount(value, code)))
+    return {
+        "employee_id": employee_id,
+        "name": (row.get("name") or "").strip(),
+        "effective_date": effective_date,
+        "end_date": end_date,
+        "basic_pay": _parse_amount((row.get("basic_pay") or "").strip(), "basic_pay"),
+        "description": row.get("description") or "",
+        "lines": lines,
+    }
+
+
+def _import_chunk(chunk, result):
+    """Write one chunk of parsed rows using a fixed number of queries."""
+    employees = Employee.objects.in_bulk(
+        [data["employee_id"] for _, data in chunk], field_name="employee_id"
+    )
+    new_employees = []
+    rows = []
+    for line_number, data in chunk:
+        if data["employee_id"] not in employees:
+            if not data["name"]:
+                result.errors.append(
+                    (line_number, "name: required for a new employee.")
+                )
+                continue
+            employee = Employee(employee_id=data["employee_id"], name=data["name"])
+            employees[data["employee_id"]] = employee
+            new_employees.append(employee)
+        rows.append((line_number, data))
+    if not rows:
+        return
+
+    with transaction.atomic():
+        Employee.objects.bulk_create(new_employees)
+        result.employees_created += len(new_employees)
+
+        now = timezone.now()
+        structures = []
+        for _, data in rows:
+            totals = calculate_structure(
+                money.to_minor(data["basic_pay"]),
+                (
+                    (
+                        component.pk,
+                        component.mode,
+                        component.component_type,
+                        component.rounding,
+                        money.to_minor(amount),
+                    )
+                    for component, amount in data["lines"]
+                ),
+            )
+            structures.append(
+                SalaryStructure(
+                    employee=employees[data["employee_id"]],
+                    effective_date=data["effective_date"],
+                    end_date=data["end_date"],
+                    basic_pay=data["basic_pay"],
+                    description=data["description"],
+                    is_active=True,
+                    created_at=now,
+                    updated_at=now,
+                    gross_amount=totals["gross"],
+                    net_amount=totals["net"],
+                    total_earnings=totals["earnings"],
+                    total_deductions=totals["deductions"],
+                )
+            )
+        clashing = SalaryStructure.objects.clashing(structures)
+        if clashing:
+            kept = []
+            for structure, (line_number, data) in zip(structures, rows):
+                if structure.employee_id in clashing:
+                    result.errors.append(
+                        (
+                            line_number,
+                            "effective_date: overlaps an existing structure that "
+                            "starts on or after it or covers its period.",
+                        )
+                    )
+                else:
+                    kept.append((structure, (line_number, data)))
+            structures = [structure for structure, _ in kept]
+            rows = [row for _, row in kept]
+        # Closes the previous structures of these employees first.
+        SalaryStructure.objects.bulk_create_active(structures, now=now)
+
+        lines = [
+            SalaryStructureLine(
+                salary_structure=structure,
+                salary_component=component,
+                amount=amount,
+                created_at=now,
+                updated_at=now,
+            )
+            for structure, (_, data) in zip(structures, rows)
+            for component, amount in data["lines"]
+        ]
+        SalaryStructureLine.objects.bulk_create(lines)
+        after_bulk_write(data["employee_id"] for _, data in rows)
+    result.structures_created += len(structures)
+    result.lines_created += len(lines)
+
+
+def import_structures(csv_file, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Import salary structures from a CSV file object, one structure per row.
+
+    Rows are streamed and written in chunks: each chunk deactivates the
+    previous structures of its employees with a single UPDATE and inserts
+    employees, structures and lines with ``bulk_create``. Invalid rows are
+    skipped and reported in ``ImportResult.errors`` as ``(line, message)``.
+    A ValueError is raised if the header is missing columns or names an
+    unknown component.
+    """
+    reader = csv.DictReader(csv_file)
+    columns = set(reader.fieldnames or [])
+    missing = REQUIRED_COLUMNS - columns
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(sorted(missing))}.")
+    codes = columns - STRUCTURE_COLUMNS
+    components = {}
+    unknown = set()
+    for code in codes:
+        try:
+            components[code] = component_registry.get_by_code(code)
+        except SalaryComponent.DoesNotExist:
+            unknown.add(code)
+    if unknown:
+        raise ValueError(f"Unknown components: {', '.join(sorted(unknown))}.")
+
+    result = ImportResult()
+    chunk = []
+    chunk_employees = set()
+    for row in reader:
+        try:
+            data = parse_row(row, components)
+        except ImportRowError as exc:
+            result.errors.append((reader.line_num, str(exc)))
+            continue
+        # Keep rows for one employee in separate chunks so they apply in order.
+        if len(chunk) >= chunk_size or data["employee_id"] in chunk_employees:
+            _import_chunk(chunk, result)
+            chunk = []
+            chunk_employees = set()
+        chunk.append((reader.line_num, data))
+        chunk_employees.add(data["employee_id"])
+    if chunk:
+        _import_chunk(chunk, result)
+    result.errors.sort()
+    return result
@@ -0,0 +1,133 @@
+"""
+Timing and counters for payroll runs.
+
+A RunMetrics collects, per phase, the wall time, the number of queries sent to
+the database and the number of rows handled, plus the peak resident memory of
+the process. Metrics are picklable so shard workers can return theirs to the
+parent run, which merges them and stores one PayrollRunMetric row per phase.
+"""
+
+import cProfile
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from django.db import connection
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+# Phases of a payroll run, in the order they are reported.
+LOAD = "load"
+CALCULATE = "calculate"
+WRITE = "write"
+SUMMARIZE = "summarize"
+PHASES = [LOAD, CALCULATE, WRITE, SUMMARIZE]
+
+
+def peak_memory():
+    """Peak resident memory of this process in bytes, or None if unknown."""
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+@dataclass
+class PhaseTiming:
+    seconds: float = 0.0
+    queries: int = 0
+    rows: int = 0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def add(self, other):
+        self.seconds += other.seconds
+        self.queries += other.queries
+        self.rows += other.rows
+
+
+@dataclass
+class RunMetrics:
+    phases: dict = field(default_factory=dict)
+    peak_memory: int = None
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Time the block and count its queries under ``name``; the caller adds
+        the rows it handled to the yielded PhaseTiming.
+        """
+        timing = self.phases.setdefault(name, PhaseTiming())
+
+        def count_queries(execute, sql, params, many, context):
+            timing.queries += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(count_queries):
+                yield timing
+        finally:
+            timing.seconds += time.perf_counter() - started
+
+    def iterate(self, name, iterable):
+        """Yield from ``iterable``, timing each step and counting its items."""
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name) as timing:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                timing.rows += len(item)
+            yield item
+
+    def sample_memory(self):
+        memory = peak_memory()
+        if memory is not None:
+            self.peak_memory = max(self.peak_memory or 0, memory)
+
+    def add(self, other):
+        for name, timing in other.phases.items():
+            self.phases.setdefault(name, PhaseTiming()).add(timing)
+        if other.peak_memory is not None:
+            self.peak_memory = max(self.peak_memory or 0, other.peak_memory)
+
+    def summary(self):
+        """One line per phase, for logs and command output."""
+        lines = [
+            f"{name}: {timing.seconds:.3f}s, {timing.queries} queries, "
+            f"{timing.rows} rows ({timing.rows_per_second:.0f} rows/s)"
+            for name, timing in sorted(
+                self.phases.items(),
+                key=lambda item: PHASES.index(item[0]) if item[0] in PHASES else 99,
+            )
+        ]
+        if self.peak_memory is not None:
+            lines.append(f"peak memory: {self.peak_memory / 2**20:.1f} MiB")
+        return "\n".join(lines)
+
+
+@contextmanager
+def profiled(profile_dir, name):
+    """
+    Profile the block with cProfile and dump the stats to
+    ``<profile_dir>/<name>.prof``. Does nothing when ``profile_dir`` is empty.
+    """
+    if not profile_dir:
+        yield None
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        os.makedirs(profile_dir, exist_ok=True)
+        profiler.dump_stats(os.path.join(profile_dir, f"{name}.prof"))
@@ -0,0 +1,81 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from payroll.engine import DEFAULT_BACKEND, BACKENDS, run_payroll
+from payroll.models import (
+    DeletedRecord,
+    MonthlySalary,
+    PayrollComponentSummary,
+    PayrollPeriodSummary,
+    PayrollRun,
+    SalaryPayment,
+)
+
+DISCARD_BATCH_SIZE = 2000
+
+
+def discard_run(payroll_run, month, year):
+    """
+    Remove a benchmark run and everything it wrote, without leaving sync
+    tombstones for its salaries or summaries of the month. Shards commit in
+    their own connections, so the run cannot simply be rolled back.
+    """
+    salary_ids = list(payroll_run.monthly_salaries.values_list("pk", flat=True))
+    with transaction.atomic():
+        # Adjustments the run took over for payment wait for the next run again.
+        SalaryPayment.objects.filter(payroll_run=payroll_run).exclude(
+            monthly_salary__payroll_run=payroll_run
+        ).update(payroll_run=None)
+        for start in range(0, len(salary_ids), DISCARD_BATCH_SIZE):
+            batch = salary_ids[start : start + DISCARD_BATCH_SIZE]
+            MonthlySalary.objects.filter(pk__in=batch).delete()
+            DeletedRecord.objects.filter(
+                resource="monthly_salaries", object_id__in=batch
+            ).delete()
+        payroll_run.delete()
+        PayrollComponentSummary.objects.filter(month=month, year=year).delete()
+        PayrollPeriodSummary.objects.filter(month=month, year=year).delete()
+
+
+class Command(BaseCommand):
+    help = (
+        "Time a payroll run for a month at several worker counts. Each run and "
+        "the salaries and summaries it wrote are removed afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("month", type=int)
+        parser.add_argument("year", type=int)
+        parser.add_argument(
+            "--workers", type=int, nargs="+", default=[1, 2, 4], metavar="N"
+        )
+        parser.add_argument(
+            "--backend", choices=sorted(BACKENDS), default=DEFAULT_BACKEND
+        )
+
+    def handle(self, *args, month, year, workers, backend, **options):
+        if MonthlySalary.objects.filter(month=month, year=year).exists():
+            raise CommandError(
+                f"Salaries already exist for {month}/{year}; pick an unpaid month."
+            )
+        baseline = None
+        self.stdout.write("workers  seconds  salaries/s  speedup")
+        for count in workers:
+            payroll_run = PayrollRun(
+                run_date=timezone.now(), run_version=f"benchmark-{count}"
+            )
+            started = time.perf_counter()
+            result = run_payroll(
+                month, year, payroll_run=payroll_run, backend=backend, workers=count
+            )
+            elapsed = time.perf_counter() - started
+            baseline = baseline or elapsed
+            self.stdout.write(
+                f"{count:>7}  {elapsed:>7.2f}  "
+                f"{result.salaries_created / elapsed:>10.0f}  "
+                f"{baseline / elapsed:>6.2f}x"
+            )
+            discard_run(payroll_run, month, year)
@@ -0,0 +1,68 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payroll.benchmarks import (
+    CASES,
+    SCALES,
+    BenchmarkError,
+    compare_results,
+    run_benchmarks,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Time calculation, views, payroll runs, exports and imports on "
+        "synthetic data at several scales, on a database without employees. "
+        "Generated data is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scales", type=int, nargs="+", default=SCALES, metavar="EMPLOYEES"
+        )
+        parser.add_argument("--cases", nargs="+", choices=CASES, metavar="CASE")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+        parser.add_argument(
+            "--baseline",
+            help="JSON report of an earlier release; fail if any case got slower.",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.2,
+            help="Allowed drop in rows per second against the baseline.",
+        )
+
+    def handle(self, *args, scales, cases, seed, output, baseline, **options):
+        try:
+            report = run_benchmarks(scales, cases, seed=seed)
+        except BenchmarkError as exc:
+            raise CommandError(exc)
+
+        self.stdout.write("case               employees   seconds  queries   rows/s")
+        for result in report["results"]:
+            self.stdout.write(
+                f"{result['case']:<18} {result['scale']:>9}  "
+                f"{result['seconds']:>8.3f}  {result['queries']:>7}  "
+                f"{result['rows_per_second']:>7.0f}"
+            )
+        if output:
+            with open(output, "w", encoding="utf-8") as report_file:
+                json.dump(report, report_file, indent=2)
+
+        if baseline:
+            with open(baseline, encoding="utf-8") as baseline_file:
+                regressions = compare_results(
+                    json.load(baseline_file), report, options["tolerance"]
+                )
+            if regressions:
+                raise CommandError(
+                    "Slower than baseline: "
+                    + "; ".join(
+                        f"{case} at {scale}: {rate:.0f} rows/s, was {previous:.0f}"
+                        for case, scale, previous, rate in regressions
+                    )
+                )
@@ -0,0 +1,66 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from payroll.arrears import compute_arrears
+from payroll.engine import BACKENDS, DEFAULT_BACKEND, DEFAULT_CHUNK_SIZE
+from payroll.models import PayrollAdjustment, SalaryStructure
+
+
+class Command(BaseCommand):
+    help = (
+        "Write arrears for paid months covered by back-dated salary structures "
+        "as payroll adjustments. By default only structures created or changed "
+        "since the last arrears were written are checked."
+    )
+
+    def add_arguments(self, parser):
+        since = parser.add_mutually_exclusive_group()
+        since.add_argument(
+            "--since",
+            type=date.fromisoformat,
+            help="Only structures created or changed on or after this date.",
+        )
+        since.add_argument("--all", action="store_true", help="Check every structure.")
+        parser.add_argument("--employees", nargs="+", metavar="EMPLOYEE_ID")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument(
+            "--backend", choices=sorted(BACKENDS), default=DEFAULT_BACKEND
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report the arrears without writing anything.",
+        )
+
+    def handle(self, *args, **options):
+        structures = SalaryStructure.objects.all()
+        if options["since"]:
+            structures = structures.filter(updated_at__date__gte=options["since"])
+        elif not options["all"]:
+            last_run = PayrollAdjustment.objects.filter(
+                salary_structure__isnull=False
+            ).aggregate(last=Max("created_at"))["last"]
+            if last_run is not None:
+                structures = structures.filter(updated_at__gt=last_run)
+        if options["employees"]:
+            structures = structures.filter(
+                employee__employee_id__in=options["employees"]
+            )
+        result = compute_arrears(
+            structures,
+            dry_run=options["dry_run"],
+            chunk_size=options["chunk_size"],
+            backend=options["backend"],
+        )
+        for (year, month), amount in sorted(result.periods.items()):
+            self.stdout.write(f"{month:02d}/{year}: {amount:+.2f}")
+        prefix = "Would write" if result.dry_run else "Wrote"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefix} {result.adjustments_created} arrears totalling "
+                f"{result.total:.2f} for {result.salaries_checked} paid months of "
+                f"{result.structures} structures."
+            )
+        )
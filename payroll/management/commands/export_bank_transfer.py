@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from payroll.exports import (
+    CSV,
+    FIXED,
+    FORMATS,
+    fixed_width_errors,
+    iter_bank_transfer_file,
+    missing_primary_accounts,
+)
+from payroll.models import PayrollRun
+
+
+class Command(BaseCommand):
+    help = "Write the bank transfer file for a completed payroll run."
+
+    def add_arguments(self, parser):
+        parser.add_argument("payroll_run_id", type=int)
+        parser.add_argument("--format", choices=FORMATS, default=CSV)
+        parser.add_argument(
+            "--output", help="File to write to. Defaults to standard output."
+        )
+
+    def handle(self, *args, payroll_run_id, format, output, **options):
+        try:
+            payroll_run = PayrollRun.objects.get(
+                pk=payroll_run_id, status=PayrollRun.COMPLETED
+            )
+        except PayrollRun.DoesNotExist:
+            raise CommandError(f"No completed payroll run with id {payroll_run_id}.")
+
+        if format == FIXED:
+            errors = fixed_width_errors(payroll_run)
+            if errors:
+                raise CommandError("\n".join(errors))
+        lines = iter_bank_transfer_file(payroll_run, format)
+        if output:
+            with open(output, "w", newline="", encoding="utf-8") as bank_file:
+                bank_file.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending="")
+
+        for salary in missing_primary_accounts(payroll_run).select_related("employee"):
+            self.stderr.write(f"No primary bank account for {salary.employee}.")
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from payroll.synthetic import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_FIRST_ID,
+    generate_payroll_data,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with synthetic employees, bank accounts, salary "
+        "components, structures and lines. The same seed gives the same data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("employees", type=int)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--first-id",
+            type=int,
+            default=DEFAULT_FIRST_ID,
+            help="Employee id of the first generated employee.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, employees, seed, first_id, chunk_size, **options):
+        try:
+            result = generate_payroll_data(
+                employees, seed=seed, first_id=first_id, chunk_size=chunk_size
+            )
+        except ValueError as exc:
+            raise CommandError(exc)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {result.employees} employees, {result.bank_accounts} "
+                f"bank accounts, {result.structures} structures and "
+                f"{result.lines} lines."
+            )
+        )
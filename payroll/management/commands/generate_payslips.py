@@ -0,0 +1,53 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from payroll.models import PayrollRun
+from payroll.payslips import (
+    FORMATS,
+    HTML,
+    check_format,
+    iter_payslip_zip,
+    write_payslips,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the payslips of a payroll run into a ZIP archive or into one "
+        "file per employee in a directory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("payroll_run_id", type=int)
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument("--output", help="Path of the ZIP archive to write.")
+        target.add_argument("--directory", help="Directory for per-employee files.")
+        parser.add_argument("--format", choices=FORMATS, default=HTML)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of worker processes rendering payslips.",
+        )
+
+    def handle(self, *args, payroll_run_id, output, directory, **options):
+        try:
+            payroll_run = PayrollRun.objects.get(pk=payroll_run_id)
+        except PayrollRun.DoesNotExist:
+            raise CommandError(f"Payroll run {payroll_run_id} does not exist.")
+        file_format = options["format"]
+        workers = options["workers"]
+        try:
+            check_format(file_format)
+        except ImproperlyConfigured as exc:
+            raise CommandError(str(exc))
+        if directory:
+            written = write_payslips(payroll_run, directory, file_format, workers)
+            self.stdout.write(
+                self.style.SUCCESS(f"Wrote {written} payslips to {directory}.")
+            )
+            return
+        with open(output, "wb") as archive:
+            for data in iter_payslip_zip(payroll_run, file_format, workers):
+                archive.write(data)
+        self.stdout.write(self.style.SUCCESS(f"Wrote payslips to {output}."))
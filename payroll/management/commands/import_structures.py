@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from payroll.importers import DEFAULT_CHUNK_SIZE, import_structures
+
+
+class Command(BaseCommand):
+    help = (
+        "Import salary structures from a CSV file. Columns are employee_id, "
+        "name, effective_date, end_date, basic_pay, description and one column "
+        "per salary component code."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, path, chunk_size, **options):
+        try:
+            with open(path, newline="", encoding="utf-8") as csv_file:
+                result = import_structures(csv_file, chunk_size=chunk_size)
+        except (OSError, ValueError) as exc:
+            raise CommandError(exc)
+        for line_number, message in result.errors:
+            self.stderr.write(f"Line {line_number}: {message}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {result.structures_created} structures with "
+                f"{result.lines_created} lines, created "
+                f"{result.employees_created} employees, "
+                f"{len(result.errors)} rows rejected."
+            )
+        )
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from payroll.reports import (
+    REPORTS,
+    iter_report_csv,
+    refresh_all_summaries,
+    refresh_summaries,
+)
+
+
+class Command(BaseCommand):
+    help = "Write a payroll summary report as CSV, optionally refreshing it first."
+
+    def add_arguments(self, parser):
+        parser.add_argument("report", choices=REPORTS)
+        parser.add_argument("--month", type=int)
+        parser.add_argument("--year", type=int)
+        parser.add_argument(
+            "--refresh",
+            action="store_true",
+            help="Recompute the summaries from the salaries first: the given "
+            "month, or every month when --month and --year are not both given.",
+        )
+        parser.add_argument(
+            "--output", help="File to write to. Defaults to standard output."
+        )
+
+    def handle(self, *args, report, month, year, refresh, output, **options):
+        if refresh:
+            if month and year:
+                refresh_summaries(month, year)
+                periods = 1
+            else:
+                periods = refresh_all_summaries()
+            self.stderr.write(f"Refreshed summaries of {periods} month(s).")
+
+        lines = iter_report_csv(report, month, year)
+        if output:
+            with open(output, "w", newline="", encoding="utf-8") as report_file:
+                report_file.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending="")
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+
+from payroll.background import process_payroll_run, requeue_stale_runs
+from payroll.engine import BACKENDS, DEFAULT_BACKEND, DEFAULT_CHUNK_SIZE
+from payroll.models import PayrollRun
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the payroll runs queued from the web and still pending, oldest "
+        "first, e.g. after the web process restarted. Runs left in progress by "
+        "a worker that died are requeued first and resume where they stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument(
+            "--backend", choices=sorted(BACKENDS), default=DEFAULT_BACKEND
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of worker processes computing employee shards.",
+        )
+
+    def handle(self, *args, **options):
+        for payroll_run_id in requeue_stale_runs():
+            self.stdout.write(f"Requeued stale payroll run {payroll_run_id}.")
+        pending = PayrollRun.objects.filter(status=PayrollRun.PENDING).order_by("pk")
+        for payroll_run_id in pending.values_list("pk", flat=True):
+            try:
+                result = process_payroll_run(
+                    payroll_run_id,
+                    chunk_size=options["chunk_size"],
+                    backend=options["backend"],
+                    workers=options["workers"],
+                )
+            except Exception as exc:
+                self.stderr.write(f"Payroll run {payroll_run_id} failed: {exc}")
+                continue
+            if result is None:
+                continue
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{result.payroll_run}: {result.salaries_created} salaries "
+                    f"created, {result.salaries_updated} updated, "
+                    f"{result.skipped} skipped."
+                )
+            )
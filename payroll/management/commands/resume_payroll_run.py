@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from payroll.engine import (
+    BACKENDS,
+    DEFAULT_BACKEND,
+    DEFAULT_CHUNK_SIZE,
+    PayrollRunError,
+    resume_payroll,
+)
+from payroll.models import PayrollRun
+
+
+class Command(BaseCommand):
+    help = "Resume an interrupted payroll run from its last committed checkpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument("payroll_run_id", type=int)
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument(
+            "--backend", choices=sorted(BACKENDS), default=DEFAULT_BACKEND
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of worker processes computing employee shards.",
+        )
+        parser.add_argument(
+            "--profile-dir",
+            help="Dump cProfile stats of the run (or of each shard) to this "
+            "directory.",
+        )
+
+    def handle(self, *args, payroll_run_id, **options):
+        try:
+            payroll_run = PayrollRun.objects.get(pk=payroll_run_id)
+        except PayrollRun.DoesNotExist:
+            raise CommandError(f"Payroll run {payroll_run_id} does not exist.")
+        try:
+            result = resume_payroll(
+                payroll_run,
+                chunk_size=options["chunk_size"],
+                backend=options["backend"],
+                workers=options["workers"],
+                profile_dir=options["profile_dir"],
+            )
+        except PayrollRunError as exc:
+            raise CommandError(f"Payroll run failed: {exc}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{result.payroll_run}: {result.salaries_created} salaries created, "
+                f"{result.salaries_updated} updated, {result.lines_created} lines, "
+                f"{result.skipped} skipped."
+            )
+        )
+        if options["verbosity"] > 1:
+            self.stdout.write(result.metrics.summary())
@@ -0,0 +1,98 @@
+from argparse import ArgumentTypeError
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payroll.money import parse_amount
+from payroll.models import SalaryComponent, SalaryStructure
+from payroll.revisions import DEFAULT_CHUNK_SIZE, parse_hike, revise_structures
+
+
+def component_hike(text):
+    code, separator, hike = text.partition("=")
+    if not separator:
+        raise ValueError(f"Invalid component hike {text!r}; use CODE=HIKE.")
+    return code.strip(), parse_hike(hike)
+
+
+def gross_amount(text):
+    try:
+        return parse_amount(text)
+    except ValueError:
+        raise ArgumentTypeError(
+            f"invalid amount {text!r}; use a number with at most two decimals."
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        "Revise the active salary structures of many employees at once: close "
+        "them and create successors with hikes to basic pay and components."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("effective_date", type=date.fromisoformat)
+        parser.add_argument(
+            "--basic", type=parse_hike, help="Hike to basic pay, e.g. 10% or 1500."
+        )
+        parser.add_argument(
+            "--component",
+            type=component_hike,
+            action="append",
+            default=[],
+            metavar="CODE=HIKE",
+            help="Hike to a component's line amount; repeat for more components.",
+        )
+        parser.add_argument("--employees", nargs="+", metavar="EMPLOYEE_ID")
+        parser.add_argument(
+            "--employee-prefix", help="Only employees whose id starts with this."
+        )
+        parser.add_argument("--min-gross", type=gross_amount)
+        parser.add_argument("--max-gross", type=gross_amount)
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report the revision and its cost without writing anything.",
+        )
+
+    def handle(self, *args, effective_date, basic, component, **options):
+        if basic is None and not component:
+            raise CommandError("Give --basic and/or at least one --component hike.")
+        structures = SalaryStructure.objects.filter(employee__is_active=True).pay_band(
+            options["min_gross"], options["max_gross"]
+        )
+        if options["employees"]:
+            structures = structures.filter(
+                employee__employee_id__in=options["employees"]
+            )
+        if options["employee_prefix"]:
+            structures = structures.filter(
+                employee__employee_id__startswith=options["employee_prefix"]
+            )
+        try:
+            result = revise_structures(
+                structures,
+                effective_date,
+                basic=basic,
+                components=dict(component),
+                dry_run=options["dry_run"],
+                chunk_size=options["chunk_size"],
+            )
+        except SalaryComponent.DoesNotExist as exc:
+            raise CommandError(exc)
+
+        for employee_id, reason in result.skipped:
+            self.stderr.write(f"Skipped {employee_id}: {reason}")
+        prefix = "Would revise" if result.dry_run else "Revised"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefix} {result.structures_created} structures with "
+                f"{result.lines_created} lines, {len(result.skipped)} skipped."
+            )
+        )
+        self.stdout.write(
+            f"Monthly gross {result.gross_before:.2f} -> {result.gross_after:.2f} "
+            f"({result.gross_increase:+.2f}), net {result.net_before:.2f} -> "
+            f"{result.net_after:.2f} ({result.net_increase:+.2f})."
+        )
@@ -0,0 +1,79 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from payroll.engine import (
+    BACKENDS,
+    DEFAULT_BACKEND,
+    DEFAULT_CHUNK_SIZE,
+    PayrollRunError,
+    run_payroll,
+)
+from payroll.models import PayrollRun
+
+
+class Command(BaseCommand):
+    help = "Generate monthly salaries for every active employee for a month."
+
+    def add_arguments(self, parser):
+        parser.add_argument("month", type=int)
+        parser.add_argument("year", type=int)
+        parser.add_argument("--run-version", help="Identifier for the payroll run.")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument(
+            "--backend", choices=sorted(BACKENDS), default=DEFAULT_BACKEND
+        )
+        parser.add_argument(
+            "--as-of",
+            type=date.fromisoformat,
+            help="Pay from the structures in force on this date (YYYY-MM-DD) "
+            "instead of the active ones.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of worker processes computing employee shards.",
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Recompute existing salaries whose inputs changed since they "
+            "were computed.",
+        )
+        parser.add_argument(
+            "--profile-dir",
+            help="Dump cProfile stats of the run (or of each shard) to this "
+            "directory.",
+        )
+
+    def handle(self, *args, month, year, run_version, **options):
+        if not 1 <= month <= 12:
+            raise CommandError(f"Invalid month: {month}")
+        payroll_run = None
+        if run_version:
+            payroll_run = PayrollRun(run_date=timezone.now(), run_version=run_version)
+        try:
+            result = run_payroll(
+                month,
+                year,
+                payroll_run=payroll_run,
+                chunk_size=options["chunk_size"],
+                backend=options["backend"],
+                as_of=options["as_of"],
+                workers=options["workers"],
+                incremental=options["incremental"],
+                profile_dir=options["profile_dir"],
+            )
+        except PayrollRunError as exc:
+            raise CommandError(f"Payroll run failed: {exc}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{result.payroll_run}: {result.salaries_created} salaries created, "
+                f"{result.salaries_updated} updated, {result.lines_created} lines, "
+                f"{result.skipped} skipped."
+            )
+        )
+        if options["verbosity"] > 1:
+            self.stdout.write(result.metrics.summary())
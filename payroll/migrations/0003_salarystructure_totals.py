@@ -0,0 +1,37 @@
+# Generated by Django 5.1.15 on 2026-10-18 05:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payroll", "0002_payrollrun_remove_salarycomponent_is_percentage_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="salarystructure",
+            name="gross_amount",
+            field=models.DecimalField(
+                db_index=True, decimal_places=2, default=0, max_digits=10
+            ),
+        ),
+        migrations.AddField(
+            model_name="salarystructure",
+            name="net_amount",
+            field=models.DecimalField(
+                db_index=True, decimal_places=2, default=0, max_digits=10
+            ),
+        ),
+        migrations.AddField(
+            model_name="salarystructure",
+            name="total_deductions",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name="salarystructure",
+            name="total_earnings",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+    ]
@@ -0,0 +1,76 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations
+
+BATCH_SIZE = 2000
+PAISA = Decimal("0.01")
+
+
+def calculate_totals(basic_pay, lines):
+    """
+    Totals of one structure as calculated when this migration was written.
+    Frozen here so later changes to payroll.calculations cannot alter it.
+    """
+    basic_pay = Decimal(basic_pay)
+    earnings = Decimal("0.00")
+    deductions = Decimal("0.00")
+    for mode, component_type, amount in lines:
+        value = basic_pay * amount / 100 if mode == "percentage" else amount
+        value = Decimal(value).quantize(PAISA, rounding=ROUND_HALF_UP)
+        if component_type == "earning":
+            earnings += value
+        else:
+            deductions += value
+    gross = basic_pay + earnings
+    return {
+        "earnings": earnings,
+        "deductions": deductions,
+        "gross": gross,
+        "net": gross - deductions,
+    }
+
+
+def backfill_totals(apps, schema_editor):
+    SalaryStructure = apps.get_model("payroll", "SalaryStructure")
+    SalaryStructureLine = apps.get_model("payroll", "SalaryStructureLine")
+
+    ids = list(SalaryStructure.objects.order_by("pk").values_list("pk", flat=True))
+    for start in range(0, len(ids), BATCH_SIZE):
+        batch_ids = ids[start : start + BATCH_SIZE]
+        lines = {}
+        for structure_id, mode, component_type, amount in (
+            SalaryStructureLine.objects.filter(salary_structure_id__in=batch_ids)
+            .order_by("pk")
+            .values_list(
+                "salary_structure_id",
+                "salary_component__mode",
+                "salary_component__component_type",
+                "amount",
+            )
+        ):
+            lines.setdefault(structure_id, []).append((mode, component_type, amount))
+        structures = []
+        for structure in SalaryStructure.objects.filter(pk__in=batch_ids).only(
+            "pk", "basic_pay"
+        ):
+            result = calculate_totals(structure.basic_pay, lines.get(structure.pk, []))
+            structure.gross_amount = result["gross"]
+            structure.net_amount = result["net"]
+            structure.total_earnings = result["earnings"]
+            structure.total_deductions = result["deductions"]
+            structures.append(structure)
+        SalaryStructure.objects.bulk_update(
+            structures,
+            ["gross_amount", "net_amount", "total_earnings", "total_deductions"],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payroll", "0003_salarystructure_totals"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
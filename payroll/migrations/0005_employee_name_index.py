@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 05:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payroll", "0004_backfill_salarystructure_totals"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="employee",
+            name="name",
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.15 on 2026-10-18 05:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payroll", "0005_employee_name_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="salarystructure",
+            index=models.Index(
+                fields=["employee", "effective_date", "end_date"],
+                name="structure_effective_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 05:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payroll", "0006_structure_effective_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="monthlysalary",
+            name="input_hash",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.1.15 on 2026-10-18 05:33
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payroll", "0007_monthlysalary_input_hash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="payrollrun",
+            name="as_of",
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="payrollrun",
+            name="incremental",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="payrollrun",
+            name="month",
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="payrollrun",
+            name="year",
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name="PayrollRunCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("chunk_index", models.PositiveIntegerField()),
+                ("last_structure_id", models.BigIntegerField(blank=True, null=True)),
+                ("salaries_created", models.PositiveIntegerField(default=0)),
+                ("salaries_updated", models.PositiveIntegerField(default=0)),
+                ("lines_created", models.PositiveIntegerField(default=0)),
+                ("skipped", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "payroll_run",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="checkpoints",
+                        to="payroll.payrollrun",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["chunk_index"],
+                "unique_together": {("payroll_run", "chunk_index")},
+            },
+        ),
+    ]
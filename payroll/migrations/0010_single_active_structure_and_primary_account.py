@@ -0,0 +1,72 @@
+# Generated by Django 5.1.15 on 2026-10-18 05:43
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def _duplicates(queryset):
+    return (
+        queryset.order_by()
+        .values("employee_id")
+        .annotate(count=Count("pk"))
+        .filter(count__gt=1)
+        .values_list("employee_id", flat=True)
+    )
+
+
+def resolve_duplicates(apps, schema_editor):
+    """
+    Keep one active structure (the latest effective) and one primary account
+    (the latest added) per employee, so the constraints can be created.
+    """
+    SalaryStructure = apps.get_model("payroll", "SalaryStructure")
+    BankAccount = apps.get_model("payroll", "BankAccount")
+
+    active = SalaryStructure.objects.filter(is_active=True)
+    for employee_id in list(_duplicates(active)):
+        keep = (
+            active.filter(employee_id=employee_id)
+            .order_by("-effective_date", "-pk")
+            .values_list("pk", flat=True)
+            .first()
+        )
+        active.filter(employee_id=employee_id).exclude(pk=keep).update(is_active=False)
+
+    primary = BankAccount.objects.filter(is_primary=True)
+    for employee_id in list(_duplicates(primary)):
+        keep = (
+            primary.filter(employee_id=employee_id)
+            .order_by("-pk")
+            .values_list("pk", flat=True)
+            .first()
+        )
+        primary.filter(employee_id=employee_id).exclude(pk=keep).update(
+            is_primary=False
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payroll", "0009_payrollrun_metrics"),
+    ]
+
+    operations = [
+        migrations.RunPython(resolve_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="bankaccount",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("is_primary", True)),
+                fields=("employee",),
+                name="one_primary_account_per_employee",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="salarystructure",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("is_active", True)),
+                fields=("employee",),
+                name="one_active_structure_per_employee",
+            ),
+        ),
+    ]
@@ -0,0 +1,104 @@
+# Generated by Django 5.1.15 on 2026-10-18 05:45
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payroll", "0010_single_active_structure_and_primary_account"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PayrollPeriodSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("month", models.PositiveSmallIntegerField()),
+                ("year", models.PositiveSmallIntegerField()),
+                ("employees", models.PositiveIntegerField(default=0)),
+                (
+                    "gross_amount",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=16),
+                ),
+                (
+                    "net_amount",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=16),
+                ),
+                (
+                    "total_earnings",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=16),
+                ),
+                (
+                    "total_deductions",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=16),
+                ),
+                (
+                    "total_adjustments",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=16),
+                ),
+                (
+                    "refreshed_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+            options={
+                "ordering": ["-year", "-month"],
+                "unique_together": {("month", "year")},
+            },
+        ),
+        migrations.CreateModel(
+            name="PayrollComponentSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("month", models.PositiveSmallIntegerField()),
+                ("year", models.PositiveSmallIntegerField()),
+                ("business_unit", models.IntegerField(blank=True, null=True)),
+                (
+                    "component_type",
+                    models.CharField(
+                        choices=[("earning", "Earning"), ("deduction", "Deduction")],
+                        max_length=10,
+                    ),
+                ),
+                ("employees", models.PositiveIntegerField(default=0)),
+                (
+                    "total_amount",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=16),
+                ),
+                (
+                    "refreshed_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "salary_component",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="payroll.salarycomponent",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-year", "-month", "salary_component_id"],
+                "unique_together": {("month", "year", "salary_component")},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.15 on 2026-10-18 05:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payroll", "0011_payroll_summaries"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="payrollrun",
+            name="finished_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="payrollrun",
+            name="started_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="payrollrun",
+            name="total_structures",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.15 on 2026-10-18 05:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payroll", "0012_payroll_run_progress"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="salarycomponent",
+            name="rounding",
+            field=models.CharField(
+                choices=[
+                    ("half_up", "Half up (away from zero)"),
+                    ("half_even", "Half even (banker's)"),
+                    ("down", "Down (towards zero)"),
+                    ("up", "Up (away from zero)"),
+                ],
+                default="half_up",
+                max_length=10,
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.15 on 2026-10-18 06:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payroll", "0013_salary_component_rounding"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="salarycomponent",
+            name="formula",
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="salarycomponent",
+            name="mode",
+            field=models.CharField(
+                choices=[
+                    ("fixed", "Fixed"),
+                    ("percentage", "Percentage"),
+                    ("formula", "Formula"),
+                ],
+                default="fixed",
+                max_length=10,
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.15 on 2026-10-18 06:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payroll", "0014_salary_component_formula"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="payrolladjustment",
+            name="salary_structure",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="arrears",
+                to="payroll.salarystructure",
+            ),
+        ),
+    ]
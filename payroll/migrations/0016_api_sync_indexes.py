@@ -0,0 +1,35 @@
+# Generated by Django 5.1.15 on 2026-10-18 06:08
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payroll", "0015_payroll_adjustment_salary_structure"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="employee",
+            name="updated_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name="employee",
+            index=models.Index(
+                fields=["updated_at", "id"], name="employee_updated_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="monthlysalary",
+            index=models.Index(fields=["updated_at", "id"], name="salary_updated_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="salarystructure",
+            index=models.Index(
+                fields=["updated_at", "id"], name="structure_updated_idx"
+            ),
+        ),
+    ]
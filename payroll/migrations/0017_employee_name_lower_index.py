@@ -0,0 +1,26 @@
+# Generated by Django 5.1.15 on 2026-10-18 06:17
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payroll", "0016_api_sync_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="employee",
+            name="name",
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name="employee",
+            index=models.Index(
+                django.db.models.functions.text.Lower("name"),
+                name="employee_name_lower_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.15 on 2026-10-18 06:22
+
+from django.db import migrations, models
+
+OPEN = ["pending", "in_progress"]
+
+
+def fail_duplicate_open_runs(apps, schema_editor):
+    """Keep only the newest open run of each period, so the constraint holds."""
+    PayrollRun = apps.get_model("payroll", "PayrollRun")
+    seen = set()
+    for pk, month, year in (
+        PayrollRun.objects.filter(status__in=OPEN, month__isnull=False)
+        .order_by("-pk")
+        .values_list("pk", "month", "year")
+    ):
+        if (month, year) in seen:
+            PayrollRun.objects.filter(pk=pk).update(
+                status="failed", notes="Superseded by a later run for the period."
+            )
+        seen.add((month, year))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payroll", "0017_employee_name_lower_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_duplicate_open_runs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="payrollrun",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status__in", ["pending", "in_progress"])),
+                fields=("month", "year"),
+                name="one_open_run_per_period",
+            ),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.15 on 2026-10-18 06:26
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payroll", "0018_payrollrun_one_open_run_per_period"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DeletedRecord",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("resource", models.CharField(max_length=50)),
+                ("object_id", models.BigIntegerField()),
+                ("deleted_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["resource", "deleted_at", "id"],
+                        name="deleted_record_sync_idx",
+                    ),
+                    models.Index(
+                        fields=["deleted_at", "id"], name="deleted_record_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
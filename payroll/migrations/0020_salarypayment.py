@@ -0,0 +1,74 @@
+# Generated by Django 5.1.15 on 2026-10-18 06:41
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+def record_paid_salaries(apps, schema_editor):
+    """Record the net pay of every salary as paid by the run it is on."""
+    MonthlySalary = apps.get_model("payroll", "MonthlySalary")
+    SalaryPayment = apps.get_model("payroll", "SalaryPayment")
+    batch = []
+    for salary_id, payroll_run_id, net_amount in (
+        MonthlySalary.objects.filter(payroll_run__isnull=False)
+        .order_by("pk")
+        .values_list("pk", "payroll_run_id", "net_amount")
+        .iterator(chunk_size=BATCH_SIZE)
+    ):
+        batch.append(
+            SalaryPayment(
+                monthly_salary_id=salary_id,
+                payroll_run_id=payroll_run_id,
+                amount=net_amount,
+            )
+        )
+        if len(batch) >= BATCH_SIZE:
+            SalaryPayment.objects.bulk_create(batch)
+            batch = []
+    SalaryPayment.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payroll", "0019_deletedrecord"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SalaryPayment",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("amount", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "monthly_salary",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="payments",
+                        to="payroll.monthlysalary",
+                    ),
+                ),
+                (
+                    "payroll_run",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="payments",
+                        to="payroll.payrollrun",
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(record_paid_salaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.15 on 2026-10-18 06:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payroll", "0020_salarypayment"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="salarypayment",
+            name="payroll_run",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="payments",
+                to="payroll.payrollrun",
+            ),
+        ),
+    ]
@@ -1,21 +1,68 @@
-from django.db import models
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models.functions import Lower
 from django.utils import timezone
+from django.utils.functional import cached_property
+
+from . import money
 
 
 class Employee(models.Model):
     employee_id = models.CharField(max_length=20, unique=True)
     name = models.CharField(max_length=100)
     is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["updated_at", "id"], name="employee_updated_idx"),
+            # Case-insensitive name prefix search in the employee list.
+            models.Index(Lower("name"), name="employee_name_lower_idx"),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.employee_id})"
 
+    def save(self, *args, **kwargs):
+        # Always update updated_at
+        self.updated_at = timezone.now()
+        super().save(*args, **kwargs)
+
     @property
     def current_salary_structure(self):
         """Returns the current active salary structure for this employee"""
         return self.salary_structures.filter(is_active=True).first()
 
 
+class BankAccountQuerySet(models.QuerySet):
+    def clear_primary(self, employee_ids):
+        """Unset the primary account of every given employee in one UPDATE."""
+        return self.filter(employee_id__in=employee_ids, is_primary=True).update(
+            is_primary=False
+        )
+
+    def bulk_create_accounts(self, accounts, batch_size=None):
+        """``bulk_create`` after demoting the employees' current primary accounts."""
+        primary = [account.employee_id for account in accounts if account.is_primary]
+        if len(primary) != len(set(primary)):
+            raise ValueError("More than one primary account for an employee.")
+        self.clear_primary(primary)
+        return self.bulk_create(accounts, batch_size=batch_size)
+
+    def make_primary(self, account_ids):
+        """Make the given accounts, at most one per employee, primary."""
+        employees = list(
+            self.filter(pk__in=account_ids).values_list("employee_id", flat=True)
+        )
+        if len(employees) != len(set(employees)):
+            raise ValueError("More than one primary account for an employee.")
+        self.clear_primary(employees)
+        return self.filter(pk__in=account_ids).update(is_primary=True)
+
+
 class BankAccount(models.Model):
     employee = models.ForeignKey(
         Employee, on_delete=models.CASCADE, related_name="bank_accounts"
@@ -26,17 +73,24 @@ class BankAccount(models.Model):
     branch_name = models.CharField(max_length=100)
     is_primary = models.BooleanField(default=False)
 
+    objects = BankAccountQuerySet.as_manager()
+
     class Meta:
         unique_together = ("employee", "account_number")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["employee"],
+                condition=models.Q(is_primary=True),
+                name="one_primary_account_per_employee",
+            )
+        ]
 
     def __str__(self):
         return f"{self.employee.name} - {self.bank_name} ({self.account_number})"
 
     def save(self, *args, **kwargs):
         if self.is_primary:
-            BankAccount.objects.filter(employee=self.employee, is_primary=True).update(
-                is_primary=False
-            )
+            BankAccount.objects.exclude(pk=self.pk).clear_primary([self.employee_id])
         super().save(*args, **kwargs)
 
 
@@ -50,9 +104,11 @@ class SalaryComponent(models.Model):
 
     FIXED = "fixed"
     PERCENTAGE = "percentage"
+    FORMULA = "formula"
     MODE_TYPES = [
         (FIXED, "Fixed"),
         (PERCENTAGE, "Percentage"),
+        (FORMULA, "Formula"),
     ]
 
     COMPULSORY = "compulsory"
@@ -66,6 +122,12 @@ class SalaryComponent(models.Model):
     code = models.CharField(max_length=50, unique=True)
     component_type = models.CharField(max_length=10, choices=COMPONENT_TYPES)
     mode = models.CharField(max_length=10, choices=MODE_TYPES, default=FIXED)
+    # How percentage amounts that fall between two paise are rounded.
+    rounding = models.CharField(
+        max_length=10, choices=money.ROUNDING_CHOICES, default=money.DEFAULT_ROUNDING
+    )
+    # Expression for formula components, see payroll.formulas.
+    formula = models.TextField(blank=True, null=True)
     action = models.CharField(max_length=10, choices=ACTION_TYPES, default=COMPULSORY)
     value = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     business_unit = models.IntegerField(null=True, blank=True)
@@ -74,8 +136,237 @@ class SalaryComponent(models.Model):
     def __str__(self):
         return self.name
 
+    def clean(self):
+        super().clean()
+        self.validate_formula()
+
+    def validate_formula(self):
+        """
+        Raise ValidationError if this component's formula is missing or
+        invalid, or if saving it would break any formula: a new cycle, or a
+        name that no longer exists after a change of code.
+        """
+        from .formulas import FormulaError, check_formulas
+
+        if self.mode == self.FORMULA and not (self.formula or "").strip():
+            raise ValidationError({"formula": "A formula component needs a formula."})
+        components = list(SalaryComponent.objects.exclude(pk=self.pk))
+        try:
+            check_formulas(components + [self])
+        except FormulaError as exc:
+            if self.mode == self.FORMULA:
+                raise ValidationError({"formula": str(exc)})
+            raise ValidationError(str(exc))
+
+    def validate_delete(self):
+        """Raise ValidationError if a formula refers to this component."""
+        from .formulas import FormulaError, check_formulas
+
+        try:
+            check_formulas(list(SalaryComponent.objects.exclude(pk=self.pk)))
+        except FormulaError as exc:
+            raise ValidationError(f"{self.code} is used in a formula: {exc}")
+
+    def _refreshing_totals(self, write, structures):
+        """
+        Call ``write()`` and refresh the totals of ``structures`` in one
+        transaction, rolled back with a ValidationError if a formula fails on
+        any of them.
+        """
+        from .formulas import FormulaError
+        from .registry import component_registry
+
+        try:
+            with transaction.atomic():
+                result = write()
+                structures.refresh_totals()
+        except FormulaError as exc:
+            # The registry reloaded the rows that were rolled back.
+            component_registry.invalidate()
+            if self.mode == self.FORMULA:
+                raise ValidationError({"formula": str(exc)})
+            raise ValidationError(str(exc))
+        return result
+
+    def save(self, *args, **kwargs):
+        self.validate_formula()
+        previous = None
+        if self.pk:
+            previous = (
+                SalaryComponent.objects.filter(pk=self.pk)
+                .values_list("mode", "component_type", "rounding", "formula")
+                .first()
+            )
+        if previous is None or previous == (
+            self.mode,
+            self.component_type,
+            self.rounding,
+            self.formula,
+        ):
+            return super().save(*args, **kwargs)
+        self._refreshing_totals(
+            lambda: super(SalaryComponent, self).save(*args, **kwargs),
+            SalaryStructure.objects.filter(lines__salary_component=self),
+        )
+
+    def delete(self, *args, **kwargs):
+        self.validate_delete()
+        structure_ids = list(
+            SalaryStructureLine.objects.filter(salary_component=self).values_list(
+                "salary_structure_id", flat=True
+            )
+        )
+        return self._refreshing_totals(
+            lambda: super(SalaryComponent, self).delete(*args, **kwargs),
+            SalaryStructure.objects.filter(pk__in=structure_ids),
+        )
+
+
+class SalaryStructureQuerySet(models.QuerySet):
+    def effective_on(self, date):
+        """Structures in force on ``date``, at most one per employee."""
+        return self.filter(effective_date__lte=date).filter(
+            models.Q(end_date__isnull=True) | models.Q(end_date__gte=date)
+        )
+
+    def overlapping(self, start, end=None):
+        """Structures whose validity period intersects ``start``..``end``."""
+        queryset = self.filter(
+            models.Q(end_date__isnull=True) | models.Q(end_date__gte=start)
+        )
+        if end is not None:
+            queryset = queryset.filter(effective_date__lte=end)
+        return queryset
+
+    def with_lines(self):
+        """Prefetch lines, with their components from the component registry."""
+        return self.prefetch_related(
+            models.Prefetch(
+                "lines",
+                queryset=SalaryStructureLine.objects.with_components().order_by("pk"),
+            )
+        )
+
+    def clashing(self, structures):
+        """Employee ids of unsaved ``structures`` overlapping a stored one."""
+        by_employee = {}
+        for structure in structures:
+            by_employee.setdefault(structure.employee_id, []).append(structure)
+        if not by_employee:
+            return set()
+        stored = (
+            self.filter(employee_id__in=by_employee)
+            .overlapping(min(structure.effective_date for structure in structures))
+            .order_by()
+            .values_list("employee_id", "effective_date", "end_date", "is_active")
+        )
+        clashing = set()
+        for employee_id, start, end, is_active in stored:
+            for structure in by_employee[employee_id]:
+                if is_active and structure.is_active:
+                    # close_active ends it the day before the new one.
+                    clash = start >= structure.effective_date
+                else:
+                    clash = (end is None or end >= structure.effective_date) and (
+                        structure.end_date is None or start <= structure.end_date
+                    )
+                if clash:
+                    clashing.add(employee_id)
+        return clashing
+
+    def close_active(self, effective_dates, now=None):
+        """End active structures the day before each employee's next one."""
+        if not effective_dates:
+            return 0
+        dates = set(effective_dates.values())
+        if len(dates) == 1:
+            (effective_date,) = dates
+            whens = [
+                models.When(
+                    models.Q(end_date__isnull=True)
+                    | models.Q(end_date__gte=effective_date),
+                    then=models.Value(effective_date - timedelta(days=1)),
+                )
+            ]
+        else:
+            whens = [
+                models.When(
+                    models.Q(employee_id=employee_id)
+                    & (
+                        models.Q(end_date__isnull=True)
+                        | models.Q(end_date__gte=effective_date)
+                    ),
+                    then=models.Value(effective_date - timedelta(days=1)),
+                )
+                for employee_id, effective_date in effective_dates.items()
+            ]
+        return self.filter(employee_id__in=effective_dates, is_active=True).update(
+            is_active=False,
+            end_date=models.Case(*whens, default=models.F("end_date")),
+            updated_at=now or timezone.now(),
+        )
+
+    def bulk_create_active(self, structures, batch_size=None, now=None):
+        """``bulk_create`` structures after closing the ones they replace."""
+        effective_dates = {
+            structure.employee_id: structure.effective_date
+            for structure in structures
+            if structure.is_active
+        }
+        if len(effective_dates) != sum(structure.is_active for structure in structures):
+            raise ValueError("More than one active structure for an employee.")
+        clashing = self.clashing(structures)
+        if clashing:
+            raise ValueError(
+                "Structures would overlap existing ones for employees "
+                f"{', '.join(map(str, sorted(clashing)))}."
+            )
+        self.close_active(effective_dates, now=now)
+        return self.bulk_create(structures, batch_size=batch_size)
+
+    def pay_band(self, minimum=None, maximum=None):
+        """Structures whose stored gross amount falls within the given band."""
+        queryset = self
+        if minimum is not None:
+            queryset = queryset.filter(gross_amount__gte=minimum)
+        if maximum is not None:
+            queryset = queryset.filter(gross_amount__lte=maximum)
+        return queryset
+
+    def refresh_totals(self, chunk_size=2000):
+        """Recompute and store the denormalized totals of every structure."""
+        from .calculations import calculate_structures
+        from .engine import iter_structure_chunks
+        from .registry import component_registry
+
+        components = component_registry.modes()
+        now = timezone.now()
+        ids = list(self.order_by().values_list("pk", flat=True))
+        for start in range(0, len(ids), chunk_size):
+            batch = self.model.objects.filter(pk__in=ids[start : start + chunk_size])
+            for chunk in iter_structure_chunks(batch, components, chunk_size):
+                self.model.objects.bulk_update(
+                    [
+                        self.model(
+                            pk=structure_id,
+                            gross_amount=result["gross"],
+                            net_amount=result["net"],
+                            total_earnings=result["earnings"],
+                            total_deductions=result["deductions"],
+                            updated_at=now,
+                        )
+                        for (structure_id, *_), result in zip(
+                            chunk, calculate_structures(chunk)
+                        )
+                    ],
+                    [*self.model.TOTAL_FIELDS, "updated_at"],
+                )
+        return len(ids)
+
 
 class SalaryStructure(models.Model):
+    TOTAL_FIELDS = ["gross_amount", "net_amount", "total_earnings", "total_deductions"]
+
     employee = models.ForeignKey(
         Employee, on_delete=models.CASCADE, related_name="salary_structures"
     )
@@ -89,9 +380,34 @@ class SalaryStructure(models.Model):
     updated_at = models.DateTimeField(default=timezone.now)
     created_by = models.IntegerField(null=True, blank=True)
     updated_by = models.IntegerField(null=True, blank=True)
+    # Denormalized totals, kept in sync with the lines on every write.
+    gross_amount = models.DecimalField(
+        max_digits=10, decimal_places=2, default=0, db_index=True
+    )
+    net_amount = models.DecimalField(
+        max_digits=10, decimal_places=2, default=0, db_index=True
+    )
+    total_earnings = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    total_deductions = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    objects = SalaryStructureQuerySet.as_manager()
 
     class Meta:
         ordering = ["-effective_date"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["employee"],
+                condition=models.Q(is_active=True),
+                name="one_active_structure_per_employee",
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["employee", "effective_date", "end_date"],
+                name="structure_effective_idx",
+            ),
+            models.Index(fields=["updated_at", "id"], name="structure_updated_idx"),
+        ]
 
     def __str__(self):
         return (
@@ -105,34 +421,135 @@ class SalaryStructure(models.Model):
         # Always update updated_at
         self.updated_at = timezone.now()
 
+        self.effective_date = self._meta.get_field("effective_date").to_python(
+            self.effective_date
+        )
+        self.end_date = self._meta.get_field("end_date").to_python(self.end_date)
+        siblings = SalaryStructure.objects.filter(employee=self.employee).exclude(
+            pk=self.pk
+        )
+        # Activating a structure closes the previously active one the day
+        # before, so that one only overlaps if it starts on the same day or
+        # later.
         if self.is_active:
-            SalaryStructure.objects.filter(
-                employee=self.employee, is_active=True
-            ).exclude(pk=self.pk).update(is_active=False)
+            self.validate_no_overlap(
+                siblings.filter(
+                    models.Q(is_active=False)
+                    | models.Q(effective_date__gte=self.effective_date)
+                )
+            )
+            siblings.close_active({self.employee_id: self.effective_date})
+        else:
+            self.validate_no_overlap(siblings)
+        self.invalidate_breakdown()
+        self._apply_totals()
         super().save(*args, **kwargs)
 
+    def validate_no_overlap(self, others):
+        """Raise ValidationError if any of ``others`` overlaps this structure."""
+        if self.end_date and self.end_date < self.effective_date:
+            raise ValidationError(
+                {"end_date": "End date must be after effective date."}
+            )
+        clash = others.overlapping(self.effective_date, self.end_date).first()
+        if clash is not None:
+            raise ValidationError(
+                {
+                    "effective_date": (
+                        f"Overlaps the structure effective {clash.effective_date}"
+                        f" to {clash.end_date or 'open-ended'}."
+                    )
+                }
+            )
+
+    def _apply_totals(self):
+        if self.pk:
+            breakdown = self.breakdown
+            self.gross_amount = breakdown.gross
+            self.net_amount = breakdown.net
+            self.total_earnings = breakdown.earnings
+            self.total_deductions = breakdown.deductions
+        else:
+            # A new structure has no lines yet.
+            self.gross_amount = self.net_amount = self.basic_pay
+            self.total_earnings = self.total_deductions = Decimal("0.00")
+
+    def refresh_totals(self):
+        """Recompute the stored totals from the current lines."""
+        self.invalidate_breakdown()
+        self._apply_totals()
+        self.updated_at = timezone.now()
+        SalaryStructure.objects.filter(pk=self.pk).update(
+            updated_at=self.updated_at,
+            **{field: getattr(self, field) for field in self.TOTAL_FIELDS},
+        )
+
+    @cached_property
+    def breakdown(self):
+        """Salary breakdown for this structure, computed once per instance."""
+        from .calculations import SalaryBreakdown, calculate_structure
+
+        if "lines" in getattr(self, "_prefetched_objects_cache", {}):
+            lines = self.lines.all()
+        else:
+            lines = self.lines.with_components()
+        calculated = calculate_structure(
+            money.to_minor(self.basic_pay),
+            (
+                (
+                    line.salary_component_id,
+                    line.salary_component.mode,
+                    line.salary_component.component_type,
+                    line.salary_component.rounding,
+                    money.to_minor(line.amount),
+                )
+                for line in lines
+            ),
+        )
+        return SalaryBreakdown(basic=self.basic_pay, **calculated)
+
+    def invalidate_breakdown(self):
+        """Drop the cached breakdown so it is recomputed on next access."""
+        self.__dict__.pop("breakdown", None)
+        getattr(self, "_prefetched_objects_cache", {}).pop("lines", None)
+
     def calculate_component_amounts(self):
         """Calculate individual component amounts based on mode (fixed or percentage)."""
-        calculated = {"earnings": 0, "deductions": 0}
-        for line in self.lines.all():
-            if line.salary_component.mode == SalaryComponent.PERCENTAGE:
-                amount = self.basic_pay * line.amount / 100
-            else:
-                amount = line.amount
-
-            if line.salary_component.component_type == SalaryComponent.EARNING:
-                calculated["earnings"] += amount
-            else:
-                calculated["deductions"] += amount
-        return calculated
+        return {
+            "earnings": self.breakdown.earnings,
+            "deductions": self.breakdown.deductions,
+        }
 
     def gross_salary(self):
         """Gross Salary = Basic Pay + Earnings."""
-        return self.basic_pay + self.calculate_component_amounts()["earnings"]
+        return self.breakdown.gross
 
     def net_salary(self):
         """Net Salary = Gross Salary - Deductions."""
-        return self.gross_salary() - self.calculate_component_amounts()["deductions"]
+        return self.breakdown.net
+
+
+class ComponentLineIterable(models.query.ModelIterable):
+    """Attach each line's component from the registry instead of a join."""
+
+    def __iter__(self):
+        from .registry import component_registry
+
+        components = component_registry.by_id()
+        for line in super().__iter__():
+            component = components.get(line.salary_component_id)
+            if component is None:
+                component = component_registry.get(line.salary_component_id)
+            line.salary_component = component
+            yield line
+
+
+class SalaryStructureLineQuerySet(models.QuerySet):
+    def with_components(self):
+        """Lines whose ``salary_component`` comes from the component registry."""
+        clone = self._chain()
+        clone._iterable_class = ComponentLineIterable
+        return clone
 
 
 class SalaryStructureLine(models.Model):
@@ -144,6 +561,8 @@ class SalaryStructureLine(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(default=timezone.now)
 
+    objects = SalaryStructureLineQuerySet.as_manager()
+
     class Meta:
         unique_together = ("salary_structure", "salary_component")
 
@@ -157,6 +576,12 @@ class SalaryStructureLine(models.Model):
         # Always update updated_at
         self.updated_at = timezone.now()
         super().save(*args, **kwargs)
+        self.salary_structure.refresh_totals()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self.salary_structure.refresh_totals()
+        return result
 
 
 class PayrollRun(models.Model):
@@ -176,9 +601,27 @@ class PayrollRun(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
     run_version = models.CharField(max_length=50)
     notes = models.TextField(blank=True, null=True)
+    # Parameters of the run, kept so an interrupted run can be resumed.
+    month = models.PositiveSmallIntegerField(null=True, blank=True)
+    year = models.PositiveSmallIntegerField(null=True, blank=True)
+    as_of = models.DateField(null=True, blank=True)
+    incremental = models.BooleanField(default=False)
+    # Progress: structures to pay, set when the run starts, and its timing.
+    total_structures = models.PositiveIntegerField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["month", "year"],
+                condition=models.Q(status__in=["pending", "in_progress"]),
+                name="one_open_run_per_period",
+            )
+        ]
+
     def __str__(self):
         return f"Payroll Run {self.run_version} ({self.run_date.strftime('%Y-%m-%d')})"
 
@@ -191,6 +634,100 @@ class PayrollRun(models.Model):
         super().save(*args, **kwargs)
 
 
+class PayrollRunCheckpoint(models.Model):
+    """A chunk (or shard) of a payroll run, committed with its salaries."""
+
+    payroll_run = models.ForeignKey(
+        PayrollRun, on_delete=models.CASCADE, related_name="checkpoints"
+    )
+    chunk_index = models.PositiveIntegerField()
+    # Highest structure id covered by a sequential chunk; null for shards.
+    last_structure_id = models.BigIntegerField(null=True, blank=True)
+    salaries_created = models.PositiveIntegerField(default=0)
+    salaries_updated = models.PositiveIntegerField(default=0)
+    lines_created = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ("payroll_run", "chunk_index")
+        ordering = ["chunk_index"]
+
+    def __str__(self):
+        return f"{self.payroll_run} chunk {self.chunk_index}"
+
+
+class PayrollRunMetric(models.Model):
+    """Time, queries and rows spent in one phase of a payroll run."""
+
+    payroll_run = models.ForeignKey(
+        PayrollRun, on_delete=models.CASCADE, related_name="metrics"
+    )
+    phase = models.CharField(max_length=20)
+    seconds = models.FloatField(default=0)
+    queries = models.PositiveIntegerField(default=0)
+    rows = models.PositiveIntegerField(default=0)
+    # Peak resident memory in bytes of the process (or busiest worker).
+    peak_memory = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["created_at", "id"]
+
+    def __str__(self):
+        return f"{self.payroll_run} {self.phase}"
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+class MonthlySalaryQuerySet(models.QuerySet):
+    def refresh_net(self, now=None):
+        """Recompute net pay, leaving the change as a pending SalaryPayment."""
+        deductions = (
+            MonthlySalaryLine.objects.filter(
+                monthly_salary=models.OuterRef("pk"),
+                salary_component__component_type=SalaryComponent.DEDUCTION,
+            )
+            .order_by()
+            .values("monthly_salary")
+            .annotate(total=models.Sum(money.minor_units("amount")))
+            .values("total")
+        )
+        adjustments = (
+            PayrollAdjustment.objects.filter(monthly_salary=models.OuterRef("pk"))
+            .order_by()
+            .values("monthly_salary")
+            .annotate(total=models.Sum(money.minor_units("adjustment_amount")))
+            .values("total")
+        )
+        now = now or timezone.now()
+        salaries = []
+        payments = []
+        for pk, previous, gross, deducted, adjusted in self.order_by().values_list(
+            "pk",
+            money.minor_units("net_amount"),
+            money.minor_units("gross_amount"),
+            models.Subquery(deductions),
+            models.Subquery(adjustments),
+        ):
+            net = gross - (deducted or 0) + (adjusted or 0)
+            salaries.append(
+                MonthlySalary(pk=pk, net_amount=money.to_decimal(net), updated_at=now)
+            )
+            if net != previous:
+                payments.append(
+                    SalaryPayment(
+                        monthly_salary_id=pk,
+                        amount=money.to_decimal(net - previous),
+                        created_at=now,
+                    )
+                )
+        SalaryPayment.objects.bulk_create(payments)
+        return MonthlySalary.objects.bulk_update(salaries, ["net_amount", "updated_at"])
+
+
 class MonthlySalary(models.Model):
     employee = models.ForeignKey(
         Employee, on_delete=models.CASCADE, related_name="monthly_salaries"
@@ -209,12 +746,18 @@ class MonthlySalary(models.Model):
     year = models.PositiveSmallIntegerField()
     gross_amount = models.DecimalField(max_digits=10, decimal_places=2)
     net_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    # Fingerprint of the structure, lines, components and adjustments the
+    # amounts were computed from, used by incremental re-runs.
+    input_hash = models.CharField(max_length=64, blank=True, default="")
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(default=timezone.now)
 
+    objects = MonthlySalaryQuerySet.as_manager()
+
     class Meta:
         unique_together = ("employee", "month", "year")
         ordering = ["-year", "-month"]
+        indexes = [models.Index(fields=["updated_at", "id"], name="salary_updated_idx")]
 
     def __str__(self):
         return f"Monthly Salary for {self.employee.name} - {self.month}/{self.year}"
@@ -246,6 +789,14 @@ class PayrollAdjustment(models.Model):
     monthly_salary = models.ForeignKey(
         MonthlySalary, on_delete=models.CASCADE, related_name="adjustments"
     )
+    # Set on arrears, the structure whose back-dated pay they make up for.
+    salary_structure = models.ForeignKey(
+        SalaryStructure,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="arrears",
+    )
     adjustment_amount = models.DecimalField(max_digits=10, decimal_places=2)
     reason = models.TextField()
     created_at = models.DateTimeField(default=timezone.now)
@@ -253,3 +804,109 @@ class PayrollAdjustment(models.Model):
 
     def __str__(self):
         return f"Adjustment for {self.monthly_salary} ({self.adjustment_amount})"
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.touch_salary()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self.touch_salary()
+        return result
+
+    def touch_salary(self):
+        """
+        Include the adjustment in the salary's net pay and mark the salary
+        changed, so syncs pick it up.
+        """
+        MonthlySalary.objects.filter(pk=self.monthly_salary_id).refresh_net()
+
+
+class SalaryPayment(models.Model):
+    """
+    An amount of a salary paid by the bank transfer file of a payroll run. A
+    run records each salary's net pay when it creates the salary and the
+    difference when it recomputes one that was already paid. Adjustments and
+    arrears change the net of a salary outside any run, so theirs wait without
+    a run until the next one to complete takes them.
+    """
+
+    monthly_salary = models.ForeignKey(
+        MonthlySalary, on_delete=models.CASCADE, related_name="payments"
+    )
+    # None until a run pays it.
+    payroll_run = models.ForeignKey(
+        PayrollRun,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="payments",
+    )
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Payment of {self.amount} for {self.monthly_salary}"
+
+
+class PayrollPeriodSummary(models.Model):
+    """Totals of every salary for a month, refreshed after each payroll run."""
+
+    month = models.PositiveSmallIntegerField()
+    year = models.PositiveSmallIntegerField()
+    employees = models.PositiveIntegerField(default=0)
+    gross_amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    net_amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    total_earnings = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    total_deductions = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    total_adjustments = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    refreshed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ("month", "year")
+        ordering = ["-year", "-month"]
+
+    def __str__(self):
+        return f"Payroll summary {self.month:02d}/{self.year}"
+
+
+class PayrollComponentSummary(models.Model):
+    """Totals of one component's salary lines for a month."""
+
+    month = models.PositiveSmallIntegerField()
+    year = models.PositiveSmallIntegerField()
+    salary_component = models.ForeignKey(SalaryComponent, on_delete=models.CASCADE)
+    # Copied from the component so cost-center rollups need no join.
+    business_unit = models.IntegerField(null=True, blank=True)
+    component_type = models.CharField(
+        max_length=10, choices=SalaryComponent.COMPONENT_TYPES
+    )
+    employees = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    refreshed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ("month", "year", "salary_component")
+        ordering = ["-year", "-month", "salary_component_id"]
+
+    def __str__(self):
+        return f"{self.salary_component} {self.month:02d}/{self.year}"
+
+
+class DeletedRecord(models.Model):
+    """Tombstone of a row deleted from a resource of the sync API."""
+
+    resource = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["resource", "deleted_at", "id"], name="deleted_record_sync_idx"
+            ),
+            models.Index(fields=["deleted_at", "id"], name="deleted_record_idx"),
+        ]
+
+    def __str__(self):
+        return f"Deleted {self.resource} {self.object_id}"
@@ -0,0 +1,100 @@
+"""
+Fixed-point money in integer minor units (paise).
+
+Amounts are stored as ``DecimalField(decimal_places=2)``. Calculations take
+them in integer paise, read that way straight from the database with
+``minor_units`` or converted once with ``to_minor``, so sums and differences
+are exact integer arithmetic and the only rounding happens where a percentage
+is applied, under the component's explicit rounding rule. Results go back to
+Decimal with ``to_decimal`` for storage. Floats are rejected everywhere: a
+float amount has already lost precision.
+"""
+
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import BigIntegerField, F
+from django.db.models.functions import Cast, Round
+
+MINOR_UNITS = 100
+
+# Rounding rules for amounts that fall between two paise.
+HALF_UP = "half_up"
+HALF_EVEN = "half_even"
+DOWN = "down"
+UP = "up"
+ROUNDING_CHOICES = [
+    (HALF_UP, "Half up (away from zero)"),
+    (HALF_EVEN, "Half even (banker's)"),
+    (DOWN, "Down (towards zero)"),
+    (UP, "Up (away from zero)"),
+]
+ROUNDING_RULES = [rule for rule, _ in ROUNDING_CHOICES]
+DEFAULT_ROUNDING = HALF_UP
+
+
+def to_minor(value):
+    """
+    Convert a Decimal, int or numeric string with at most two decimal places
+    to integer paise. Raise ValueError if it needs more precision.
+    """
+    if isinstance(value, int):
+        return value * MINOR_UNITS
+    if isinstance(value, float):
+        raise TypeError("Money amounts must not be floats.")
+    try:
+        scaled = Decimal(value).scaleb(2)
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount: {value!r}")
+    if not scaled.is_finite() or scaled != scaled.to_integral_value():
+        raise ValueError(f"Amount {value!r} is not a whole number of paise.")
+    return int(scaled)
+
+
+def to_decimal(minor):
+    """Convert integer paise to a Decimal with two decimal places."""
+    return Decimal(minor).scaleb(-2)
+
+
+def minor_units(field):
+    """
+    Expression reading the two-place decimal column ``field`` as integer
+    paise, so query results need no Decimal per value.
+    """
+    return Cast(Round(F(field) * MINOR_UNITS), BigIntegerField())
+
+
+def parse_amount(text):
+    """
+    Parse user input such as ``"1500"`` or ``"1500.50"`` to a Decimal with two
+    decimal places. Raise ValueError for anything else.
+    """
+    return to_decimal(to_minor(str(text).strip()))
+
+
+def divide(numerator, denominator, rounding=DEFAULT_ROUNDING):
+    """Divide integers, rounding the quotient to an integer by ``rounding``."""
+    if denominator < 0:
+        numerator, denominator = -numerator, -denominator
+    quotient, remainder = divmod(numerator, denominator)
+    if not remainder:
+        return quotient
+    # ``quotient`` is the floor; decide whether to step up to the ceiling.
+    if rounding == HALF_UP:
+        twice = 2 * remainder
+        up = twice > denominator or (twice == denominator and numerator > 0)
+    elif rounding == HALF_EVEN:
+        twice = 2 * remainder
+        up = twice > denominator or (twice == denominator and quotient % 2)
+    elif rounding == DOWN:
+        up = numerator < 0
+    elif rounding == UP:
+        up = numerator > 0
+    else:
+        raise ValueError(f"Unknown rounding rule: {rounding}")
+    return quotient + 1 if up else quotient
+
+
+def percentage(minor, rate, rounding=DEFAULT_ROUNDING):
+    """``rate`` percent of ``minor`` paise, rounded to whole paise."""
+    numerator, denominator = Decimal(rate).as_integer_ratio()
+    return divide(minor * numerator, denominator * 100, rounding)
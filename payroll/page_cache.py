@@ -0,0 +1,107 @@
+"""
+Read-side cache of employee pages.
+
+When ``settings.PAYROLL_PAGE_CACHE`` names a Django cache, the rendered
+employee detail page is stored there together with the version tokens it was
+rendered under: one for the employee and one shared by every employee for
+the salary components. A repeat view fetches the page and both tokens with a
+single ``get_many`` and serves the page without touching the database when
+the tokens still match.
+
+Saving or deleting an employee, salary structure, structure line or bank
+account through the ORM replaces the employee's token, and saving or
+deleting a salary component replaces the shared one (see
+``PayrollConfig.ready``). Bulk writes that bypass signals must call
+``payroll.bulk.after_bulk_write`` themselves. Tokens are replaced again when the
+transaction commits, so a page rendered from the old rows meanwhile is not
+kept.
+"""
+
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import Employee
+
+EMPLOYEE_VERSION_KEY = "payroll:employee_page:{}:version"
+COMPONENTS_VERSION_KEY = "payroll:employee_page:components:version"
+PAGE_KEY = "payroll:employee_page:{}"
+
+
+def _page_cache():
+    alias = getattr(settings, "PAYROLL_PAGE_CACHE", None)
+    return caches[alias] if alias else None
+
+
+def cached_employee_page(employee_id, render):
+    """
+    Return the cached page of ``employee_id``, or call ``render()`` and cache
+    the string it returns under the current version tokens.
+    """
+    cache = _page_cache()
+    if cache is None:
+        return render()
+    version_keys = [EMPLOYEE_VERSION_KEY.format(employee_id), COMPONENTS_VERSION_KEY]
+    page_key = PAGE_KEY.format(employee_id)
+    found = cache.get_many([*version_keys, page_key])
+    version = tuple(found.get(key) for key in version_keys)
+    page = found.get(page_key)
+    if page is not None and None not in version and page[0] == version:
+        return page[1]
+
+    for key in version_keys:
+        if key not in found:
+            # ``add`` keeps a token another process set in the meantime.
+            cache.add(key, uuid4().hex, None)
+    version = tuple(cache.get_many(version_keys).get(key) for key in version_keys)
+    content = render()
+    cache.set(page_key, (version, content))
+    return content
+
+
+def _replace_versions(keys):
+    cache = _page_cache()
+    if cache is not None and keys:
+        cache.set_many({key: uuid4().hex for key in keys}, None)
+
+
+def invalidate_employee_pages(employee_ids):
+    """Drop the cached pages of the employees with these ``employee_id``s."""
+    keys = [EMPLOYEE_VERSION_KEY.format(employee_id) for employee_id in employee_ids]
+    _replace_versions(keys)
+    transaction.on_commit(lambda: _replace_versions(keys))
+
+
+def invalidate_all_employee_pages():
+    """Drop every cached employee page, for example after a component change."""
+    _replace_versions([COMPONENTS_VERSION_KEY])
+    transaction.on_commit(lambda: _replace_versions([COMPONENTS_VERSION_KEY]))
+
+
+def invalidate_employee(sender, instance, **kwargs):
+    invalidate_employee_pages([instance.employee_id])
+
+
+def invalidate_employee_of(sender, instance, **kwargs):
+    """Signal receiver for models with an ``employee`` foreign key."""
+    if _page_cache() is not None:
+        invalidate_employee_pages(
+            Employee.objects.filter(pk=instance.employee_id).values_list(
+                "employee_id", flat=True
+            )
+        )
+
+
+def invalidate_structure_employee(sender, instance, **kwargs):
+    if _page_cache() is not None:
+        invalidate_employee_pages(
+            Employee.objects.filter(
+                salary_structures=instance.salary_structure_id
+            ).values_list("employee_id", flat=True)
+        )
+
+
+def invalidate_components(sender, **kwargs):
+    invalidate_all_employee_pages()
@@ -0,0 +1,254 @@
+"""
+Payslips for every salary of a payroll run.
+
+Salaries, their lines and adjustments are read in chunks with a fixed number
+of queries per chunk and turned into plain dicts, which are rendered with a
+template compiled once per process. With more than one worker the chunks are
+rendered in a process pool, keeping only a few chunks in flight, and the
+payslips are streamed into a ZIP archive or written to a directory one file
+at a time, so memory use does not grow with headcount.
+"""
+
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.exceptions import ImproperlyConfigured
+from django.template.loader import get_template
+
+try:
+    import weasyprint
+except ImportError:  # pragma: no cover - PDF output is optional
+    weasyprint = None
+
+from .models import (
+    MonthlySalary,
+    MonthlySalaryLine,
+    PayrollAdjustment,
+    SalaryComponent,
+)
+from .registry import component_registry
+
+HTML = "html"
+PDF = "pdf"
+FORMATS = [HTML, PDF]
+TEMPLATE_NAME = "payroll/payslip.html"
+DEFAULT_CHUNK_SIZE = 500
+# Chunks submitted to the pool ahead of the one being written out.
+CHUNKS_PER_WORKER = 2
+
+_template = None
+
+
+def _compiled_template():
+    global _template
+    if _template is None:
+        _template = get_template(TEMPLATE_NAME)
+    return _template
+
+
+def payslip_filename(payslip, file_format=HTML):
+    return (
+        f"payslip_{payslip['employee_id']}_"
+        f"{payslip['year']}-{payslip['month']:02d}.{file_format}"
+    )
+
+
+def iter_payslip_chunks(salaries, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Stream lists of payslip dicts for ``salaries``, ordered by employee id,
+    with three queries per chunk: salaries, lines and adjustments. Amounts
+    are read from the salary as paid, never from its structure.
+    """
+    components = component_registry.by_id()
+    rows = (
+        salaries.order_by("employee__employee_id")
+        .values_list(
+            "id",
+            "employee__employee_id",
+            "employee__name",
+            "month",
+            "year",
+            "gross_amount",
+            "net_amount",
+            "payroll_run__run_version",
+        )
+        .iterator(chunk_size=chunk_size)
+    )
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield _payslips(chunk, components)
+            chunk = []
+    if chunk:
+        yield _payslips(chunk, components)
+
+
+def _payslips(rows, components):
+    payslips = {}
+    for (
+        salary_id,
+        employee_id,
+        name,
+        month,
+        year,
+        gross,
+        net,
+        run_version,
+    ) in rows:
+        payslips[salary_id] = {
+            "employee_id": employee_id,
+            "name": name,
+            "month": month,
+            "year": year,
+            "run_version": run_version,
+            "earnings": [],
+            "deductions": [],
+            "adjustments": [],
+            "gross": gross,
+            "net": net,
+        }
+    for salary_id, component_id, amount in (
+        MonthlySalaryLine.objects.filter(monthly_salary_id__in=payslips)
+        .order_by("pk")
+        .values_list("monthly_salary_id", "salary_component_id", "amount")
+    ):
+        component = components.get(component_id) or component_registry.get(component_id)
+        kind = (
+            "earnings"
+            if component.component_type == SalaryComponent.EARNING
+            else "deductions"
+        )
+        payslips[salary_id][kind].append((component.name, amount))
+    for salary_id, reason, amount in (
+        PayrollAdjustment.objects.filter(monthly_salary_id__in=payslips)
+        .order_by("pk")
+        .values_list("monthly_salary_id", "reason", "adjustment_amount")
+    ):
+        payslips[salary_id]["adjustments"].append((reason, amount))
+    for payslip in payslips.values():
+        # The structure may have changed or gone since the run; what was paid
+        # beyond the component lines is the basic pay.
+        payslip["basic_pay"] = payslip["gross"] - sum(
+            amount for _, amount in payslip["earnings"]
+        )
+    return list(payslips.values())
+
+
+def check_format(file_format):
+    """
+    Raise ValueError for an unknown format and ImproperlyConfigured for one
+    that cannot be rendered here.
+    """
+    if file_format not in FORMATS:
+        raise ValueError(f"Unknown payslip format: {file_format}")
+    if file_format == PDF and weasyprint is None:
+        raise ImproperlyConfigured("PDF payslips require weasyprint.")
+
+
+def render_payslip(payslip, file_format=HTML):
+    """Render one payslip dict to bytes."""
+    check_format(file_format)
+    html = _compiled_template().render({"payslip": payslip})
+    if file_format == PDF:
+        return weasyprint.HTML(string=html).write_pdf()
+    return html.encode()
+
+
+def render_payslips(payslips, file_format=HTML):
+    """Render a chunk of payslips to ``(filename, bytes)`` pairs."""
+    return [
+        (payslip_filename(payslip, file_format), render_payslip(payslip, file_format))
+        for payslip in payslips
+    ]
+
+
+def _init_worker(settings_module):
+    from .engine import _init_worker as setup_django
+
+    setup_django(settings_module)
+    _compiled_template()
+
+
+def iter_rendered_payslips(
+    salaries, file_format=HTML, workers=1, chunk_size=DEFAULT_CHUNK_SIZE
+):
+    """
+    Yield ``(filename, bytes)`` for every salary, in employee id order.
+
+    With ``workers`` above one, chunks are rendered in a process pool while
+    the next chunks are read; at most ``CHUNKS_PER_WORKER`` chunks per worker
+    are in flight.
+    """
+    check_format(file_format)
+    chunks = iter_payslip_chunks(salaries, chunk_size)
+    if workers <= 1:
+        for payslips in chunks:
+            yield from render_payslips(payslips, file_format)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(os.environ.get("DJANGO_SETTINGS_MODULE", ""),),
+    ) as executor:
+        pending = deque()
+        for payslips in chunks:
+            pending.append(executor.submit(render_payslips, payslips, file_format))
+            if len(pending) >= workers * CHUNKS_PER_WORKER:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+class _ZipStream:
+    """Unseekable file object collecting what ZipFile writes until drained."""
+
+    def __init__(self):
+        self.buffer = []
+
+    def write(self, data):
+        self.buffer.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.buffer)
+        self.buffer = []
+        return data
+
+
+def iter_payslip_zip(payroll_run, file_format=HTML, workers=1):
+    """
+    Return an iterator over a ZIP archive of the run's payslips, piece by
+    piece. The format is checked here, before anything is streamed.
+    """
+    check_format(file_format)
+    return _iter_payslip_zip(payroll_run, file_format, workers)
+
+
+def _iter_payslip_zip(payroll_run, file_format, workers):
+    stream = _ZipStream()
+    salaries = MonthlySalary.objects.filter(payroll_run=payroll_run)
+    with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for filename, content in iter_rendered_payslips(salaries, file_format, workers):
+            archive.writestr(filename, content)
+            yield stream.drain()
+    yield stream.drain()
+
+
+def write_payslips(payroll_run, directory, file_format=HTML, workers=1):
+    """Write one payslip file per salary of the run into ``directory``."""
+    check_format(file_format)
+    os.makedirs(directory, exist_ok=True)
+    written = 0
+    salaries = MonthlySalary.objects.filter(payroll_run=payroll_run)
+    for filename, content in iter_rendered_payslips(salaries, file_format, workers):
+        with open(os.path.join(directory, filename), "wb") as payslip_file:
+            payslip_file.write(content)
+        written += 1
+    return written
@@ -0,0 +1,151 @@
+"""
+In-process registry of salary components.
+
+SalaryComponent is a small table that rarely changes but is read for every
+structure line, so the registry keeps every component in memory, keyed by id
+and by code. Saving or deleting a component through the ORM invalidates it
+(see ``PayrollConfig.ready``); bulk writes that bypass signals must call
+``payroll.bulk.after_bulk_write`` themselves.
+
+When ``settings.PAYROLL_COMPONENT_CACHE`` names a Django cache, the components
+are also shared through that cache under a version token, so an invalidation
+in one process reaches every other process on its next lookup. Without one,
+each process reloads its components once they are
+``settings.PAYROLL_COMPONENT_TTL_SECONDS`` old, so changes made in another
+process show up within that many seconds.
+
+The registry also caches the compiled formula evaluator of each set of
+components that appears on a structure (see ``payroll.formulas``), dropped
+along with the components.
+
+Registry instances are shared between callers and must be treated as
+read-only; fetch the component from the database to modify it.
+"""
+
+from time import monotonic
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .formulas import compile_evaluator
+from .models import SalaryComponent
+
+VERSION_KEY = "payroll:salary_components:version"
+DATA_KEY = "payroll:salary_components:data"
+
+
+class ComponentRegistry:
+    def __init__(self):
+        # (token, components by id, components by code, evaluators by set of
+        # component ids), replaced as a whole.
+        self._state = None
+        self._loaded_at = None
+
+    def _shared_cache(self):
+        alias = getattr(settings, "PAYROLL_COMPONENT_CACHE", None)
+        return caches[alias] if alias else None
+
+    def _remember(self, token, components):
+        self._state = (
+            token,
+            {component.pk: component for component in components},
+            {component.code: component for component in components},
+            {},
+        )
+        self._loaded_at = monotonic()
+        return self._state
+
+    def _expired(self):
+        ttl = getattr(settings, "PAYROLL_COMPONENT_TTL_SECONDS", None)
+        return ttl is not None and monotonic() - self._loaded_at >= ttl
+
+    def _load(self, force=False):
+        cache = self._shared_cache()
+        if cache is None:
+            if self._state is None or force or self._expired():
+                return self._remember(None, list(SalaryComponent.objects.all()))
+            return self._state
+
+        token = None if force else cache.get(VERSION_KEY)
+        if token is not None:
+            if self._state is not None and self._state[0] == token:
+                return self._state
+            data = cache.get(DATA_KEY)
+            if data is not None and data[0] == token:
+                return self._remember(*data)
+        components = list(SalaryComponent.objects.all())
+        token = uuid4().hex
+        cache.set(DATA_KEY, (token, components), None)
+        cache.set(VERSION_KEY, token, None)
+        return self._remember(token, components)
+
+    def by_id(self):
+        """Every component keyed by id."""
+        return self._load()[1]
+
+    def by_code(self):
+        """Every component keyed by code."""
+        return self._load()[2]
+
+    def all(self):
+        """Every component, ordered by id."""
+        return sorted(self.by_id().values(), key=lambda component: component.pk)
+
+    def get(self, pk):
+        """
+        Return the component with id ``pk``, reloading once if it is unknown.
+        Raise SalaryComponent.DoesNotExist if it does not exist.
+        """
+        component = self.by_id().get(pk)
+        if component is None:
+            component = self._load(force=True)[1].get(pk)
+        if component is None:
+            raise SalaryComponent.DoesNotExist(f"No salary component with id {pk}.")
+        return component
+
+    def get_by_code(self, code):
+        component = self.by_code().get(code)
+        if component is None:
+            component = self._load(force=True)[2].get(code)
+        if component is None:
+            raise SalaryComponent.DoesNotExist(f"No salary component {code!r}.")
+        return component
+
+    def modes(self):
+        """Map every component id to its ``(mode, component_type, rounding)``."""
+        return {
+            pk: (component.mode, component.component_type, component.rounding)
+            for pk, component in self.by_id().items()
+        }
+
+    def evaluator(self, component_ids):
+        """
+        The compiled formula evaluator for a structure with lines for
+        ``component_ids``, compiled on first use and cached until the
+        components change.
+        """
+        key = tuple(sorted(component_ids))
+        state = self._load()
+        evaluator = state[3].get(key)
+        if evaluator is None:
+            evaluator = compile_evaluator([self.get(pk) for pk in key], state[2])
+            state[3][key] = evaluator
+        return evaluator
+
+    def invalidate(self):
+        """Forget the components here and in the shared cache, if any."""
+        self._state = None
+        cache = self._shared_cache()
+        if cache is not None:
+            cache.delete_many([VERSION_KEY, DATA_KEY])
+
+
+component_registry = ComponentRegistry()
+
+
+def invalidate_components(sender, **kwargs):
+    component_registry.invalidate()
+    # Processes that reloaded before the commit cached the old rows.
+    transaction.on_commit(component_registry.invalidate)
@@ -0,0 +1,237 @@
+"""
+Payroll register and cost-center reports.
+
+Monthly totals are aggregated in the database from MonthlySalary,
+MonthlySalaryLine and PayrollAdjustment and stored in PayrollPeriodSummary
+and PayrollComponentSummary, one row per month and per month and component.
+``run_payroll`` refreshes the summaries of its month when it completes;
+reports and CSV exports only read the summary tables. Amounts are summed as
+integer paise, see ``money.minor_units``, so totals are exact on every
+database.
+"""
+
+import csv
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from . import money
+from .exports import Echo
+from .models import (
+    MonthlySalary,
+    MonthlySalaryLine,
+    PayrollAdjustment,
+    PayrollComponentSummary,
+    PayrollPeriodSummary,
+    SalaryComponent,
+)
+
+COMPONENTS = "components"
+BUSINESS_UNITS = "business_units"
+PERIODS = "periods"
+REPORTS = [COMPONENTS, BUSINESS_UNITS, PERIODS]
+
+ZERO = Decimal("0.00")
+
+
+def refresh_summaries(month, year):
+    """
+    Recompute the summaries of one month with three aggregate queries and
+    replace the stored ones. Return the PayrollPeriodSummary.
+    """
+    now = timezone.now()
+    lines = MonthlySalaryLine.objects.filter(
+        monthly_salary__month=month, monthly_salary__year=year
+    )
+    components = [
+        PayrollComponentSummary(
+            month=month,
+            year=year,
+            salary_component_id=row["salary_component_id"],
+            business_unit=row["salary_component__business_unit"],
+            component_type=row["salary_component__component_type"],
+            employees=row["employees"],
+            total_amount=money.to_decimal(row["total"]),
+            refreshed_at=now,
+        )
+        for row in lines.order_by()
+        .values(
+            "salary_component_id",
+            "salary_component__business_unit",
+            "salary_component__component_type",
+        )
+        .annotate(
+            employees=Count("monthly_salary_id", distinct=True),
+            total=Sum(money.minor_units("amount")),
+        )
+    ]
+    totals = MonthlySalary.objects.filter(month=month, year=year).aggregate(
+        employees=Count("pk"),
+        gross=Sum(money.minor_units("gross_amount")),
+        net=Sum(money.minor_units("net_amount")),
+    )
+    adjustments = PayrollAdjustment.objects.filter(
+        monthly_salary__month=month, monthly_salary__year=year
+    ).aggregate(total=Sum(money.minor_units("adjustment_amount")))["total"]
+
+    summary = PayrollPeriodSummary(
+        month=month,
+        year=year,
+        employees=totals["employees"],
+        gross_amount=money.to_decimal(totals["gross"] or 0),
+        net_amount=money.to_decimal(totals["net"] or 0),
+        total_earnings=sum(
+            (
+                row.total_amount
+                for row in components
+                if row.component_type == SalaryComponent.EARNING
+            ),
+            ZERO,
+        ),
+        total_deductions=sum(
+            (
+                row.total_amount
+                for row in components
+                if row.component_type == SalaryComponent.DEDUCTION
+            ),
+            ZERO,
+        ),
+        total_adjustments=money.to_decimal(adjustments or 0),
+        refreshed_at=now,
+    )
+    with transaction.atomic():
+        PayrollComponentSummary.objects.filter(month=month, year=year).delete()
+        PayrollPeriodSummary.objects.filter(month=month, year=year).delete()
+        PayrollComponentSummary.objects.bulk_create(components)
+        summary.save(force_insert=True)
+    return summary
+
+
+def refresh_all_summaries():
+    """Refresh every month that has salaries and drop summaries of the rest."""
+    periods = list(
+        MonthlySalary.objects.order_by("year", "month")
+        .values_list("month", "year")
+        .distinct()
+    )
+    for month, year in periods:
+        refresh_summaries(month, year)
+    stale = Q(pk__in=[])
+    for month, year in set(
+        PayrollPeriodSummary.objects.values_list("month", "year")
+    ) - set(periods):
+        stale |= Q(month=month, year=year)
+    PayrollComponentSummary.objects.filter(stale).delete()
+    PayrollPeriodSummary.objects.filter(stale).delete()
+    return len(periods)
+
+
+def _period(queryset, month=None, year=None):
+    if month is not None:
+        queryset = queryset.filter(month=month)
+    if year is not None:
+        queryset = queryset.filter(year=year)
+    return queryset
+
+
+def period_totals(month=None, year=None):
+    return _period(PayrollPeriodSummary.objects.all(), month, year)
+
+
+def component_totals(month=None, year=None):
+    return _period(
+        PayrollComponentSummary.objects.select_related("salary_component"),
+        month,
+        year,
+    )
+
+
+def business_unit_totals(month=None, year=None):
+    """Earnings and deductions per business unit and month, from the summaries."""
+    rows = (
+        _period(PayrollComponentSummary.objects.all(), month, year)
+        .order_by("-year", "-month", "business_unit")
+        .values("year", "month", "business_unit")
+        .annotate(
+            earnings=Sum(
+                money.minor_units("total_amount"),
+                filter=Q(component_type=SalaryComponent.EARNING),
+            ),
+            deductions=Sum(
+                money.minor_units("total_amount"),
+                filter=Q(component_type=SalaryComponent.DEDUCTION),
+            ),
+        )
+    )
+    for row in rows:
+        for total in ("earnings", "deductions"):
+            if row[total] is not None:
+                row[total] = money.to_decimal(row[total])
+        yield row
+
+
+def report_rows(report, month=None, year=None):
+    """Header and rows of ``report`` for the CSV export and the dashboard."""
+    if report == PERIODS:
+        yield [
+            "year",
+            "month",
+            "employees",
+            "gross",
+            "earnings",
+            "deductions",
+            "adjustments",
+            "net",
+        ]
+        for summary in period_totals(month, year):
+            yield [
+                summary.year,
+                summary.month,
+                summary.employees,
+                summary.gross_amount,
+                summary.total_earnings,
+                summary.total_deductions,
+                summary.total_adjustments,
+                summary.net_amount,
+            ]
+    elif report == COMPONENTS:
+        yield [
+            "year",
+            "month",
+            "component",
+            "type",
+            "business_unit",
+            "employees",
+            "total",
+        ]
+        for summary in component_totals(month, year):
+            yield [
+                summary.year,
+                summary.month,
+                summary.salary_component.code,
+                summary.component_type,
+                summary.business_unit,
+                summary.employees,
+                summary.total_amount,
+            ]
+    elif report == BUSINESS_UNITS:
+        yield ["year", "month", "business_unit", "earnings", "deductions"]
+        for row in business_unit_totals(month, year):
+            yield [
+                row["year"],
+                row["month"],
+                row["business_unit"],
+                row["earnings"] or ZERO,
+                row["deductions"] or ZERO,
+            ]
+    else:
+        raise ValueError(f"Unknown report: {report}")
+
+
+def iter_report_csv(report, month=None, year=None):
+    """Yield ``report`` as CSV lines."""
+    writer = csv.writer(Echo())
+    for row in report_rows(report, month, year):
+        yield writer.writerow(row)
@@ -0,0 +1,267 @@
+"""
+Bulk salary revisions, such as an appraisal cycle.
+
+A revision closes the active structures matched by a filter and creates their
+successors, with hikes applied to basic pay and to selected components. All
+writes are set-based and a revision applies in one transaction, so it either
+revises every eligible structure or none.
+"""
+
+import re
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import money
+from .bulk import after_bulk_write
+from .calculations import calculate_structure
+from .models import SalaryStructure, SalaryStructureLine
+from .registry import component_registry
+
+DEFAULT_CHUNK_SIZE = 2000
+
+HIKE_PATTERN = re.compile(r"^\+?(?P<value>\d+(\.\d+)?)(?P<percent>%?)$")
+
+
+@dataclass(frozen=True)
+class Hike:
+    """An increase by ``percentage`` percent or by a fixed ``amount``."""
+
+    percentage: Decimal = None
+    amount: Decimal = None
+
+    def apply(self, value):
+        minor = money.to_minor(value)
+        if self.percentage is not None:
+            minor += money.percentage(minor, self.percentage, money.HALF_UP)
+        else:
+            minor += money.to_minor(self.amount)
+        return money.to_decimal(minor)
+
+
+def parse_hike(text):
+    """Parse ``"10%"`` as a percentage hike and ``"1500"`` as a fixed one."""
+    match = HIKE_PATTERN.match(text.strip())
+    if match is None:
+        raise ValueError(f"Invalid hike {text!r}; use e.g. 10% or 1500.")
+    try:
+        value = Decimal(match["value"])
+    except InvalidOperation:
+        raise ValueError(f"Invalid hike {text!r}.")
+    if match["percent"]:
+        return Hike(percentage=value)
+    return Hike(amount=money.parse_amount(value))
+
+
+@dataclass
+class RevisionResult:
+    dry_run: bool = False
+    structures_closed: int = 0
+    structures_created: int = 0
+    lines_created: int = 0
+    # Monthly totals of the revised employees before and after the revision.
+    gross_before: Decimal = Decimal("0.00")
+    gross_after: Decimal = Decimal("0.00")
+    net_before: Decimal = Decimal("0.00")
+    net_after: Decimal = Decimal("0.00")
+    # (employee_id, reason) for every matched structure left unrevised.
+    skipped: list = field(default_factory=list)
+
+    @property
+    def gross_increase(self):
+        return self.gross_after - self.gross_before
+
+    @property
+    def net_increase(self):
+        return self.net_after - self.net_before
+
+
+def _revise_chunk(ids, effective_date, basic, hikes, modes, dry_run, result, seen):
+    rows = SalaryStructure.objects.filter(pk__in=ids).values_list(
+        "id",
+        "employee_id",
+        "employee__employee_id",
+        "effective_date",
+        "basic_pay",
+        "incentive_eligibility",
+        "description",
+        "gross_amount",
+        "net_amount",
+    )
+    lines = {}
+    for structure_id, component_id, amount in (
+        SalaryStructureLine.objects.filter(salary_structure_id__in=ids)
+        .order_by("pk")
+        .values_list("salary_structure_id", "salary_component_id", "amount")
+    ):
+        lines.setdefault(structure_id, []).append((component_id, amount))
+    for component_id in {
+        component_id
+        for chunk_lines in lines.values()
+        for component_id, _ in chunk_lines
+    } - modes.keys():
+        component = component_registry.get(component_id)
+        modes[component_id] = (
+            component.mode,
+            component.component_type,
+            component.rounding,
+        )
+    # Other structures already covering the new effective date, such as a
+    # revision scheduled earlier, would overlap the new one.
+    blocked = set(
+        SalaryStructure.objects.filter(
+            employee__in=SalaryStructure.objects.filter(pk__in=ids).values(
+                "employee_id"
+            )
+        )
+        .exclude(pk__in=ids)
+        .overlapping(effective_date)
+        .values_list("employee_id", flat=True)
+    )
+
+    now = timezone.now()
+    closed = []
+    revised = []
+    structures = []
+    structure_lines = []
+    for (
+        structure_id,
+        employee_pk,
+        employee_id,
+        current_date,
+        basic_pay,
+        incentive_eligibility,
+        description,
+        gross,
+        net,
+    ) in sorted(rows):
+        if employee_pk in seen:
+            result.skipped.append((employee_id, "more than one active structure"))
+            continue
+        seen.add(employee_pk)
+        if current_date >= effective_date:
+            result.skipped.append(
+                (employee_id, f"current structure starts on {current_date}")
+            )
+            continue
+        if employee_pk in blocked:
+            result.skipped.append(
+                (employee_id, f"another structure covers {effective_date}")
+            )
+            continue
+
+        new_basic = basic.apply(basic_pay) if basic else basic_pay
+        new_lines = [
+            (
+                component_id,
+                (
+                    hikes[component_id].apply(amount)
+                    if component_id in hikes
+                    else amount
+                ),
+            )
+            for component_id, amount in lines.get(structure_id, [])
+        ]
+        totals = calculate_structure(
+            money.to_minor(new_basic),
+            ((pk, *modes[pk], money.to_minor(amount)) for pk, amount in new_lines),
+        )
+        closed.append(structure_id)
+        revised.append(employee_id)
+        structures.append(
+            SalaryStructure(
+                employee_id=employee_pk,
+                effective_date=effective_date,
+                basic_pay=new_basic,
+                incentive_eligibility=incentive_eligibility,
+                description=description,
+                is_active=True,
+                created_at=now,
+                updated_at=now,
+                gross_amount=totals["gross"],
+                net_amount=totals["net"],
+                total_earnings=totals["earnings"],
+                total_deductions=totals["deductions"],
+            )
+        )
+        structure_lines.append(new_lines)
+        result.gross_before += gross
+        result.net_before += net
+        result.gross_after += totals["gross"]
+        result.net_after += totals["net"]
+
+    result.structures_closed += len(closed)
+    result.structures_created += len(structures)
+    result.lines_created += sum(len(new_lines) for new_lines in structure_lines)
+    if dry_run or not closed:
+        return
+
+    SalaryStructure.objects.bulk_create_active(structures, now=now)
+    SalaryStructureLine.objects.bulk_create(
+        [
+            SalaryStructureLine(
+                salary_structure=structure,
+                salary_component_id=component_id,
+                amount=amount,
+                created_at=now,
+                updated_at=now,
+            )
+            for structure, new_lines in zip(structures, structure_lines)
+            for component_id, amount in new_lines
+        ]
+    )
+    after_bulk_write(revised)
+
+
+def revise_structures(
+    structures,
+    effective_date,
+    basic=None,
+    components=None,
+    dry_run=False,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+):
+    """
+    Revise the active structures among ``structures`` from ``effective_date``.
+
+    Each one is closed the day before ``effective_date`` and replaced by an
+    active copy whose basic pay is raised by the ``basic`` Hike and whose
+    lines are raised by ``components``, a dict of component code to Hike.
+    Hikes apply to the line amount, which for percentage components is the
+    rate. Lines of other components are copied unchanged.
+
+    Structures are read and written per chunk with a fixed number of queries
+    and the whole revision runs in one transaction. Employees whose current
+    structure starts on or after ``effective_date``, or who have another
+    structure covering it, are skipped and reported in ``result.skipped``.
+    With ``dry_run`` nothing is written and the result reports what the
+    revision would create and its effect on monthly gross and net pay.
+    """
+    hikes = {
+        component_registry.get_by_code(code).pk: hike
+        for code, hike in (components or {}).items()
+    }
+    modes = component_registry.modes()
+    result = RevisionResult(dry_run=dry_run)
+    seen = set()
+    with transaction.atomic():
+        ids = list(
+            structures.filter(is_active=True)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        for start in range(0, len(ids), chunk_size):
+            _revise_chunk(
+                ids[start : start + chunk_size],
+                effective_date,
+                basic,
+                hikes,
+                modes,
+                dry_run,
+                result,
+                seen,
+            )
+    result.skipped.sort()
+    return result
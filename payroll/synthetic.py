@@ -0,0 +1,225 @@
+"""
+Synthetic payroll data for benchmarks and load testing.
+
+Data is generated from a seeded random number generator, so the same
+arguments always produce the same employees, accounts, structures and lines.
+"""
+
+import random
+from dataclasses import dataclass
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import money
+from .bulk import after_bulk_write
+from .calculations import PAISA, calculate_structure
+from .models import (
+    BankAccount,
+    Employee,
+    SalaryComponent,
+    SalaryStructure,
+    SalaryStructureLine,
+)
+
+DEFAULT_CHUNK_SIZE = 5000
+# Synthetic employee ids are numbers counted up from here, well above the
+# ids of real employees.
+DEFAULT_FIRST_ID = 900000000
+
+# (code, name, type, mode, share of employees that have it, low, high). Low
+# and high bound the line amount: a percentage of basic pay or a fixed sum.
+COMPONENTS = [
+    ("HRA", "House Rent Allowance", "earning", "percentage", 0.95, 30, 50),
+    ("DA", "Dearness Allowance", "earning", "percentage", 0.6, 5, 20),
+    ("CONV", "Conveyance", "earning", "fixed", 0.7, 800, 3200),
+    ("SPL", "Special Allowance", "earning", "fixed", 0.5, 1000, 20000),
+    ("MED", "Medical Allowance", "earning", "fixed", 0.4, 1250, 1250),
+    ("LTA", "Leave Travel Allowance", "earning", "percentage", 0.3, 5, 10),
+    ("PF", "Provident Fund", "deduction", "percentage", 0.9, 12, 12),
+    ("PT", "Professional Tax", "deduction", "fixed", 0.8, 200, 200),
+    ("ESI", "Employee State Insurance", "deduction", "percentage", 0.2, 0.75, 0.75),
+    ("TDS", "Tax Deducted at Source", "deduction", "percentage", 0.35, 5, 20),
+]
+
+# fmt: off
+FIRST_NAMES = [
+    "Aarav", "Aditi", "Amit", "Ananya", "Arjun", "Divya", "Farhan", "Gita",
+    "Ishaan", "Kavya", "Meera", "Nikhil", "Priya", "Rahul", "Riya", "Rohan",
+    "Sanjay", "Shreya", "Tanvi", "Vikram",
+]
+LAST_NAMES = [
+    "Banerjee", "Chatterjee", "Das", "Gupta", "Iyer", "Joshi", "Khan", "Kumar",
+    "Mehta", "Nair", "Patel", "Rao", "Reddy", "Sarangi", "Sharma", "Singh",
+]
+# fmt: on
+BANKS = [
+    ("State Bank of India", "SBIN"),
+    ("HDFC Bank", "HDFC"),
+    ("ICICI Bank", "ICIC"),
+    ("Axis Bank", "UTIB"),
+    ("Punjab National Bank", "PUNB"),
+]
+# Share of employees with an older, closed structure and a second account.
+PREVIOUS_STRUCTURE_SHARE = 0.3
+SECOND_ACCOUNT_SHARE = 0.1
+
+
+@dataclass
+class GeneratedData:
+    employees: int = 0
+    bank_accounts: int = 0
+    structures: int = 0
+    lines: int = 0
+
+
+def ensure_components():
+    """Create the synthetic component catalogue where missing; map code to it."""
+    components = SalaryComponent.objects.in_bulk(
+        [code for code, *_ in COMPONENTS], field_name="code"
+    )
+    missing = [
+        SalaryComponent(code=code, name=name, component_type=component_type, mode=mode)
+        for code, name, component_type, mode, *_ in COMPONENTS
+        if code not in components
+    ]
+    for component in SalaryComponent.objects.bulk_create(missing):
+        components[component.code] = component
+    if missing:
+        after_bulk_write(components=True)
+    return components
+
+
+def _basic_pay(rng):
+    # Log-normal around 30,000 with a long tail, rounded to the hundred.
+    value = min(max(rng.lognormvariate(10.3, 0.5), 10000), 500000)
+    return Decimal(round(value, -2)).quantize(PAISA)
+
+
+def _lines(rng, components):
+    lines = []
+    for code, _, _, mode, share, low, high in COMPONENTS:
+        if rng.random() < share:
+            amount = Decimal(str(rng.uniform(low, high)))
+            if mode == SalaryComponent.FIXED:
+                amount = amount.quantize(Decimal(1))
+            lines.append((components[code], amount.quantize(PAISA)))
+    return lines
+
+
+def _structure(employee, basic_pay, lines, effective_date, end_date, now):
+    totals = calculate_structure(
+        money.to_minor(basic_pay),
+        (
+            (
+                component.pk,
+                component.mode,
+                component.component_type,
+                component.rounding,
+                money.to_minor(amount),
+            )
+            for component, amount in lines
+        ),
+    )
+    return SalaryStructure(
+        employee=employee,
+        effective_date=effective_date,
+        end_date=end_date,
+        basic_pay=basic_pay,
+        is_active=end_date is None,
+        created_at=now,
+        updated_at=now,
+        gross_amount=totals["gross"],
+        net_amount=totals["net"],
+        total_earnings=totals["earnings"],
+        total_deductions=totals["deductions"],
+    )
+
+
+def _generate_chunk(rng, ids, components, result):
+    if Employee.objects.filter(employee_id__in=ids).exists():
+        raise ValueError(f"Employees already exist between {ids[0]} and {ids[-1]}.")
+    now = timezone.now()
+    today = timezone.localdate()
+    employees = [
+        Employee(
+            employee_id=employee_id,
+            name=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        )
+        for employee_id in ids
+    ]
+    Employee.objects.bulk_create(employees)
+
+    accounts = []
+    structures = []
+    structure_lines = []
+    for employee in employees:
+        for index in range(2 if rng.random() < SECOND_ACCOUNT_SHARE else 1):
+            bank_name, ifsc_prefix = rng.choice(BANKS)
+            accounts.append(
+                BankAccount(
+                    employee=employee,
+                    bank_name=bank_name,
+                    account_number=f"{rng.randrange(10**11, 10**12)}",
+                    ifsc_code=f"{ifsc_prefix}0{rng.randrange(10**6):06d}",
+                    branch_name=f"Branch {rng.randrange(1, 500)}",
+                    is_primary=index == 0,
+                )
+            )
+        effective_date = today - timedelta(days=rng.randrange(730))
+        revisions = [(effective_date, None)]
+        if rng.random() < PREVIOUS_STRUCTURE_SHARE:
+            start = effective_date - timedelta(days=rng.randrange(365, 1095))
+            revisions.append((start, effective_date - timedelta(days=1)))
+        for start, end in revisions:
+            lines = _lines(rng, components)
+            structures.append(
+                _structure(employee, _basic_pay(rng), lines, start, end, now)
+            )
+            structure_lines.append(lines)
+
+    BankAccount.objects.bulk_create(accounts)
+    SalaryStructure.objects.bulk_create(structures)
+    lines = [
+        SalaryStructureLine(
+            salary_structure=structure,
+            salary_component=component,
+            amount=amount,
+            created_at=now,
+            updated_at=now,
+        )
+        for structure, lines in zip(structures, structure_lines)
+        for component, amount in lines
+    ]
+    SalaryStructureLine.objects.bulk_create(lines)
+    result.employees += len(employees)
+    result.bank_accounts += len(accounts)
+    result.structures += len(structures)
+    result.lines += len(lines)
+
+
+def generate_payroll_data(
+    employees, seed=0, first_id=DEFAULT_FIRST_ID, chunk_size=DEFAULT_CHUNK_SIZE
+):
+    """
+    Create ``employees`` active employees with bank accounts, salary
+    structures and lines, all written with ``bulk_create`` in chunks.
+
+    Every employee has a primary account and an active structure; some also
+    have a second account and an older, closed structure. Components are
+    drawn from ``COMPONENTS`` and mix percentage and fixed lines. A
+    ValueError is raised if an employee id in the generated range exists.
+    """
+    rng = random.Random(seed)
+    components = ensure_components()
+    result = GeneratedData()
+    for start in range(0, employees, chunk_size):
+        ids = [
+            str(first_id + index)
+            for index in range(start, min(start + chunk_size, employees))
+        ]
+        with transaction.atomic():
+            _generate_chunk(rng, ids, components, result)
+    return result
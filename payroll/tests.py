@@ -1,3 +1,2257 @@
-from django.test import TestCase
+import os
+import pstats
+import random
+import zipfile
+from datetime import date, timedelta
+from decimal import ROUND_DOWN, ROUND_HALF_EVEN, ROUND_HALF_UP, ROUND_UP, Decimal
+from io import BytesIO, StringIO
+from tempfile import TemporaryDirectory
+from unittest import skipIf
+from concurrent.futures import Future
+from importlib import import_module
+from unittest.mock import patch
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    background,
+    calculations,
+    engine,
+    money,
+    payslips,
+    registry,
+    vectorized,
+)
+from .engine import PayrollRunError, resume_payroll, run_payroll, shard_employee_ids
+from .formulas import FormulaError, compile_evaluator
+from .arrears import compute_arrears
+from .benchmarks import compare_results, run_benchmarks
+from .exports import (
+    FIXED_WIDTH_LAYOUT,
+    BankFileError,
+    fixed_width_errors,
+    iter_bank_transfer_csv,
+    iter_bank_transfer_fixed,
+)
+from .importers import import_structures
+from .registry import ComponentRegistry, component_registry
+from .reports import (
+    BUSINESS_UNITS,
+    COMPONENTS,
+    business_unit_totals,
+    refresh_all_summaries,
+    refresh_summaries,
+)
+from .revisions import Hike, parse_hike, revise_structures
+from .synthetic import generate_payroll_data
+from .views import EmployeeListView
+from .models import (
+    BankAccount,
+    DeletedRecord,
+    Employee,
+    MonthlySalary,
+    MonthlySalaryLine,
+    PayrollAdjustment,
+    PayrollComponentSummary,
+    PayrollPeriodSummary,
+    PayrollRun,
+    SalaryComponent,
+    SalaryPayment,
+    SalaryStructure,
+    SalaryStructureLine,
+)
+
+
+class PayrollFixturesMixin:
+    @classmethod
+    def setUpTestData(cls):
+        cls.hra = SalaryComponent.objects.create(
+            name="HRA",
+            code="HRA",
+            component_type=SalaryComponent.EARNING,
+            mode=SalaryComponent.PERCENTAGE,
+        )
+        cls.allowance = SalaryComponent.objects.create(
+            name="Allowance",
+            code="ALW",
+            component_type=SalaryComponent.EARNING,
+            mode=SalaryComponent.FIXED,
+        )
+        cls.pf = SalaryComponent.objects.create(
+            name="Provident Fund",
+            code="PF",
+            component_type=SalaryComponent.DEDUCTION,
+            mode=SalaryComponent.PERCENTAGE,
+        )
+
+    @classmethod
+    def create_employee(cls, employee_id, basic_pay="30000.00", is_active=True):
+        employee = Employee.objects.create(
+            employee_id=employee_id, name=f"Employee {employee_id}", is_active=is_active
+        )
+        structure = SalaryStructure.objects.create(
+            employee=employee, basic_pay=Decimal(basic_pay)
+        )
+        for component, amount in (
+            (cls.hra, "40.00"),
+            (cls.allowance, "1500.00"),
+            (cls.pf, "12.00"),
+        ):
+            SalaryStructureLine.objects.create(
+                salary_structure=structure,
+                salary_component=component,
+                amount=Decimal(amount),
+            )
+        return employee
+
+
+class SalaryBreakdownTests(PayrollFixturesMixin, TestCase):
+    def test_breakdown_is_computed_once(self):
+        employee = self.create_employee("1001")
+        structure = SalaryStructure.objects.get(employee=employee)
+        with self.assertNumQueries(1):
+            self.assertEqual(structure.gross_salary(), Decimal("43500.00"))
+            self.assertEqual(structure.net_salary(), Decimal("39900.00"))
+            self.assertEqual(
+                structure.calculate_component_amounts(),
+                {"earnings": Decimal("13500.00"), "deductions": Decimal("3600.00")},
+            )
+        breakdown = structure.breakdown
+        self.assertEqual(breakdown.basic, Decimal("30000.00"))
+        self.assertEqual(breakdown.components[self.pf.pk], Decimal("3600.00"))
+
+    def test_saving_structure_or_line_invalidates(self):
+        employee = self.create_employee("1001")
+        structure = SalaryStructure.objects.get(employee=employee)
+        self.assertEqual(structure.net_salary(), Decimal("39900.00"))
+
+        structure.basic_pay = Decimal("40000.00")
+        structure.save()
+        self.assertEqual(structure.net_salary(), Decimal("52700.00"))
+
+        line = structure.lines.get(salary_component=self.allowance)
+        line.salary_structure = structure
+        line.amount = Decimal("2000.00")
+        line.save()
+        self.assertEqual(structure.net_salary(), Decimal("53200.00"))
+
+        line.delete()
+        self.assertEqual(structure.net_salary(), Decimal("51200.00"))
+
+
+class StoredTotalsTests(PayrollFixturesMixin, TestCase):
+    def assertTotals(self, structure, gross, net):
+        structure.refresh_from_db()
+        self.assertEqual(structure.gross_amount, Decimal(gross))
+        self.assertEqual(structure.net_amount, Decimal(net))
+        self.assertEqual(structure.total_earnings, Decimal(gross) - structure.basic_pay)
+        self.assertEqual(structure.total_deductions, Decimal(gross) - Decimal(net))
+
+    def test_totals_follow_structure_and_lines(self):
+        employee = self.create_employee("1001")
+        structure = SalaryStructure.objects.get(employee=employee)
+        self.assertTotals(structure, "43500.00", "39900.00")
+
+        structure.basic_pay = Decimal("40000.00")
+        structure.save()
+        self.assertTotals(structure, "57500.00", "52700.00")
+
+        structure.lines.get(salary_component=self.pf).delete()
+        self.assertTotals(structure, "57500.00", "57500.00")
+
+    def test_component_mode_change_refreshes_structures(self):
+        employee = self.create_employee("1001")
+        structure = SalaryStructure.objects.get(employee=employee)
+
+        self.pf.mode = SalaryComponent.FIXED
+        self.pf.save()
+        self.assertTotals(structure, "43500.00", "43488.00")
+
+        self.allowance.component_type = SalaryComponent.DEDUCTION
+        self.allowance.save()
+        self.assertTotals(structure, "42000.00", "40488.00")
+
+        self.hra.delete()
+        self.assertTotals(structure, "30000.00", "28488.00")
+
+    def test_component_rounding_change_refreshes_structures(self):
+        employee = self.create_employee("1001", basic_pay="30000.05")
+        structure = SalaryStructure.objects.get(employee=employee)
+        # PF is 12% of 30000.05 = 3600.006.
+        self.assertTotals(structure, "43500.07", "39900.06")
+
+        self.pf.rounding = money.DOWN
+        self.pf.save()
+        self.assertTotals(structure, "43500.07", "39900.07")
+
+    def test_backfill_migration(self):
+        # The migration must keep working whatever payroll.calculations
+        # becomes, and a structure without lines is paid its basic pay.
+        backfill = import_module(
+            "payroll.migrations.0004_backfill_salarystructure_totals"
+        ).backfill_totals
+        self.create_employee("1001")
+        bare = SalaryStructure.objects.create(
+            employee=Employee.objects.create(employee_id="1002", name="Bare"),
+            basic_pay=Decimal("25000.00"),
+        )
+        SalaryStructure.objects.update(
+            gross_amount=0, net_amount=0, total_earnings=0, total_deductions=0
+        )
+        backfill(django_apps, None)
+        self.assertTotals(
+            SalaryStructure.objects.get(employee__employee_id="1001"),
+            "43500.00",
+            "39900.00",
+        )
+        self.assertTotals(bare, "25000.00", "25000.00")
+
+    def test_pay_band(self):
+        self.create_employee("1001", basic_pay="10000.00")
+        self.create_employee("1002", basic_pay="30000.00")
+        self.assertQuerySetEqual(
+            SalaryStructure.objects.pay_band(minimum=20000).values_list(
+                "employee__employee_id", flat=True
+            ),
+            ["1002"],
+        )
+
+
+class EffectiveDatedStructureTests(PayrollFixturesMixin, TestCase):
+    def create_structure(self, employee, effective_date, basic_pay, **kwargs):
+        return SalaryStructure.objects.create(
+            employee=employee,
+            effective_date=date.fromisoformat(effective_date),
+            basic_pay=Decimal(basic_pay),
+            **kwargs,
+        )
+
+    def test_activating_closes_previous_structure(self):
+        employee = Employee.objects.create(employee_id="1001", name="A")
+        first = self.create_structure(employee, "2025-01-01", "10000.00")
+        second = self.create_structure(employee, "2025-04-01", "20000.00")
+        first.refresh_from_db()
+        self.assertFalse(first.is_active)
+        self.assertEqual(first.end_date, date(2025, 3, 31))
+        self.assertTrue(second.is_active)
+
+    def test_effective_on_resolves_many_employees_in_one_query(self):
+        employees = []
+        for employee_id, revised_on in (
+            ("1001", "2025-04-01"),
+            ("1002", "2025-04-01"),
+            ("1003", "2025-03-01"),
+        ):
+            employee = Employee.objects.create(employee_id=employee_id, name="A")
+            self.create_structure(employee, "2025-01-01", "10000.00")
+            self.create_structure(employee, revised_on, "15000.00")
+            employees.append(employee)
+
+        with self.assertNumQueries(1):
+            resolved = dict(
+                SalaryStructure.objects.effective_on(date(2025, 3, 15))
+                .filter(employee__in=employees)
+                .values_list("employee__employee_id", "basic_pay")
+            )
+        self.assertEqual(
+            resolved,
+            {
+                "1001": Decimal("10000.00"),
+                "1002": Decimal("10000.00"),
+                "1003": Decimal("15000.00"),
+            },
+        )
+
+    def test_overlapping_history_is_rejected(self):
+        employee = Employee.objects.create(employee_id="1001", name="A")
+        self.create_structure(employee, "2025-01-01", "10000.00")
+        self.create_structure(employee, "2025-04-01", "20000.00")
+        with self.assertRaises(ValidationError):
+            self.create_structure(
+                employee,
+                "2025-03-01",
+                "15000.00",
+                end_date=date(2025, 5, 31),
+                is_active=False,
+            )
+        with self.assertRaises(ValidationError):
+            self.create_structure(
+                employee,
+                "2025-03-01",
+                "15000.00",
+                end_date=date(2025, 2, 1),
+                is_active=False,
+            )
+
+    def test_structure_before_the_active_one_is_rejected(self):
+        employee = Employee.objects.create(employee_id="1001", name="A")
+        active = self.create_structure(employee, "2025-04-01", "10000.00")
+        for effective_date in ("2025-04-01", "2025-03-01"):
+            with self.assertRaises(ValidationError):
+                self.create_structure(employee, effective_date, "15000.00")
+        active.refresh_from_db()
+        self.assertTrue(active.is_active)
+        self.assertIsNone(active.end_date)
+
+    def test_run_payroll_as_of(self):
+        employee = self.create_employee("1001")
+        structure = employee.current_salary_structure
+        structure.effective_date = date(2025, 1, 1)
+        structure.save()
+        self.create_structure(employee, "2025-06-01", "50000.00")
+
+        run_payroll(4, 2025, as_of=date(2025, 4, 30))
+
+        self.assertEqual(MonthlySalary.objects.get(month=4).salary_structure, structure)
+
+
+class AddSalaryStructureTests(PayrollFixturesMixin, TestCase):
+    def post(self, basic_pay, hra):
+        Employee.objects.get_or_create(employee_id="1001", name="A")
+        return self.client.post(
+            reverse("add_salary_structure", args=["1001"]),
+            {
+                "effective_date": "2025-04-01",
+                "basic_pay": basic_pay,
+                f"component_{self.hra.pk}": hra,
+            },
+        )
+
+    def test_amounts_are_stored_exactly(self):
+        response = self.post("30000.10", "40")
+        self.assertEqual(response.status_code, 302)
+        structure = SalaryStructure.objects.get()
+        self.assertEqual(structure.basic_pay, Decimal("30000.10"))
+        self.assertEqual(structure.gross_amount, Decimal("42000.14"))
+
+    def test_sub_paisa_amounts_are_rejected(self):
+        response = self.post("30000.105", "40")
+        self.assertContains(response, "Invalid amount.")
+        response = self.post("30000", "40.001")
+        self.assertContains(response, "Invalid amount for HRA.")
+        self.assertFalse(SalaryStructure.objects.exists())
+
+
+class SingleActiveInvariantTests(PayrollFixturesMixin, TestCase):
+    def account(self, employee, number, is_primary):
+        return BankAccount(
+            employee=employee,
+            bank_name="SBI",
+            account_number=number,
+            ifsc_code="SBIN0000001",
+            branch_name="Main",
+            is_primary=is_primary,
+        )
+
+    def test_second_active_structure_is_rejected(self):
+        employee = self.create_employee("1001")
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            SalaryStructure.objects.bulk_create(
+                [SalaryStructure(employee=employee, effective_date=date(2030, 1, 1))]
+            )
+
+    def test_bulk_create_active_closes_previous_structures(self):
+        first = self.create_employee("1001")
+        second = self.create_employee("1002")
+        with self.assertNumQueries(3):
+            SalaryStructure.objects.bulk_create_active(
+                [
+                    SalaryStructure(employee=first, effective_date=date(2030, 1, 1)),
+                    SalaryStructure(employee=second, effective_date=date(2030, 2, 1)),
+                ]
+            )
+        closed = dict(
+            SalaryStructure.objects.filter(is_active=False).values_list(
+                "employee__employee_id", "end_date"
+            )
+        )
+        self.assertEqual(
+            closed, {"1001": date(2029, 12, 31), "1002": date(2030, 1, 31)}
+        )
+        with self.assertRaises(ValueError):
+            SalaryStructure.objects.bulk_create_active(
+                [
+                    SalaryStructure(employee=first, effective_date=date(2031, 1, 1)),
+                    SalaryStructure(employee=first, effective_date=date(2032, 1, 1)),
+                ]
+            )
+        with self.assertRaisesMessage(ValueError, f"employees {second.pk}."):
+            SalaryStructure.objects.bulk_create_active(
+                [SalaryStructure(employee=second, effective_date=date(2030, 2, 1))]
+            )
+
+    def test_one_primary_account_per_employee(self):
+        employee = self.create_employee("1001")
+        old = self.account(employee, "111", True)
+        old.save()
+        (new,) = BankAccount.objects.bulk_create_accounts(
+            [self.account(employee, "222", True)]
+        )
+        old.refresh_from_db()
+        self.assertFalse(old.is_primary)
+
+        BankAccount.objects.make_primary([old.pk])
+        self.assertEqual(list(employee.bank_accounts.filter(is_primary=True)), [old])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            BankAccount.objects.filter(pk=new.pk).update(is_primary=True)
+
+
+class SalaryRevisionTests(PayrollFixturesMixin, TestCase):
+    def setUp(self):
+        self.effective_date = timezone.localdate() + timedelta(days=30)
+        for employee_id in ("1001", "1002"):
+            self.create_employee(employee_id)
+
+    def revise(self, **kwargs):
+        return revise_structures(
+            SalaryStructure.objects.all(),
+            self.effective_date,
+            basic=parse_hike("10%"),
+            components={"ALW": parse_hike("500")},
+            **kwargs,
+        )
+
+    def test_revision_closes_and_replaces_active_structures(self):
+        result = self.revise()
+
+        self.assertEqual(result.structures_created, 2)
+        self.assertEqual(result.lines_created, 6)
+        self.assertEqual(result.gross_increase, Decimal("9400.00"))
+        self.assertEqual(result.net_increase, Decimal("8680.00"))
+        old = SalaryStructure.objects.filter(is_active=False)
+        self.assertEqual(old.count(), 2)
+        self.assertEqual(
+            set(old.values_list("end_date", flat=True)),
+            {self.effective_date - timedelta(days=1)},
+        )
+        current = SalaryStructure.objects.with_lines().get(
+            employee__employee_id="1001", is_active=True
+        )
+        self.assertEqual(current.effective_date, self.effective_date)
+        self.assertEqual(current.basic_pay, Decimal("33000.00"))
+        self.assertEqual(current.gross_amount, Decimal("48200.00"))
+        self.assertEqual(current.gross_amount, current.gross_salary())
+        self.assertEqual(current.net_amount, Decimal("44240.00"))
+
+    def test_dry_run_reports_cost_without_writing(self):
+        # Savepoint, ids, structures, lines, overlaps, release.
+        with self.assertNumQueries(6):
+            result = self.revise(dry_run=True)
+
+        self.assertTrue(result.dry_run)
+        self.assertEqual(result.structures_created, 2)
+        self.assertEqual(result.gross_before, Decimal("87000.00"))
+        self.assertEqual(result.gross_after, Decimal("96400.00"))
+        self.assertEqual(SalaryStructure.objects.count(), 2)
+
+    def test_structures_starting_later_are_skipped(self):
+        result = revise_structures(
+            SalaryStructure.objects.all(),
+            timezone.localdate(),
+            basic=parse_hike("5%"),
+        )
+
+        self.assertEqual(result.structures_created, 0)
+        self.assertEqual([employee for employee, _ in result.skipped], ["1001", "1002"])
+
+    def test_parse_hike(self):
+        self.assertEqual(parse_hike("12.5%"), Hike(percentage=Decimal("12.5")))
+        self.assertEqual(parse_hike("+1500"), Hike(amount=Decimal("1500")))
+        with self.assertRaises(ValueError):
+            parse_hike("-5%")
+
+    def test_command(self):
+        stdout = StringIO()
+        call_command(
+            "revise_salaries",
+            self.effective_date.isoformat(),
+            "--basic",
+            "10%",
+            "--component",
+            "ALW=500",
+            "--employees",
+            "1001",
+            stdout=stdout,
+        )
+        self.assertIn("Revised 1 structures", stdout.getvalue())
+        self.assertEqual(SalaryStructure.objects.count(), 3)
+
+    def test_command_rejects_invalid_gross(self):
+        with self.assertRaisesMessage(CommandError, "invalid amount 'lots'"):
+            call_command(
+                "revise_salaries",
+                self.effective_date.isoformat(),
+                "--basic",
+                "10%",
+                "--min-gross",
+                "lots",
+            )
+
+
+class ImportStructuresTests(PayrollFixturesMixin, TestCase):
+    def test_import_creates_employees_structures_and_lines(self):
+        employee = self.create_employee("1001")
+        SalaryStructure.objects.filter(employee=employee).update(
+            effective_date=date(2025, 1, 1)
+        )
+        old = SalaryStructure.objects.get(employee=employee)
+        csv_file = StringIO(
+            "employee_id,name,effective_date,end_date,basic_pay,HRA,PF\n"
+            "1001,,2025-04-01,,40000.00,40,12\n"
+            "2001,New Hire,2025-04-01,,20000.00,,12\n"
+            "2002,,2025-04-01,,20000.00,,\n"
+            "2003,Bad Date,2025-13-01,,20000.00,,\n"
+            "2001,New Hire,2025-05-01,,21000.00,,12\n"
+        )
+
+        with self.assertNumQueries(17):
+            result = import_structures(csv_file)
+
+        self.assertEqual(result.structures_created, 3)
+        self.assertEqual(result.lines_created, 4)
+        self.assertEqual(result.employees_created, 1)
+        self.assertEqual([line for line, _ in result.errors], [4, 5])
+        old.refresh_from_db()
+        self.assertFalse(old.is_active)
+        self.assertEqual(old.end_date.isoformat(), "2025-03-31")
+        current = Employee.objects.get(employee_id="1001").current_salary_structure
+        self.assertEqual(current.gross_amount, Decimal("56000.00"))
+        self.assertEqual(current.net_amount, Decimal("51200.00"))
+        hires = SalaryStructure.objects.filter(employee__employee_id="2001")
+        self.assertEqual(hires.filter(is_active=True).get().basic_pay, 21000)
+        self.assertEqual(hires.get(is_active=False).end_date.isoformat(), "2025-04-30")
+
+    def test_structures_overlapping_stored_ones_are_rejected(self):
+        employee = self.create_employee("1001")
+        active = SalaryStructure.objects.get(employee=employee)
+        self.create_employee("1002")
+        result = import_structures(
+            StringIO(
+                "employee_id,effective_date,basic_pay\n"
+                f"1001,{active.effective_date - timedelta(days=1)},40000.00\n"
+                f"1002,{active.effective_date + timedelta(days=1)},40000.00\n"
+            )
+        )
+
+        self.assertEqual(result.structures_created, 1)
+        self.assertEqual([line for line, _ in result.errors], [2])
+        active.refresh_from_db()
+        self.assertTrue(active.is_active)
+        self.assertIsNone(active.end_date)
+
+    def test_unknown_component_column(self):
+        with self.assertRaises(ValueError):
+            import_structures(StringIO("employee_id,effective_date,basic_pay,BONUS\n"))
+
+
+class EmployeeListViewTests(PayrollFixturesMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for index in range(1, 8):
+            cls.create_employee(f"100{index:02d}", basic_pay=f"{index}0000.00")
+
+    def get_page(self, **params):
+        response = self.client.get(reverse("employee_list"), params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def employee_ids(self, response):
+        return [employee.employee_id for employee in response.context["employees"]]
+
+    def test_keyset_pages(self):
+        with patch.object(EmployeeListView, "page_size", 3):
+            first = self.get_page()
+            self.assertEqual(self.employee_ids(first), ["10001", "10002", "10003"])
+            self.assertIsNone(first.context["previous_before"])
+            self.assertEqual(first.context["next_after"], "10003")
+
+            last = self.get_page(after="10006")
+            self.assertEqual(self.employee_ids(last), ["10007"])
+            self.assertIsNone(last.context["next_after"])
+
+            previous = self.get_page(before="10004")
+            self.assertEqual(self.employee_ids(previous), ["10001", "10002", "10003"])
+            self.assertIsNone(previous.context["previous_before"])
+            self.assertEqual(previous.context["next_after"], "10003")
+
+    def test_query_count_is_flat(self):
+        with self.assertNumQueries(1):
+            self.get_page(show_pay=1)
+        with self.assertNumQueries(1):
+            self.get_page(show_pay=1, after="10005")
+
+    def test_search_and_pay_columns(self):
+        response = self.get_page(q="Employee 10003", show_pay=1)
+        self.assertEqual(self.employee_ids(response), ["10003"])
+        employee = response.context["employees"][0]
+        self.assertEqual(employee.gross_salary, Decimal("43500.00"))
+        self.assertEqual(employee.net_salary, Decimal("39900.00"))
+        self.assertEqual(
+            self.employee_ids(self.get_page(q="1000")),
+            [f"100{index:02d}" for index in range(1, 8)],
+        )
+        Employee.objects.filter(employee_id="10005").update(name="ÉMILE Zola")
+        self.assertEqual(
+            self.employee_ids(self.get_page(q="employee 1000")),
+            [f"100{index:02d}" for index in (1, 2, 3, 4, 6, 7)],
+        )
+        self.assertEqual(self.employee_ids(self.get_page(q="Émile Z")), ["10005"])
+        self.assertEqual(self.employee_ids(self.get_page(q="1001")), [])
+
+
+@override_settings(
+    CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "components": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "payroll-components-tests",
+        },
+    }
+)
+class ComponentRegistryTests(PayrollFixturesMixin, TestCase):
+    def tearDown(self):
+        # Components changed here are rolled back without a signal.
+        component_registry.invalidate()
+
+    def test_lookups_cost_no_queries_once_loaded(self):
+        component_registry.by_id()
+        with self.assertNumQueries(0):
+            self.assertEqual(component_registry.get(self.hra.pk).code, "HRA")
+            self.assertEqual(component_registry.get_by_code("PF"), self.pf)
+            self.assertEqual(
+                component_registry.modes()[self.pf.pk],
+                (SalaryComponent.PERCENTAGE, SalaryComponent.DEDUCTION, money.HALF_UP),
+            )
+
+    def test_lines_take_components_from_the_registry(self):
+        employee = self.create_employee("1001")
+        component_registry.by_id()
+        structure = employee.salary_structures.with_lines().get()
+        with self.assertNumQueries(0):
+            names = {line.salary_component.name for line in structure.lines.all()}
+        self.assertEqual(names, {"HRA", "Allowance", "Provident Fund"})
+
+    def test_save_and_delete_invalidate(self):
+        component_registry.by_id()
+        self.allowance.name = "Special Allowance"
+        self.allowance.save()
+        self.assertEqual(
+            component_registry.get(self.allowance.pk).name, "Special Allowance"
+        )
+        pk = self.allowance.pk
+        self.allowance.delete()
+        with self.assertRaises(SalaryComponent.DoesNotExist):
+            component_registry.get(pk)
+
+    def test_unknown_component_is_reloaded(self):
+        component_registry.by_id()
+        (created,) = SalaryComponent.objects.bulk_create(
+            [SalaryComponent(code="BON", name="Bonus", component_type="earning")]
+        )
+        self.assertEqual(component_registry.get_by_code("BON").pk, created.pk)
+
+    def test_components_expire_without_a_shared_cache(self):
+        other = ComponentRegistry()
+        other.by_id()
+        SalaryComponent.objects.filter(pk=self.hra.pk).update(name="Rent")
+        with self.assertNumQueries(0):
+            self.assertEqual(other.get(self.hra.pk).name, "HRA")
+        with override_settings(PAYROLL_COMPONENT_TTL_SECONDS=0):
+            self.assertEqual(other.get(self.hra.pk).name, "Rent")
+
+    @override_settings(PAYROLL_COMPONENT_CACHE="components")
+    def test_shared_cache_reaches_other_processes(self):
+        other = ComponentRegistry()
+        component_registry.by_id()
+        with self.assertNumQueries(0):
+            self.assertEqual(other.get(self.hra.pk).code, "HRA")
+        self.hra.name = "Rent"
+        self.hra.save()
+        self.assertEqual(other.get(self.hra.pk).name, "Rent")
+
+
+class EmployeePageQueryCountTests(PayrollFixturesMixin, TestCase):
+    """Pin the query count of employee pages so N+1 lookups cannot return."""
+
+    def create_history(self, structures):
+        employee = self.create_employee("1001")
+        for index in range(structures):
+            structure = SalaryStructure.objects.create(
+                employee=employee,
+                effective_date=timezone.localdate() + timedelta(days=index + 1),
+                basic_pay=Decimal(f"{40000 + index}.00"),
+            )
+            for component in (self.hra, self.allowance, self.pf):
+                SalaryStructureLine.objects.create(
+                    salary_structure=structure,
+                    salary_component=component,
+                    amount=Decimal("10.00"),
+                )
+        return employee
+
+    def assertPageQueries(self, url_name, queries):
+        for structures in (1, 5):
+            with self.subTest(structures=structures):
+                employee = self.create_history(structures)
+                url = reverse(url_name, args=[employee.employee_id])
+                with self.assertNumQueries(queries):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                employee.delete()
+
+    def test_employee_detail(self):
+        # Employee, active structure, its lines, old structures exist.
+        self.assertPageQueries("employee_detail", 4)
+
+    def test_add_salary_structure_form(self):
+        # Employee, active structure, its lines; components come from the
+        # registry.
+        self.assertPageQueries("add_salary_structure", 3)
+
+    def test_old_salary_structures(self):
+        # Employee, old structures, their lines.
+        self.assertPageQueries("old_salary_structures", 3)
+
+
+class EmployeePageCacheTests(PayrollFixturesMixin, TestCase):
+    def setUp(self):
+        self.employee = self.create_employee("1001")
+        self.url = reverse("employee_detail", args=["1001"])
+
+    def assertCached(self, *texts):
+        """The page is rendered once, then served without queries."""
+        response = self.client.get(self.url)
+        for text in texts:
+            self.assertContains(response, text)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).content, response.content)
+
+    def test_repeat_views_run_no_queries(self):
+        self.assertCached("43500.00")
+
+    def test_structure_line_save_invalidates(self):
+        self.assertCached("1500.00")
+        line = SalaryStructureLine.objects.get(salary_component=self.allowance)
+        line.amount = Decimal("2500.00")
+        line.save()
+        self.assertCached("2500.00", "44500.00")
+
+    def test_component_save_invalidates(self):
+        self.assertCached("Allowance")
+        self.allowance.name = "Special Allowance"
+        self.allowance.save()
+        self.assertCached("Special Allowance")
+
+    def test_bank_account_save_invalidates(self):
+        self.assertCached()
+        BankAccount.objects.create(
+            employee=self.employee, bank_name="Bank", account_number="1"
+        )
+        with self.assertNumQueries(4):
+            self.client.get(self.url)
+
+    def test_revision_invalidates(self):
+        self.assertCached("30000.00")
+        revise_structures(
+            SalaryStructure.objects.all(),
+            timezone.localdate() + timedelta(days=1),
+            basic=Hike(percentage=Decimal("10")),
+        )
+        self.assertCached("33000.00")
+
+    def test_file_based_cache(self):
+        with TemporaryDirectory() as directory, override_settings(
+            CACHES={
+                "default": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": directory,
+                }
+            }
+        ):
+            self.assertCached("43500.00")
+            self.employee.name = "Renamed"
+            self.employee.save()
+            self.assertCached("Renamed")
+
+    @override_settings(PAYROLL_PAGE_CACHE=None)
+    def test_disabled(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(4):
+            self.client.get(self.url)
+
+
+@override_settings(PAYROLL_API_SYNC_LAG_SECONDS=0)
+class ApiTests(PayrollFixturesMixin, TestCase):
+    def get(self, name, **params):
+        return self.client.get(reverse("api_resource", args=[name]), params)
+
+    def test_sparse_fields(self):
+        self.create_employee("1001")
+        response = self.get("employees", fields="employee_id,name")
+        self.assertEqual(
+            response.json()["results"],
+            [{"employee_id": "1001", "name": "Employee 1001"}],
+        )
+
+    def test_cursor_pages_then_pulls_changes(self):
+        for employee_id in ("1001", "1002", "1003"):
+            self.create_employee(employee_id)
+
+        first = self.get("employees", fields="employee_id", limit=2).json()
+        self.assertEqual(len(first["results"]), 2)
+        self.assertTrue(first["has_more"])
+        second = self.get(
+            "employees", fields="employee_id", limit=2, cursor=first["next"]
+        ).json()
+        self.assertEqual(second["results"], [{"employee_id": "1003"}])
+        self.assertFalse(second["has_more"])
+
+        changed = self.get("employees", cursor=second["next"]).json()
+        self.assertEqual(
+            changed, {"results": [], "next": second["next"], "has_more": False}
+        )
+        employee = Employee.objects.get(employee_id="1001")
+        employee.name = "Renamed"
+        employee.save()
+        changed = self.get("employees", fields="name", cursor=second["next"]).json()
+        self.assertEqual(changed["results"], [{"name": "Renamed"}])
+
+    def test_structure_lines(self):
+        self.create_employee("1001")
+        cursor = self.get("salary_structures").json()["next"]
+        line = SalaryStructureLine.objects.get(salary_component=self.allowance)
+        line.amount = Decimal("2500.00")
+        line.save()
+
+        results = self.get(
+            "salary_structures", fields="employee,net_amount,lines", cursor=cursor
+        ).json()["results"]
+
+        self.assertEqual(
+            results,
+            [
+                {
+                    "employee": "1001",
+                    "net_amount": "40900.00",
+                    "lines": [
+                        {"component": "HRA", "amount": "40.00"},
+                        {"component": "ALW", "amount": "2500.00"},
+                        {"component": "PF", "amount": "12.00"},
+                    ],
+                }
+            ],
+        )
+
+    def test_salary_adjustments_are_synced(self):
+        self.create_employee("1001")
+        run_payroll(4, 2025)
+        cursor = self.get("monthly_salaries").json()["next"]
+        PayrollAdjustment.objects.create(
+            monthly_salary=MonthlySalary.objects.get(),
+            adjustment_amount=Decimal("250.00"),
+            reason="Bonus",
+        )
+
+        results = self.get(
+            "monthly_salaries", fields="month,adjustments", cursor=cursor
+        ).json()["results"]
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["month"], 4)
+        self.assertEqual(results[0]["adjustments"][0]["amount"], "250.00")
+
+    def test_etag(self):
+        self.create_employee("1001")
+        etag = self.get("employees")["ETag"]
+        url = reverse("api_resource", args=["employees"])
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+        Employee.objects.get().save()
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_not_modified_reads_only_the_page(self):
+        self.create_employee("1001")
+        run_payroll(4, 2025)
+        url = reverse("api_resource", args=["monthly_salaries"])
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_deleted_rows_are_reported(self):
+        employee = self.create_employee("1001")
+        employee_pk = employee.pk
+        structure_pk = employee.salary_structures.get().pk
+        self.assertFalse(DeletedRecord.objects.exists())
+
+        employee.delete()
+
+        results = self.get("deleted", fields="resource,object_id").json()["results"]
+        self.assertCountEqual(
+            results,
+            [
+                {"resource": "employees", "object_id": employee_pk},
+                {"resource": "salary_structures", "object_id": structure_pk},
+            ],
+        )
+        results = self.get("deleted", resource="employees").json()["results"]
+        self.assertEqual([result["object_id"] for result in results], [employee_pk])
+
+    @override_settings(PAYROLL_API_SYNC_LAG_SECONDS=60)
+    def test_recent_rows_wait_for_the_sync_lag(self):
+        self.create_employee("1001")
+        self.assertEqual(self.get("employees").json()["results"], [])
+        Employee.objects.update(updated_at=timezone.now() - timedelta(minutes=2))
+        self.assertEqual(len(self.get("employees").json()["results"]), 1)
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        # The page and one query per nested list.
+        for count in (1, 20):
+            for index in range(count):
+                self.create_employee(f"{count}{index:03d}")
+            run_payroll(4, 2025)
+            with self.subTest(count=count), self.assertNumQueries(3):
+                response = self.get("monthly_salaries", limit=100)
+            self.assertEqual(
+                len(response.json()["results"]), MonthlySalary.objects.count()
+            )
+
+    def test_invalid_requests(self):
+        for params in (
+            {"fields": "name,salary"},
+            {"limit": "0"},
+            {"limit": "many"},
+            {"cursor": "not-a-cursor"},
+            {"is_active": "maybe"},
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(self.get("employees", **params).status_code, 400)
+        self.assertEqual(self.get("bank_accounts").status_code, 404)
+
+
+class RunPayrollTests(PayrollFixturesMixin, TestCase):
+    def test_creates_salaries_for_active_employees(self):
+        employee = self.create_employee("1001")
+        self.create_employee("1002", is_active=False)
+
+        result = run_payroll(4, 2025)
+
+        self.assertEqual(result.payroll_run.status, PayrollRun.COMPLETED)
+        self.assertEqual(result.salaries_created, 1)
+        salary = MonthlySalary.objects.get()
+        self.assertEqual(salary.employee, employee)
+        self.assertEqual(salary.gross_amount, Decimal("43500.00"))
+        self.assertEqual(salary.net_amount, Decimal("39900.00"))
+        lines = dict(
+            salary.salary_lines.values_list("salary_component__code", "amount")
+        )
+        self.assertEqual(
+            lines,
+            {
+                "HRA": Decimal("12000.00"),
+                "ALW": Decimal("1500.00"),
+                "PF": Decimal("3600.00"),
+            },
+        )
+
+    def test_rerun_skips_paid_employees(self):
+        self.create_employee("1001")
+        run_payroll(4, 2025)
+        self.create_employee("1002")
+
+        result = run_payroll(4, 2025)
+
+        self.assertEqual(result.salaries_created, 1)
+        self.assertEqual(result.skipped, 1)
+        self.assertEqual(MonthlySalary.objects.filter(month=4, year=2025).count(), 2)
+
+    def test_query_count_does_not_grow_with_headcount(self):
+        self.create_employee("1001")
+        with self.assertNumQueries(27):
+            run_payroll(4, 2025)
+        for index in range(20):
+            self.create_employee(f"2{index:03d}")
+        with self.assertNumQueries(27):
+            run_payroll(5, 2025)
+
+    def test_invalid_month(self):
+        with self.assertRaises(ValueError):
+            run_payroll(13, 2025)
+
+    def test_command(self):
+        self.create_employee("1001")
+        call_command(
+            "run_payroll", "4", "2025", "--run-version", "apr-25", stdout=StringIO()
+        )
+        run = PayrollRun.objects.get(run_version="apr-25")
+        self.assertEqual(run.monthly_salaries.count(), 1)
+        self.assertEqual(MonthlySalaryLine.objects.count(), 3)
+
+
+class ResumePayrollTests(PayrollFixturesMixin, TestCase):
+    def interrupted_run(self, employees=4, fail_at=2):
+        for index in range(employees):
+            self.create_employee(f"1{index:03d}")
+        write_structures = engine.write_structures
+        calls = []
+
+        def write_or_fail(spec, computed):
+            calls.append(None)
+            if len(calls) == fail_at:
+                raise RuntimeError("connection lost")
+            return write_structures(spec, computed)
+
+        with patch.object(engine, "write_structures", write_or_fail):
+            with self.assertRaises(RuntimeError):
+                run_payroll(4, 2025, chunk_size=1)
+        return PayrollRun.objects.get()
+
+    def test_completed_chunks_are_checkpointed(self):
+        payroll_run = self.interrupted_run()
+
+        self.assertEqual(payroll_run.status, PayrollRun.FAILED)
+        self.assertEqual((payroll_run.month, payroll_run.year), (4, 2025))
+        checkpoint = payroll_run.checkpoints.get()
+        self.assertEqual(checkpoint.chunk_index, 0)
+        self.assertEqual(checkpoint.salaries_created, 1)
+        self.assertEqual(
+            checkpoint.last_structure_id,
+            MonthlySalary.objects.get().employee.salary_structures.get().pk,
+        )
+
+    def test_resume_pays_the_remaining_employees_once(self):
+        payroll_run = self.interrupted_run()
+
+        result = resume_payroll(payroll_run, chunk_size=1)
+
+        self.assertEqual(result.salaries_created, 3)
+        self.assertEqual(result.skipped, 0)
+        payroll_run.refresh_from_db()
+        self.assertEqual(payroll_run.status, PayrollRun.COMPLETED)
+        self.assertEqual(payroll_run.monthly_salaries.count(), 4)
+        self.assertEqual(MonthlySalaryLine.objects.count(), 12)
+        self.assertEqual(
+            list(payroll_run.checkpoints.values_list("chunk_index", flat=True)),
+            [0, 1, 2, 3],
+        )
+
+    def test_completed_run_cannot_be_resumed(self):
+        self.create_employee("1001")
+        result = run_payroll(4, 2025)
+        with self.assertRaises(PayrollRunError):
+            resume_payroll(result.payroll_run)
+
+    def test_command(self):
+        payroll_run = self.interrupted_run()
+        call_command("resume_payroll_run", str(payroll_run.pk), stdout=StringIO())
+        self.assertEqual(MonthlySalary.objects.count(), 4)
+
+
+class RunMetricsTests(PayrollFixturesMixin, TestCase):
+    def test_phases_are_recorded(self):
+        for index in range(3):
+            self.create_employee(f"1{index:03d}")
+
+        result = run_payroll(4, 2025, chunk_size=2)
+
+        metrics = {metric.phase: metric for metric in result.payroll_run.metrics.all()}
+        self.assertEqual(set(metrics), {"load", "calculate", "write", "summarize"})
+        self.assertEqual(metrics["load"].rows, 3)
+        self.assertEqual(metrics["calculate"].rows, 3)
+        # Three salaries with three lines each.
+        self.assertEqual(metrics["write"].rows, 12)
+        self.assertEqual(metrics["calculate"].queries, 0)
+        self.assertGreater(metrics["write"].queries, 0)
+        self.assertGreater(metrics["load"].rows_per_second, 0)
+        self.assertEqual(result.metrics.phases["write"].rows, 12)
+
+    def test_failed_run_keeps_its_metrics(self):
+        self.create_employee("1001")
+        with patch.object(engine, "write_structures", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                run_payroll(4, 2025)
+        self.assertTrue(PayrollRun.objects.get().metrics.filter(phase="load"))
+
+    def test_profile_dump(self):
+        self.create_employee("1001")
+        with TemporaryDirectory() as profile_dir:
+            result = run_payroll(4, 2025, profile_dir=profile_dir)
+            path = os.path.join(
+                profile_dir, f"payroll-run-{result.payroll_run.pk}.prof"
+            )
+            self.assertTrue(pstats.Stats(path).total_calls)
+
+
+class IncrementalRerunTests(PayrollFixturesMixin, TestCase):
+    def setUp(self):
+        for index in range(3):
+            self.create_employee(f"1{index:03d}")
+        self.first_run = run_payroll(4, 2025).payroll_run
+
+    def test_unchanged_inputs_are_not_recomputed(self):
+        with self.assertNumQueries(25):
+            result = run_payroll(4, 2025, incremental=True)
+        self.assertEqual(result.payroll_run.run_version, "2025-04-r2")
+        self.assertEqual(result.salaries_updated, 0)
+        self.assertEqual(result.skipped, 3)
+
+    def test_only_stale_salaries_are_recomputed(self):
+        changed = Employee.objects.get(employee_id="1001")
+        line = SalaryStructureLine.objects.get(
+            salary_structure__employee=changed, salary_component=self.allowance
+        )
+        line.amount = Decimal("2500.00")
+        line.save()
+
+        result = run_payroll(4, 2025, incremental=True)
+
+        self.assertEqual(result.salaries_updated, 1)
+        self.assertEqual(result.salaries_created, 0)
+        self.assertEqual(result.skipped, 2)
+        salary = MonthlySalary.objects.get(employee=changed)
+        self.assertEqual(salary.payroll_run, result.payroll_run)
+        self.assertEqual(salary.gross_amount, Decimal("44500.00"))
+        self.assertEqual(
+            salary.salary_lines.get(salary_component=self.allowance).amount,
+            Decimal("2500.00"),
+        )
+        self.assertEqual(salary.salary_lines.count(), 3)
+        self.assertEqual(
+            MonthlySalary.objects.filter(payroll_run=self.first_run).count(), 2
+        )
+
+    def test_adjustments_are_applied_to_net(self):
+        salary = MonthlySalary.objects.get(employee__employee_id="1002")
+        PayrollAdjustment.objects.create(
+            monthly_salary=salary, adjustment_amount=Decimal("-400.00"), reason="Loan"
+        )
+
+        result = run_payroll(4, 2025, incremental=True)
+
+        self.assertEqual(result.salaries_updated, 1)
+        salary.refresh_from_db()
+        self.assertEqual(salary.net_amount, Decimal("39500.00"))
+        self.assertEqual(salary.adjustments.count(), 1)
+
+
+class InProcessExecutor:
+    """Stands in for ProcessPoolExecutor so shards see the test transaction."""
+
+    def __init__(self, max_workers, initializer, initargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as exc:
+            future.set_exception(exc)
+        return future
+
+
+@patch.object(engine, "ProcessPoolExecutor", InProcessExecutor)
+@patch.object(engine.connections, "close_all", lambda: None)
+class ShardedPayrollTests(PayrollFixturesMixin, TestCase):
+    def test_shard_employee_ids(self):
+        self.assertEqual(shard_employee_ids([5, 1, 2, 9, 7], 2), [(1, 5), (7, 9)])
+        self.assertEqual(shard_employee_ids([3], 4), [(3, 3)])
+        self.assertEqual(shard_employee_ids([], 4), [])
+
+    def test_sharded_run_pays_everyone(self):
+        for index in range(10):
+            self.create_employee(f"1{index:03d}")
+
+        result = run_payroll(4, 2025, workers=2)
+
+        self.assertEqual(result.shards, 5)
+        self.assertEqual(result.salaries_created, 10)
+        self.assertEqual(result.payroll_run.status, PayrollRun.COMPLETED)
+        self.assertEqual(MonthlySalaryLine.objects.count(), 30)
+        self.assertEqual(result.metrics.phases["calculate"].rows, 10)
+
+    def test_failed_shard_fails_the_run_and_keeps_other_shards(self):
+        for index in range(4):
+            self.create_employee(f"1{index:03d}")
+        failing = Employee.objects.order_by("pk").last().pk
+        write_structures = engine.write_structures
+
+        def write_or_fail(spec, computed):
+            if any(
+                item[0][1] == failing for pending, *_ in computed for item in pending
+            ):
+                raise RuntimeError("disk full")
+            return write_structures(spec, computed)
+
+        with patch.object(engine, "write_structures", write_or_fail):
+            with self.assertRaises(PayrollRunError):
+                run_payroll(4, 2025, workers=2)
+
+        payroll_run = PayrollRun.objects.get()
+        self.assertEqual(payroll_run.status, PayrollRun.FAILED)
+        self.assertIn("disk full", payroll_run.notes)
+        self.assertEqual(payroll_run.monthly_salaries.count(), 3)
+
+
+@skipIf(vectorized.np is None, "numpy is not installed")
+class VectorizedEquivalenceTests(SimpleTestCase):
+    modes = (SalaryComponent.FIXED, SalaryComponent.PERCENTAGE)
+    types = (SalaryComponent.EARNING, SalaryComponent.DEDUCTION)
+
+    def random_structures(self, count, seed):
+        rng = random.Random(seed)
+        structures = []
+        for index in range(count):
+            basic_pay = rng.randint(0, 50_000_000)
+            lines = [
+                (
+                    component_id,
+                    rng.choice(self.modes),
+                    rng.choice(self.types),
+                    rng.choice(money.ROUNDING_RULES),
+                    rng.randint(0, 9_999_999),
+                )
+                for component_id in rng.sample(range(1, 30), rng.randint(0, 12))
+            ]
+            structures.append((index, index, basic_pay, lines))
+        return structures
+
+    def assertBackendsMatch(self, structures):
+        self.assertEqual(
+            vectorized.calculate_structures(structures),
+            calculations.calculate_structures(structures),
+        )
+
+    def test_random_structures(self):
+        for seed in range(5):
+            with self.subTest(seed=seed):
+                self.assertBackendsMatch(self.random_structures(500, seed))
+
+    def test_half_paisa_rounding(self):
+        for rounding in money.ROUNDING_RULES:
+            percentage = (1, SalaryComponent.PERCENTAGE, SalaryComponent.EARNING)
+            percentage += (rounding,)
+            with self.subTest(rounding=rounding):
+                self.assertBackendsMatch(
+                    [
+                        (1, 1, 10010, [(*percentage, 1250)]),
+                        (2, 2, 1, [(*percentage, 5000)]),
+                        (3, 3, 33333, [(*percentage, 3333)]),
+                    ]
+                )
+
+    def test_large_values_do_not_overflow(self):
+        self.assertBackendsMatch(
+            [
+                (
+                    1,
+                    1,
+                    9_999_999_999,
+                    [
+                        (
+                            1,
+                            SalaryComponent.PERCENTAGE,
+                            SalaryComponent.DEDUCTION,
+                            money.HALF_EVEN,
+                            9_999_999_999,
+                        )
+                    ],
+                )
+            ]
+        )
+
+    def test_empty_batches_and_structures(self):
+        self.assertBackendsMatch([])
+        self.assertBackendsMatch([(1, 1, 10000, [])])
+
+
+class MoneyTests(SimpleTestCase):
+    def test_conversions(self):
+        self.assertEqual(money.to_minor(Decimal("1234.50")), 123450)
+        self.assertEqual(money.to_minor("-0.01"), -1)
+        self.assertEqual(money.to_minor(7), 700)
+        self.assertEqual(money.to_decimal(123450), Decimal("1234.50"))
+        self.assertEqual(str(money.to_decimal(0)), "0.00")
+        self.assertEqual(str(money.parse_amount(" 1500 ")), "1500.00")
+        for invalid in ("1.005", "abc", "NaN", "Infinity", ""):
+            with self.subTest(invalid=invalid), self.assertRaises(ValueError):
+                money.parse_amount(invalid)
+        with self.assertRaises(TypeError):
+            money.to_minor(0.1)
+
+    def test_rounding_rules_match_decimal(self):
+        rules = {
+            money.HALF_UP: ROUND_HALF_UP,
+            money.HALF_EVEN: ROUND_HALF_EVEN,
+            money.DOWN: ROUND_DOWN,
+            money.UP: ROUND_UP,
+        }
+        for rule, decimal_rule in rules.items():
+            for numerator in range(-25, 26):
+                with self.subTest(rule=rule, numerator=numerator):
+                    self.assertEqual(
+                        money.divide(numerator, 10, rule),
+                        int(
+                            (Decimal(numerator) / 10).quantize(
+                                Decimal(1), rounding=decimal_rule
+                            )
+                        ),
+                    )
+
+    def test_percentage(self):
+        # 12.5% of 100.10 is 12.5125: below half a paisa either way.
+        self.assertEqual(money.percentage(10010, Decimal("12.50")), 1251)
+        self.assertEqual(money.percentage(10010, Decimal("12.50"), money.UP), 1252)
+        # 50% of 0.01 is exactly half a paisa.
+        self.assertEqual(money.percentage(1, Decimal("50.00")), 1)
+        self.assertEqual(money.percentage(1, Decimal("50.00"), money.HALF_EVEN), 0)
+        self.assertEqual(money.percentage(3, Decimal("50"), money.HALF_EVEN), 2)
+        self.assertEqual(money.percentage(10000, Decimal("7.125")), 713)
+
+
+@skipIf(vectorized.np is None, "numpy is not installed")
+class NumpyBackendRunTests(PayrollFixturesMixin, TestCase):
+    def test_matches_decimal_run(self):
+        for index in range(5):
+            self.create_employee(f"1{index:03d}", basic_pay=f"{31111 + index}.37")
+        run_payroll(4, 2025, backend="decimal")
+        run_payroll(5, 2025, backend="numpy")
+
+        def totals(month):
+            return sorted(
+                MonthlySalary.objects.filter(month=month).values_list(
+                    "employee_id", "gross_amount", "net_amount"
+                )
+            )
+
+        def lines(month):
+            return sorted(
+                MonthlySalaryLine.objects.filter(
+                    monthly_salary__month=month
+                ).values_list(
+                    "monthly_salary__employee_id", "salary_component_id", "amount"
+                )
+            )
+
+        self.assertEqual(totals(4), totals(5))
+        self.assertEqual(lines(4), lines(5))
+
+
+class FormulaTests(PayrollFixturesMixin, TestCase):
+    def setUp(self):
+        self.tax = SalaryComponent.objects.create(
+            name="Professional Tax",
+            code="TAX",
+            component_type=SalaryComponent.DEDUCTION,
+            mode=SalaryComponent.FORMULA,
+            formula="slabs(gross, 0, 25000, 5, 50000, 20)",
+        )
+        self.pf.mode = SalaryComponent.FORMULA
+        self.pf.formula = "(basic + ALW) * amount / 100"
+        self.pf.save()
+
+    def create_employee(self, employee_id, basic_pay="30000.00"):
+        employee = super().create_employee(employee_id, basic_pay)
+        SalaryStructureLine.objects.create(
+            salary_structure=employee.salary_structures.get(),
+            salary_component=self.tax,
+            amount=0,
+        )
+        return employee
+
+    def component(self, code, formula, component_type=SalaryComponent.EARNING):
+        return SalaryComponent(
+            name=code,
+            code=code,
+            component_type=component_type,
+            mode=SalaryComponent.FORMULA,
+            formula=formula,
+        )
+
+    def test_breakdown(self):
+        employee = self.create_employee("1001")
+        breakdown = employee.salary_structures.get().breakdown
+        # PF is 12% of 31500 and tax 5% of the gross above 25000.
+        self.assertEqual(breakdown.components[self.pf.pk], Decimal("3780.00"))
+        self.assertEqual(breakdown.components[self.tax.pk], Decimal("925.00"))
+        self.assertEqual(breakdown.gross, Decimal("43500.00"))
+        self.assertEqual(breakdown.net, Decimal("38795.00"))
+
+    def test_formula_rounding(self):
+        self.pf.formula = "basic / 3"
+        self.pf.rounding = money.DOWN
+        self.pf.save()
+        structure = self.create_employee("1001").salary_structures.get()
+        self.assertEqual(
+            structure.breakdown.components[self.pf.pk], Decimal("10000.00")
+        )
+        self.pf.formula = "(basic + 1) / 3"
+        self.pf.save()
+        structure = SalaryStructure.objects.get(pk=structure.pk)
+        self.assertEqual(
+            structure.breakdown.components[self.pf.pk], Decimal("10000.33")
+        )
+        # Changing a formula refreshes the stored totals.
+        self.assertEqual(structure.total_deductions, Decimal("10925.33"))
+
+    def test_invalid_formulas_are_rejected(self):
+        for formula in (
+            "",
+            "basic +",
+            "__import__('os')",
+            "basic ** 2",
+            "DA * 2",
+            "sum(basic)",
+            "basic * 1e999999999",
+            "basic * 1e-20",
+            "basic * 0x10",
+        ):
+            with self.subTest(formula=formula):
+                with self.assertRaises(ValidationError):
+                    self.component("BONUS", formula).full_clean()
+
+    def test_cycles_are_rejected(self):
+        self.component("DA", "basic / 10").save()
+        self.component("CCA", "DA / 2").save()
+        da = SalaryComponent.objects.get(code="DA")
+        da.formula = "CCA * 2"
+        with self.assertRaisesMessage(ValidationError, "depend on each other"):
+            da.save()
+        # An earning cannot depend on gross pay, which includes it.
+        with self.assertRaisesMessage(ValidationError, "depend on each other"):
+            self.component("BONUS", "gross / 10").save()
+
+    def test_changes_that_break_other_formulas_are_rejected(self):
+        allowance = SalaryComponent.objects.get(pk=self.allowance.pk)
+        allowance.code = "SPL"
+        with self.assertRaisesMessage(ValidationError, "PF: unknown component ALW"):
+            allowance.save()
+        with self.assertRaisesMessage(ValidationError, "ALW is used in a formula"):
+            self.allowance.delete()
+        # An earning the tax on gross pay depends on cannot start using it.
+        allowance = SalaryComponent.objects.get(pk=self.allowance.pk)
+        allowance.mode = SalaryComponent.FORMULA
+        allowance.formula = "TAX * 2"
+        with self.assertRaisesMessage(ValidationError, "depend on each other"):
+            allowance.save()
+        self.assertTrue(SalaryComponent.objects.filter(code="ALW").exists())
+
+    def test_change_that_fails_on_a_structure_is_rejected(self):
+        structure = self.create_employee("1001").salary_structures.get()
+        self.component("DA", "basic / 10").save()
+        pf = SalaryComponent.objects.get(pk=self.pf.pk)
+        pf.formula = "1000 / DA"
+        with self.assertRaisesMessage(ValidationError, "PF: division by zero."):
+            pf.save()
+        self.assertEqual(
+            SalaryComponent.objects.get(pk=self.pf.pk).formula,
+            "(basic + ALW) * amount / 100",
+        )
+        structure = SalaryStructure.objects.get(pk=structure.pk)
+        self.assertEqual(structure.breakdown.components[self.pf.pk], Decimal("3780.00"))
+
+    def test_add_structure_reports_formula_errors(self):
+        ratio = self.component("RATIO", "1000 / HRA")
+        ratio.save()
+        Employee.objects.create(employee_id="1001", name="A")
+        response = self.client.post(
+            reverse("add_salary_structure", args=["1001"]),
+            {
+                "effective_date": "2025-04-01",
+                "basic_pay": "30000",
+                f"component_{ratio.pk}": "0",
+            },
+        )
+        self.assertContains(response, "RATIO: division by zero.")
+        self.assertFalse(SalaryStructure.objects.exists())
+
+    def test_evaluator_errors(self):
+        with self.assertRaisesMessage(FormulaError, "PF: unknown component DA"):
+            compile_evaluator([self.component("PF", "DA * 2")])
+        # Known components missing from the structure count as zero.
+        self.component("DA", "basic / 10").save()
+        bonus = self.component("BONUS", "basic * 2 + DA")
+        bonus.save()
+        self.assertEqual(
+            compile_evaluator([bonus], ["DA"])(1000, {bonus.pk: 0}), {bonus.pk: 2000}
+        )
+        ratio = self.component("RATIO", "basic / (amount - 1)")
+        ratio.save()
+        evaluate = compile_evaluator([ratio])
+        self.assertEqual(evaluate(1000, {ratio.pk: 300}), {ratio.pk: 500})
+        with self.assertRaisesMessage(FormulaError, "RATIO: division by zero."):
+            evaluate(1000, {ratio.pk: 100})
+
+    def test_evaluator_is_compiled_once_per_component_set(self):
+        ids = [self.hra.pk, self.allowance.pk, self.pf.pk, self.tax.pk]
+        self.assertIs(
+            component_registry.evaluator(ids),
+            component_registry.evaluator(reversed(ids)),
+        )
+        for index in range(3):
+            self.create_employee(f"1{index:03d}", basic_pay=f"{30000 + index}.00")
+        component_registry.invalidate()
+        with patch(
+            "payroll.registry.compile_evaluator",
+            wraps=registry.compile_evaluator,
+        ) as compile_evaluator:
+            result = run_payroll(4, 2025)
+        self.assertEqual(result.salaries_created, 3)
+        compile_evaluator.assert_called_once()
+
+    @skipIf(vectorized.np is None, "numpy is not installed")
+    def test_run_payroll_backends_match(self):
+        self.create_employee("1001")
+        self.create_employee("1002", basic_pay="61234.57")
+        SalaryStructureLine.objects.create(
+            salary_structure=super().create_employee("1003").salary_structures.get(),
+            salary_component=self.tax,
+            amount=0,
+        )
+        run_payroll(4, 2025, backend="decimal")
+        run_payroll(5, 2025, backend="numpy")
+        salaries = {
+            month: sorted(
+                MonthlySalaryLine.objects.filter(
+                    monthly_salary__month=month
+                ).values_list(
+                    "monthly_salary__employee__employee_id",
+                    "salary_component__code",
+                    "amount",
+                )
+            )
+            for month in (4, 5)
+        }
+        self.assertEqual(salaries[4], salaries[5])
+        self.assertIn(("1001", "TAX", Decimal("925.00")), salaries[4])
+
+
+class ArrearsTests(PayrollFixturesMixin, TestCase):
+    def pay_and_backdate(self, employee_id):
+        employee = self.create_employee(employee_id)
+        employee.salary_structures.update(effective_date=date(2025, 1, 1))
+        for month in (1, 2, 3):
+            run_payroll(month, 2025)
+        # 10% on basic pay from February: net 39900.00 -> 43740.00.
+        revise_structures(
+            employee.salary_structures.all(),
+            date(2025, 2, 1),
+            basic=Hike(percentage=Decimal("10")),
+        )
+        return employee
+
+    def test_writes_difference_for_covered_months(self):
+        employee = self.pay_and_backdate("1001")
+
+        result = compute_arrears(employee.salary_structures.all())
+
+        self.assertEqual(result.salaries_checked, 3)
+        self.assertEqual(result.adjustments_created, 2)
+        self.assertEqual(result.total, Decimal("7680.00"))
+        adjustments = PayrollAdjustment.objects.order_by("monthly_salary__month")
+        self.assertEqual(
+            [
+                (adjustment.monthly_salary.month, adjustment.adjustment_amount)
+                for adjustment in adjustments
+            ],
+            [(2, Decimal("3840.00")), (3, Decimal("3840.00"))],
+        )
+        self.assertEqual(
+            adjustments[0].salary_structure,
+            employee.salary_structures.get(is_active=True),
+        )
+        summary = PayrollPeriodSummary.objects.get(month=2, year=2025)
+        self.assertEqual(summary.total_adjustments, Decimal("3840.00"))
+        self.assertEqual(summary.net_amount, Decimal("43740.00"))
+        self.assertEqual(
+            list(
+                MonthlySalary.objects.order_by("month").values_list(
+                    "net_amount", flat=True
+                )
+            ),
+            [Decimal("39900.00"), Decimal("43740.00"), Decimal("43740.00")],
+        )
+
+    def test_next_run_pays_arrears(self):
+        employee = self.pay_and_backdate("1001")
+        BankAccount.objects.create(
+            employee=employee,
+            bank_name="State Bank",
+            account_number="SB1001",
+            ifsc_code="SBIN0000001",
+            branch_name="Main",
+            is_primary=True,
+        )
+        compute_arrears(employee.salary_structures.all())
+
+        april = run_payroll(4, 2025).payroll_run
+
+        def records(payroll_run):
+            return [
+                record.strip().split(",")[5:]
+                for record in list(iter_bank_transfer_csv(payroll_run))[1:]
+            ]
+
+        self.assertEqual(
+            records(april),
+            [
+                ["3840.00", "ARREARS 02/2025"],
+                ["3840.00", "ARREARS 03/2025"],
+                ["43740.00", "SALARY 04/2025"],
+            ],
+        )
+        # Re-exporting March pays only what March's run paid.
+        march = PayrollRun.objects.get(run_version="2025-03")
+        self.assertEqual(records(march), [["39900.00", "SALARY 03/2025"]])
+
+    def test_incremental_rerun_replaces_arrears(self):
+        employee = self.pay_and_backdate("1001")
+        compute_arrears(employee.salary_structures.all())
+        PayrollAdjustment.objects.create(
+            monthly_salary=MonthlySalary.objects.get(month=2),
+            adjustment_amount=Decimal("100.00"),
+            reason="Night shift allowance",
+        )
+
+        result = run_payroll(2, 2025, as_of=date(2025, 2, 1), incremental=True)
+
+        self.assertEqual(result.salaries_updated, 1)
+        salary = MonthlySalary.objects.get(month=2)
+        # Paid from the revised structure, plus the manual adjustment only.
+        self.assertEqual(salary.net_amount, Decimal("43840.00"))
+        self.assertEqual(
+            list(salary.adjustments.values_list("reason", flat=True)),
+            ["Night shift allowance"],
+        )
+        self.assertEqual(
+            MonthlySalary.objects.get(month=3).adjustments.get().adjustment_amount,
+            Decimal("3840.00"),
+        )
+        self.assertEqual(
+            compute_arrears(employee.salary_structures.all()).adjustments_created, 0
+        )
+
+    def test_rerun_adds_only_new_differences(self):
+        employee = self.pay_and_backdate("1001")
+        compute_arrears(employee.salary_structures.all())
+        self.assertEqual(
+            compute_arrears(employee.salary_structures.all()).adjustments_created, 0
+        )
+
+        structure = employee.salary_structures.get(is_active=True)
+        structure.basic_pay = Decimal("34000.00")
+        structure.save()
+        result = compute_arrears(employee.salary_structures.all())
+
+        # 1000 more basic pay adds 400 HRA and 120 PF each month.
+        self.assertEqual(
+            result.periods,
+            {(2025, 2): Decimal("1280.00"), (2025, 3): Decimal("1280.00")},
+        )
+
+    def test_dry_run_writes_nothing(self):
+        employee = self.pay_and_backdate("1001")
+        result = compute_arrears(employee.salary_structures.all(), dry_run=True)
+        self.assertEqual(result.adjustments_created, 2)
+        self.assertFalse(PayrollAdjustment.objects.exists())
+
+    def test_query_count_does_not_grow_with_headcount(self):
+        self.pay_and_backdate("1001")
+        with self.assertNumQueries(8):
+            compute_arrears(SalaryStructure.objects.all(), dry_run=True)
+        for index in range(5):
+            self.pay_and_backdate(f"2{index:03d}")
+        with self.assertNumQueries(8):
+            result = compute_arrears(SalaryStructure.objects.all(), dry_run=True)
+        self.assertEqual(result.adjustments_created, 12)
+
+    def test_command(self):
+        self.pay_and_backdate("1001")
+        out = StringIO()
+        call_command("compute_arrears", "--employees", "1001", stdout=out)
+        self.assertIn("Wrote 2 arrears totalling 7680.00", out.getvalue())
+        self.assertEqual(PayrollAdjustment.objects.count(), 2)
+
+        # Only structures changed since the last arrears are checked.
+        out = StringIO()
+        call_command("compute_arrears", stdout=out)
+        self.assertIn("of 0 structures", out.getvalue())
+        out = StringIO()
+        call_command("compute_arrears", "--all", "--dry-run", stdout=out)
+        self.assertIn("Would write 0 arrears totalling 0.00 for 3", out.getvalue())
+
+
+class SyntheticDataTests(TestCase):
+    def test_generates_consistent_structures(self):
+        result = generate_payroll_data(30, seed=7, chunk_size=8)
+
+        self.assertEqual(result.employees, 30)
+        self.assertEqual(Employee.objects.count(), 30)
+        self.assertEqual(BankAccount.objects.filter(is_primary=True).count(), 30)
+        self.assertEqual(SalaryStructure.objects.filter(is_active=True).count(), 30)
+        self.assertEqual(SalaryStructure.objects.count(), result.structures)
+        self.assertEqual(SalaryStructureLine.objects.count(), result.lines)
+        modes = set(SalaryComponent.objects.values_list("mode", flat=True))
+        self.assertEqual(modes, {SalaryComponent.FIXED, SalaryComponent.PERCENTAGE})
+        structure = SalaryStructure.objects.filter(is_active=True).first()
+        self.assertEqual(structure.gross_amount, structure.gross_salary())
+
+    def test_same_seed_gives_same_data(self):
+        def snapshot():
+            return list(
+                SalaryStructure.objects.order_by(
+                    "employee__employee_id", "pk"
+                ).values_list("employee__name", "basic_pay", "net_amount")
+            )
+
+        generate_payroll_data(10, seed=3)
+        first = snapshot()
+        SalaryStructure.objects.all().delete()
+        Employee.objects.all().delete()
+        generate_payroll_data(10, seed=3)
+        self.assertEqual(snapshot(), first)
+
+    def test_existing_ids_are_rejected(self):
+        generate_payroll_data(2, first_id=500)
+        with self.assertRaises(ValueError):
+            generate_payroll_data(2, first_id=501)
+
+
+class BenchmarkSuiteTests(TestCase):
+    def test_report_covers_every_case_and_rolls_back(self):
+        report = run_benchmarks([5], ["list_view", "run_payroll", "export_csv"])
+
+        results = {result["case"]: result for result in report["results"]}
+        self.assertEqual(set(results), {"list_view", "run_payroll", "export_csv"})
+        self.assertEqual(results["run_payroll"]["rows"], 5)
+        # The header line plus one row per primary account.
+        self.assertEqual(results["export_csv"]["rows"], 6)
+        self.assertEqual(report["environment"]["seed"], 0)
+        self.assertFalse(Employee.objects.exists())
+        self.assertFalse(PayrollRun.objects.exists())
+
+    def test_compare_results_flags_slower_cases(self):
+        def report(rate):
+            return {
+                "results": [
+                    {"case": "run_payroll", "scale": 1000, "rows_per_second": rate}
+                ]
+            }
+
+        self.assertEqual(compare_results(report(100), report(90)), [])
+        self.assertEqual(
+            compare_results(report(100), report(70)),
+            [("run_payroll", 1000, 100, 70)],
+        )
+
+
+class BenchmarkPayrollCommandTests(PayrollFixturesMixin, TestCase):
+    def test_runs_leave_nothing_behind(self):
+        self.create_employee("1001")
+        run_payroll(3, 2025)
+        PayrollAdjustment.objects.create(
+            monthly_salary=MonthlySalary.objects.get(),
+            adjustment_amount=Decimal("100.00"),
+            reason="Bonus",
+        )
+
+        call_command(
+            "benchmark_payroll", "4", "2025", workers=[1, 1], stdout=StringIO()
+        )
+
+        self.assertFalse(MonthlySalary.objects.filter(month=4).exists())
+        self.assertEqual(PayrollRun.objects.count(), 1)
+        self.assertFalse(DeletedRecord.objects.exists())
+        self.assertFalse(PayrollPeriodSummary.objects.filter(month=4).exists())
+        self.assertFalse(PayrollComponentSummary.objects.filter(month=4).exists())
+        # The bonus still waits for the next run to pay it.
+        self.assertTrue(SalaryPayment.objects.filter(payroll_run=None).exists())
+
+
+class BankTransferExportTests(PayrollFixturesMixin, TestCase):
+    def setUp(self):
+        for employee_id in ("1001", "1002"):
+            employee = self.create_employee(employee_id)
+            for bank_name, prefix, is_primary in (
+                ("Old Bank", "OLD", False),
+                ("State Bank", "SB", True),
+            ):
+                BankAccount.objects.create(
+                    employee=employee,
+                    bank_name=bank_name,
+                    account_number=f"{prefix}{employee_id}",
+                    ifsc_code="SBIN0000001",
+                    branch_name="Main",
+                    is_primary=is_primary,
+                )
+        self.create_employee("1003")
+        self.payroll_run = run_payroll(4, 2025).payroll_run
+
+    def download(self, **params):
+        url = reverse("bank_transfer_file", args=[self.payroll_run.pk])
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv(self):
+        with self.assertNumQueries(2):
+            content = self.download()
+        self.assertEqual(
+            content.splitlines(),
+            [
+                "employee_id,beneficiary_name,account_number,ifsc_code,bank_name,"
+                "amount,narration",
+                "1001,Employee 1001,SB1001,SBIN0000001,State Bank,39900.00,"
+                "SALARY 04/2025",
+                "1002,Employee 1002,SB1002,SBIN0000001,State Bank,39900.00,"
+                "SALARY 04/2025",
+            ],
+        )
+
+    def test_fixed_width(self):
+        records = self.download(format="fixed").split("\r\n")
+        self.assertEqual(records[-1], "")
+        self.assertEqual(len(records), 3)
+        width = sum(width for width, _ in FIXED_WIDTH_LAYOUT)
+        self.assertTrue(all(len(record) == width for record in records[:2]))
+        self.assertTrue(records[0].startswith("1001"))
+        self.assertIn("       39900.00SALARY 04/2025", records[0])
+
+    def test_fixed_width_records_are_ascii(self):
+        Employee.objects.filter(employee_id="1001").update(name="Zoë Šťastná")
+        records = self.download(format="fixed").split("\r\n")
+        self.assertTrue(records[0].isascii())
+        self.assertEqual(len(records[0]), len(records[1]))
+        self.assertIn("ZOE STASTNA", records[0])
+
+    def test_fixed_width_rejects_long_values(self):
+        BankAccount.objects.filter(account_number="SB1002").update(
+            account_number="1234567890123456789012345"
+        )
+        url = reverse("bank_transfer_file", args=[self.payroll_run.pk])
+        response = self.client.get(url, {"format": "fixed"})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(
+            response.content.decode(),
+            "1002: account_number '1234567890123456789012345' is longer than 20 "
+            "characters.",
+        )
+        with self.assertRaisesMessage(CommandError, "1002: account_number"):
+            call_command(
+                "export_bank_transfer",
+                str(self.payroll_run.pk),
+                format="fixed",
+                stdout=StringIO(),
+                stderr=StringIO(),
+            )
+        with self.assertRaises(BankFileError):
+            list(iter_bank_transfer_fixed(self.payroll_run))
+        # The CSV file has no widths to respect.
+        self.assertIn("1234567890123456789012345", self.download())
+
+    def test_incomplete_run_is_not_exported(self):
+        self.payroll_run.status = PayrollRun.IN_PROGRESS
+        self.payroll_run.save()
+        url = reverse("bank_transfer_file", args=[self.payroll_run.pk])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_rerun_pays_only_the_difference(self):
+        line = SalaryStructureLine.objects.get(
+            salary_structure__employee__employee_id="1001",
+            salary_component=self.allowance,
+        )
+        line.amount = Decimal("2500.00")
+        line.save()
+        rerun = run_payroll(4, 2025, incremental=True).payroll_run
+
+        self.assertEqual(
+            [
+                record.split(",")[5]
+                for record in iter_bank_transfer_csv(rerun)
+                if record.startswith("1001")
+            ],
+            ["1000.00"],
+        )
+        self.assertNotIn("1002", "".join(iter_bank_transfer_csv(rerun)))
+        # The first run's file still pays what it paid.
+        self.assertIn("39900.00", self.download().splitlines()[1])
+
+    def test_rerun_lowering_pay_pays_nothing(self):
+        SalaryStructureLine.objects.filter(
+            salary_structure__employee__employee_id="1001",
+            salary_component=self.allowance,
+        ).update(amount=Decimal("500.00"))
+        rerun = run_payroll(4, 2025, incremental=True).payroll_run
+
+        self.assertTrue(SalaryPayment.objects.filter(payroll_run=rerun).exists())
+        self.assertEqual(list(iter_bank_transfer_csv(rerun))[1:], [])
+        self.assertEqual(fixed_width_errors(rerun), [])
+
+    def test_command_reports_missing_accounts(self):
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            "export_bank_transfer",
+            str(self.payroll_run.pk),
+            stdout=stdout,
+            stderr=stderr,
+        )
+        self.assertEqual(len(stdout.getvalue().splitlines()), 3)
+        self.assertIn("Employee 1003 (1003)", stderr.getvalue())
+
+
+class PayslipTests(PayrollFixturesMixin, TestCase):
+    def setUp(self):
+        for employee_id in ("1001", "1002", "1003"):
+            self.create_employee(employee_id)
+        self.payroll_run = run_payroll(4, 2025).payroll_run
+        PayrollAdjustment.objects.create(
+            monthly_salary=MonthlySalary.objects.get(employee__employee_id="1002"),
+            adjustment_amount=Decimal("250.00"),
+            reason="Night shift allowance",
+        )
+
+    def read_zip(self, content):
+        with zipfile.ZipFile(BytesIO(content)) as archive:
+            return {name: archive.read(name).decode() for name in archive.namelist()}
+
+    def test_zip_has_one_payslip_per_salary(self):
+        with self.assertNumQueries(3):
+            content = b"".join(payslips.iter_payslip_zip(self.payroll_run))
+
+        files = self.read_zip(content)
+        self.assertEqual(
+            sorted(files),
+            [f"payslip_100{index}_2025-04.html" for index in (1, 2, 3)],
+        )
+        payslip = files["payslip_1002_2025-04.html"]
+        self.assertIn("Employee 1002", payslip)
+        self.assertIn("Provident Fund", payslip)
+        self.assertIn("3600.00", payslip)
+        self.assertIn("Night shift allowance", payslip)
+        self.assertIn("Net Amount: 40150.00", payslip)
+
+    def test_payslip_reconciles_with_the_salary_as_paid(self):
+        SalaryStructure.objects.filter(employee__employee_id="1002").update(
+            basic_pay=Decimal("99999.00")
+        )
+        adjustment = PayrollAdjustment.objects.get()
+        adjustment.adjustment_amount = Decimal("-100.00")
+        adjustment.save()
+        salary = MonthlySalary.objects.get(employee__employee_id="1002")
+        self.assertEqual(salary.net_amount, Decimal("39800.00"))
+
+        (payslip,) = next(
+            payslips.iter_payslip_chunks(MonthlySalary.objects.filter(pk=salary.pk))
+        )
+        self.assertEqual(payslip["basic_pay"], Decimal("30000.00"))
+        self.assertEqual(
+            payslip["net"],
+            payslip["gross"]
+            - sum(amount for _, amount in payslip["deductions"])
+            + sum(amount for _, amount in payslip["adjustments"]),
+        )
+
+        adjustment.delete()
+        salary.refresh_from_db()
+        self.assertEqual(salary.net_amount, Decimal("39900.00"))
+
+    @patch.object(payslips, "ProcessPoolExecutor", InProcessExecutor)
+    def test_worker_pool_keeps_employee_order(self):
+        rendered = payslips.iter_rendered_payslips(
+            MonthlySalary.objects.all(), workers=2, chunk_size=1
+        )
+        self.assertEqual(
+            [filename for filename, _ in rendered],
+            [f"payslip_100{index}_2025-04.html" for index in (1, 2, 3)],
+        )
+
+    def test_write_to_directory(self):
+        with TemporaryDirectory() as directory:
+            written = payslips.write_payslips(self.payroll_run, directory)
+            self.assertEqual(written, 3)
+            self.assertEqual(len(os.listdir(directory)), 3)
+
+    @patch.object(payslips, "weasyprint", None)
+    def test_pdf_without_weasyprint_fails_before_writing(self):
+        with TemporaryDirectory() as directory:
+            output = os.path.join(directory, "payslips.zip")
+            with self.assertRaisesMessage(CommandError, "require weasyprint"):
+                call_command(
+                    "generate_payslips",
+                    str(self.payroll_run.pk),
+                    output=output,
+                    format=payslips.PDF,
+                    stdout=StringIO(),
+                )
+            self.assertFalse(os.path.exists(output))
+        with self.assertRaises(ImproperlyConfigured):
+            payslips.iter_payslip_zip(self.payroll_run, payslips.PDF)
+
+    def test_views(self):
+        response = self.client.get(reverse("payslips_zip", args=[self.payroll_run.pk]))
+        self.assertEqual(response["Content-Type"], "application/zip")
+        files = self.read_zip(b"".join(response.streaming_content))
+        self.assertEqual(len(files), 3)
+
+        response = self.client.get(
+            reverse("payslip_detail", args=[self.payroll_run.pk, 1003])
+        )
+        self.assertContains(response, "Employee 1003")
+
+
+class PayrollReportTests(PayrollFixturesMixin, TestCase):
+    def setUp(self):
+        SalaryComponent.objects.filter(pk__in=[self.hra.pk, self.pf.pk]).update(
+            business_unit=10
+        )
+        SalaryComponent.objects.filter(pk=self.allowance.pk).update(business_unit=20)
+        for employee_id in ("1001", "1002"):
+            self.create_employee(employee_id)
+        run_payroll(4, 2025)
+
+    def test_run_refreshes_summaries(self):
+        summary = PayrollPeriodSummary.objects.get(month=4, year=2025)
+        self.assertEqual(summary.employees, 2)
+        self.assertEqual(summary.gross_amount, Decimal("87000.00"))
+        self.assertEqual(summary.net_amount, Decimal("79800.00"))
+        self.assertEqual(summary.total_earnings, Decimal("27000.00"))
+        self.assertEqual(summary.total_deductions, Decimal("7200.00"))
+        pf = PayrollComponentSummary.objects.get(salary_component=self.pf)
+        self.assertEqual((pf.employees, pf.total_amount), (2, Decimal("7200.00")))
+
+        with self.assertNumQueries(1):
+            rows = list(business_unit_totals(month=4, year=2025))
+        self.assertEqual(
+            [
+                (row["business_unit"], row["earnings"], row["deductions"])
+                for row in rows
+            ],
+            [
+                (10, Decimal("24000.00"), Decimal("7200.00")),
+                (20, Decimal("3000.00"), None),
+            ],
+        )
+
+    def test_totals_are_exact(self):
+        # 0.10 + 0.20 summed as floats is 0.30000000000000004.
+        for employee_id, amount in (("2001", "0.10"), ("2002", "0.20")):
+            MonthlySalary.objects.create(
+                employee=self.create_employee(employee_id),
+                month=5,
+                year=2025,
+                gross_amount=Decimal(amount),
+                net_amount=Decimal(amount),
+            )
+        summary = refresh_summaries(5, 2025)
+        self.assertEqual(str(summary.gross_amount), "0.30")
+        self.assertEqual(str(summary.net_amount), "0.30")
+
+    def test_refresh_replaces_stale_totals(self):
+        salary = MonthlySalary.objects.get(employee__employee_id="1002")
+        PayrollAdjustment.objects.create(
+            monthly_salary=salary, adjustment_amount=Decimal("250.00"), reason="Bonus"
+        )
+        salary.salary_lines.filter(salary_component=self.allowance).delete()
+
+        refresh_summaries(4, 2025)
+
+        summary = PayrollPeriodSummary.objects.get(month=4, year=2025)
+        self.assertEqual(summary.total_adjustments, Decimal("250.00"))
+        self.assertEqual(summary.total_earnings, Decimal("25500.00"))
+        self.assertEqual(
+            PayrollComponentSummary.objects.get(
+                salary_component=self.allowance
+            ).employees,
+            1,
+        )
+
+    def test_refresh_all_drops_months_without_salaries(self):
+        PayrollPeriodSummary.objects.create(month=1, year=2024)
+        self.assertEqual(refresh_all_summaries(), 1)
+        self.assertEqual(
+            list(PayrollPeriodSummary.objects.values_list("month", "year")),
+            [(4, 2025)],
+        )
+
+    def test_view_and_command(self):
+        response = self.client.get(reverse("payroll_report", args=[BUSINESS_UNITS]))
+        self.assertContains(response, "24000.00")
+
+        response = self.client.get(
+            reverse("payroll_report", args=[COMPONENTS]),
+            {"format": "csv", "year": 2025},
+        )
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(
+            lines[0], "year,month,component,type,business_unit,employees,total"
+        )
+        self.assertIn("2025,4,PF,deduction,10,2,7200.00", lines)
+
+        self.assertEqual(
+            self.client.get(reverse("payroll_report", args=["unknown"])).status_code,
+            404,
+        )
+        for params in ({"month": "April"}, {"year": "2025x"}, {"month": 13}):
+            response = self.client.get(
+                reverse("payroll_report", args=[COMPONENTS]), params
+            )
+            self.assertEqual(response.status_code, 400)
+
+        stdout = StringIO()
+        call_command(
+            "payroll_report", "periods", "--refresh", stdout=stdout, stderr=StringIO()
+        )
+        self.assertIn("2025,4,2,87000.00", stdout.getvalue())
+
+
+class BackgroundPayrollRunTests(PayrollFixturesMixin, TestCase):
+    def setUp(self):
+        for employee_id in ("1001", "1002", "1003"):
+            self.create_employee(employee_id)
+
+    @patch.object(background, "_executor")
+    def test_start_run_from_web_and_poll_progress(self, executor):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("payroll_runs"), {"month": 4, "year": 2025}
+            )
+        self.assertEqual(response.status_code, 202)
+        data = response.json()
+        self.assertEqual((data["status"], data["processed"]), ("pending", 0))
+        payroll_run = PayrollRun.objects.get(pk=data["id"])
+        executor.return_value.submit.assert_called_once_with(
+            background._work, payroll_run.pk
+        )
+
+        # A second request for the same period is refused while it is queued.
+        response = self.client.post(reverse("payroll_runs"), {"month": 4, "year": 2025})
+        self.assertEqual(response.status_code, 409)
+
+        result = background.process_payroll_run(payroll_run.pk, chunk_size=2)
+        self.assertEqual(result.salaries_created, 3)
+        # Already claimed.
+        self.assertIsNone(background.process_payroll_run(payroll_run.pk))
+
+        progress = self.client.get(data["progress_url"]).json()
+        self.assertEqual(progress["status"], PayrollRun.COMPLETED)
+        self.assertEqual((progress["processed"], progress["total"]), (3, 3))
+        self.assertEqual(progress["percent"], 100.0)
+        self.assertIsNone(progress["eta_seconds"])
+
+        response = self.client.get(reverse("payroll_runs"))
+        self.assertContains(response, "3 / 3")
+
+    def test_invalid_requests(self):
+        response = self.client.post(
+            reverse("payroll_runs"), {"month": 13, "year": 2025}
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse("payroll_run_progress", args=[999]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_progress_eta(self):
+        started = timezone.now()
+        payroll_run = PayrollRun(
+            pk=1,
+            run_date=started,
+            run_version="2025-04",
+            status=PayrollRun.IN_PROGRESS,
+            total_structures=100,
+            started_at=started,
+        )
+        progress = background.payroll_progress(
+            payroll_run, 25, now=started + timedelta(seconds=5)
+        )
+        self.assertEqual(progress["rows_per_second"], 5.0)
+        self.assertEqual(progress["eta_seconds"], 15.0)
+
+    def test_queue_command_runs_pending_runs(self):
+        PayrollRun.objects.create(
+            run_date=timezone.now(), run_version="2025-04", month=4, year=2025
+        )
+        stdout = StringIO()
+        call_command("process_payroll_queue", stdout=stdout)
+        self.assertIn("3 salaries created", stdout.getvalue())
+        self.assertEqual(PayrollRun.objects.get().status, PayrollRun.COMPLETED)
+
+    @patch.object(background.connection, "close")
+    def test_runs_failing_before_they_start_are_marked_failed(self, close):
+        # Requeued after starting, but with no period to resume.
+        payroll_run = PayrollRun.objects.create(
+            run_date=timezone.now(), run_version="legacy", started_at=timezone.now()
+        )
+        with self.assertLogs("payroll.background", "ERROR") as logs:
+            background._work(payroll_run.pk)
+        self.assertIn(f"Payroll run {payroll_run.pk} failed.", logs.output[0])
+        payroll_run.refresh_from_db()
+        self.assertEqual(payroll_run.status, PayrollRun.FAILED)
+        self.assertIn("has no recorded month and year", payroll_run.notes)
+        close.assert_called_once()
+
+    def test_one_open_run_per_period(self):
+        PayrollRun.objects.create(
+            run_date=timezone.now(), run_version="2025-04", month=4, year=2025
+        )
+        with self.assertRaises(PayrollRunError):
+            run_payroll(4, 2025)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            PayrollRun.objects.create(
+                run_date=timezone.now(),
+                run_version="2025-04-r2",
+                status=PayrollRun.IN_PROGRESS,
+                month=4,
+                year=2025,
+            )
+
+    @patch.object(background, "_executor")
+    def test_stale_runs_are_requeued_and_resumed(self, executor):
+        with self.assertRaises(RuntimeError):
+            with patch("payroll.engine.refresh_summaries", side_effect=RuntimeError):
+                run_payroll(4, 2025, chunk_size=2)
+        # Pretend the worker died while the run was in progress.
+        stale = PayrollRun.objects.get()
+        self.assertEqual(stale.checkpoints.count(), 2)
+        long_ago = timezone.now() - timedelta(hours=1)
+        PayrollRun.objects.filter(pk=stale.pk).update(
+            status=PayrollRun.IN_PROGRESS, updated_at=long_ago
+        )
+        stale.checkpoints.update(created_at=long_ago)
+        fresh = PayrollRun.objects.create(
+            run_date=timezone.now(),
+            run_version="2025-05",
+            status=PayrollRun.IN_PROGRESS,
+            month=5,
+            year=2025,
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaisesMessage(PayrollRunError, "already pending"):
+                background.submit_payroll_run(4, 2025)
+        executor.return_value.submit.assert_called_once_with(background._work, stale.pk)
+        self.assertEqual(background.requeue_stale_runs(), [])
+
+        stdout = StringIO()
+        call_command("process_payroll_queue", stdout=stdout)
+        # It carries on after its last checkpoint, which covered everyone.
+        self.assertIn("2025-04 (", stdout.getvalue())
+        self.assertIn("0 salaries created", stdout.getvalue())
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, PayrollRun.COMPLETED)
+        self.assertEqual(MonthlySalary.objects.filter(payroll_run=stale).count(), 3)
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.status, PayrollRun.IN_PROGRESS)
@@ -18,4 +18,27 @@ urlpatterns = [
         old_salary_structures,
         name="old_salary_structures",
     ),
+    path("payroll_runs/", payroll_runs, name="payroll_runs"),
+    path(
+        "payroll_runs/<int:payroll_run_id>/progress/",
+        payroll_run_progress,
+        name="payroll_run_progress",
+    ),
+    path(
+        "payroll_runs/<int:payroll_run_id>/bank_transfer/",
+        bank_transfer_file,
+        name="bank_transfer_file",
+    ),
+    path(
+        "payroll_runs/<int:payroll_run_id>/payslips/",
+        payslips_zip,
+        name="payslips_zip",
+    ),
+    path(
+        "payroll_runs/<int:payroll_run_id>/payslips/<int:employee_id>/",
+        payslip_detail,
+        name="payslip_detail",
+    ),
+    path("reports/<str:report>/", payroll_report, name="payroll_report"),
+    path("api/<str:resource>/", api_resource, name="api_resource"),
 ]
@@ -0,0 +1,153 @@
+"""
+Columnar structure calculator backed by NumPy.
+
+Structures arrive in integer paise and are flattened into arrays so every
+operation is exact, percentages are rounded by each component's rounding
+rule as in ``money.divide``, and totals are produced with segmented
+reductions over the structure index of each line; only building the result
+dicts of Decimals touches each value in Python. Results match
+``calculations.calculate_structures`` to the paisa and use the same shape, so
+this module is a drop-in backend for the payroll engine. Structures with
+formula components are handed to ``calculations.calculate_structure`` and
+merged back in order.
+"""
+
+import decimal
+from decimal import Decimal
+from itertools import chain, repeat
+from operator import itemgetter
+
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+from . import money
+from .calculations import calculate_structure
+from .models import SalaryComponent
+
+# Products above this bound could overflow int64 paise arithmetic.
+INT64_SAFE_PRODUCT = 2**62
+
+
+ROUNDING_CODES = {rule: code for code, rule in enumerate(money.ROUNDING_RULES)}
+
+# Every ``(mode, component_type, rounding)`` a line can have, so a line's
+# strings are read with one dict lookup and its flags with array indexing.
+LINE_KINDS = [
+    (mode, component_type, rounding)
+    for mode, _ in SalaryComponent.MODE_TYPES
+    for component_type, _ in SalaryComponent.COMPONENT_TYPES
+    for rounding in money.ROUNDING_RULES
+]
+KIND_CODES = {kind: code for code, kind in enumerate(LINE_KINDS)}
+
+
+def _to_decimals(paise):
+    """Convert an array of paise to a list of Decimals as ``money.to_decimal``."""
+    scaleb = decimal.getcontext().scaleb
+    return list(map(scaleb, map(Decimal, paise.tolist()), repeat(-2)))
+
+
+def _divide(numerator, denominator, rounding):
+    """
+    Divide by a positive integer, rounding each quotient by the rule whose
+    ``ROUNDING_CODES`` code is at the same position in ``rounding``.
+    """
+    # Floor division also works on the object arrays used against overflow.
+    quotient = numerator // denominator
+    remainder = numerator - quotient * denominator
+    twice = remainder * 2
+    # Whether to step up from the floor, per rule; see ``money.divide``.
+    up = np.select(
+        [
+            rounding == ROUNDING_CODES[money.HALF_UP],
+            rounding == ROUNDING_CODES[money.HALF_EVEN],
+            rounding == ROUNDING_CODES[money.DOWN],
+        ],
+        [
+            (twice > denominator) | ((twice == denominator) & (numerator > 0)),
+            (twice > denominator) | ((twice == denominator) & (quotient % 2 == 1)),
+            numerator < 0,
+        ],
+        default=numerator > 0,
+    ).astype(bool)
+    return quotient + ((remainder != 0) & up)
+
+
+def calculate_structures(structures):
+    """
+    Calculate a batch of ``(structure_id, employee_id, basic_pay, lines, ...)``
+    tuples and return one result dict per structure, in order.
+    """
+    if np is None:
+        raise ImproperlyConfigured("The numpy backend requires numpy.")
+    count = len(structures)
+    basic = np.fromiter(
+        (basic_pay for _, _, basic_pay, *_ in structures), dtype=np.int64, count=count
+    )
+    sizes = np.fromiter(
+        (len(structure[3]) for structure in structures), dtype=np.intp, count=count
+    )
+    lines = list(chain.from_iterable(structure[3] for structure in structures))
+    size = len(lines)
+    kinds = np.fromiter(
+        map(KIND_CODES.__getitem__, map(itemgetter(1, 2, 3), lines)),
+        dtype=np.intp,
+        count=size,
+    )
+    amount = np.fromiter(map(itemgetter(4), lines), dtype=np.int64, count=size)
+    segment = np.repeat(np.arange(count), sizes)
+
+    modes, types, rules = (np.array(column) for column in zip(*LINE_KINDS))
+    is_formula = (modes == SalaryComponent.FORMULA)[kinds]
+    is_percentage = (modes == SalaryComponent.PERCENTAGE)[kinds]
+    is_earning = (types == SalaryComponent.EARNING)[kinds]
+    rounding = np.array([ROUNDING_CODES[rule] for rule in rules.tolist()])[kinds]
+
+    line_basic = basic[segment]
+    if size and (
+        int(np.abs(line_basic).max()) * int(np.abs(amount).max()) >= INT64_SAFE_PRODUCT
+    ):
+        line_basic = line_basic.astype(object)
+        amount = amount.astype(object)
+    # A percentage line stores the rate in paise (12.50% -> 1250), so the
+    # paise value is basic * rate / 100 / 100.
+    values = np.where(
+        is_percentage, _divide(line_basic * amount, 10000, rounding), amount
+    ).astype(np.int64)
+
+    earnings = np.zeros(count, dtype=np.int64)
+    deductions = np.zeros(count, dtype=np.int64)
+    np.add.at(earnings, segment, np.where(is_earning, values, 0))
+    np.add.at(deductions, segment, np.where(is_earning, 0, values))
+    gross = basic + earnings
+    net = gross - deductions
+
+    decimals = _to_decimals(np.concatenate((values, earnings, deductions, gross, net)))
+    totals = [
+        decimals[start : start + count]
+        for start in range(size, size + 4 * count, count or 1)
+    ]
+    component_ids = list(map(itemgetter(0), lines))
+    bounds = np.concatenate(([0], np.cumsum(sizes))).tolist()
+    results = [
+        {
+            "components": dict(zip(component_ids[start:end], decimals[start:end])),
+            "earnings": earnings,
+            "deductions": deductions,
+            "gross": gross,
+            "net": net,
+        }
+        for start, end, earnings, deductions, gross, net in zip(
+            bounds, bounds[1:], *totals
+        )
+    ]
+    # Structures with formula components are calculated one at a time.
+    formulas = np.zeros(count, dtype=bool)
+    formulas[segment[is_formula]] = True
+    for index in np.flatnonzero(formulas).tolist():
+        results[index] = calculate_structure(*structures[index][2:4])
+    return results
@@ -1,42 +1,181 @@
-from datetime import datetime, timedelta
+import json
+import sys
+from datetime import datetime
+from functools import partial
 
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery, Value
+from django.db.models.functions import Concat, Lower
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseBadRequest,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, quote_etag
+from django.views.decorators.http import require_safe
 from django.views.generic import ListView
 
-from .models import Employee, SalaryStructure, SalaryStructureLine, SalaryComponent
+from .api import RESOURCES, ApiError, read_page
+from .background import (
+    aprocessed_structures,
+    payroll_progress,
+    submit_payroll_run,
+    with_processed,
+)
+from .engine import PayrollRunError
+from .exports import (
+    CSV,
+    FIXED,
+    FORMATS,
+    fixed_width_errors,
+    iter_bank_transfer_file,
+)
+from .formulas import FormulaError
+from .money import parse_amount
+from .page_cache import cached_employee_page
+from .payslips import iter_payslip_chunks, iter_payslip_zip, render_payslip
+from .reports import REPORTS, iter_report_csv, report_rows
+from .models import (
+    Employee,
+    MonthlySalary,
+    PayrollRun,
+    SalaryStructure,
+    SalaryStructureLine,
+)
+from .registry import component_registry
+
+
+def _prefix(lookup, prefix):
+    """
+    Values of ``lookup`` starting with the expression ``prefix``, as a range
+    an index can serve; ``LIKE 'prefix%'`` is a full scan on SQLite.
+    """
+    return Q(
+        **{
+            f"{lookup}__gte": prefix,
+            f"{lookup}__lt": Concat(prefix, Value(chr(sys.maxunicode))),
+        }
+    )
 
 
 class EmployeeListView(ListView):
+    """
+    Employees ordered by ``employee_id`` with keyset pagination.
+
+    ``?after=<employee_id>`` and ``?before=<employee_id>`` move between pages
+    so every page is an indexed range scan, however deep it is. ``?q=`` filters
+    by employee id or name prefix and ``?show_pay=1`` adds the gross and net
+    pay of the active structure.
+    """
+
     model = Employee
     template_name = "payroll/employee_list.html"
     context_object_name = "employees"
+    page_size = 50
+
+    def get_queryset(self):
+        queryset = Employee.objects.order_by("employee_id")
+        search = self.request.GET.get("q", "").strip()
+        if search:
+            queryset = queryset.alias(name_lower=Lower("name")).filter(
+                _prefix("employee_id", Value(search))
+                | _prefix("name_lower", Lower(Value(search)))
+            )
+        if self.request.GET.get("show_pay"):
+            active = SalaryStructure.objects.filter(
+                employee=OuterRef("pk"), is_active=True
+            )
+            queryset = queryset.annotate(
+                gross_salary=Subquery(active.values("gross_amount")[:1]),
+                net_salary=Subquery(active.values("net_amount")[:1]),
+            )
+        return queryset
+
+    def get_context_data(self, **kwargs):
+        queryset = self.object_list
+        after = self.request.GET.get("after")
+        before = self.request.GET.get("before")
+        if before:
+            page = list(
+                queryset.filter(employee_id__lt=before).reverse()[: self.page_size + 1]
+            )
+            has_previous = len(page) > self.page_size
+            employees = page[: self.page_size][::-1]
+            has_next = True
+        else:
+            if after:
+                queryset = queryset.filter(employee_id__gt=after)
+            page = list(queryset[: self.page_size + 1])
+            has_next = len(page) > self.page_size
+            employees = page[: self.page_size]
+            has_previous = bool(after)
+
+        params = self.request.GET.copy()
+        for key in ("after", "before"):
+            params.pop(key, None)
+        return super().get_context_data(
+            object_list=employees,
+            query=params.urlencode(),
+            search=self.request.GET.get("q", ""),
+            show_pay=bool(self.request.GET.get("show_pay")),
+            next_after=employees[-1].employee_id if has_next and employees else None,
+            previous_before=(
+                employees[0].employee_id if has_previous and employees else None
+            ),
+            **kwargs,
+        )
 
 
 def employee_detail(request, employee_id):
+    """
+    Employee page with the active structure's breakdown, served from the page
+    cache while nothing shown on it changes; see ``payroll.page_cache``.
+    """
+    return HttpResponse(
+        cached_employee_page(
+            employee_id, partial(_render_employee_detail, request, employee_id)
+        )
+    )
+
+
+def _render_employee_detail(request, employee_id):
     employee = get_object_or_404(Employee, employee_id=employee_id)
-    active_salary_structure = employee.salary_structures.filter(is_active=True).first()
-    old_salary_structures = employee.salary_structures.filter(is_active=False)
+    active_salary_structure = (
+        employee.salary_structures.filter(is_active=True).with_lines().first()
+    )
+    has_old_salary_structures = employee.salary_structures.filter(
+        is_active=False
+    ).exists()
     gross_salary = None
     net_salary = None
     if active_salary_structure:
         gross_salary = active_salary_structure.gross_salary()
         net_salary = active_salary_structure.net_salary()
-    return render(
-        request,
+    return render_to_string(
         "payroll/employee_detail.html",
         {
             "employee": employee,
             "active_salary_structure": active_salary_structure,
-            "old_salary_structures": old_salary_structures,
+            "has_old_salary_structures": has_old_salary_structures,
             "gross_salary": gross_salary,
             "net_salary": net_salary,
         },
+        request,
     )
 
 
 def add_salary_structure(request, employee_id):
     employee = get_object_or_404(Employee, employee_id=employee_id)
-    active_salary_structure = employee.salary_structures.filter(is_active=True).first()
+    active_salary_structure = (
+        employee.salary_structures.filter(is_active=True).with_lines().first()
+    )
     if active_salary_structure:
         active_gross_salary = active_salary_structure.gross_salary()
         active_net_salary = active_salary_structure.net_salary()
@@ -44,7 +183,7 @@ def add_salary_structure(request, employee_id):
         active_gross_salary = None
         active_net_salary = None
 
-    components = SalaryComponent.objects.all()
+    components = component_registry.all()
 
     if request.method == "POST":
         effective_date = request.POST.get("effective_date")
@@ -53,11 +192,11 @@ def add_salary_structure(request, employee_id):
         description = request.POST.get("description", "")
         errors = {}
         try:
-            basic_pay_val = float(basic_pay)
+            basic_pay_val = parse_amount(basic_pay)
             if basic_pay_val < 0:
                 errors["basic_pay"] = "Must be positive."
-        except:
-            errors["basic_pay"] = "Invalid number."
+        except (TypeError, ValueError):
+            errors["basic_pay"] = "Invalid amount."
         try:
             effective_date_val = datetime.strptime(effective_date, "%Y-%m-%d").date()
         except:
@@ -69,6 +208,14 @@ def add_salary_structure(request, employee_id):
                     errors["end_date"] = "End date must be after effective date."
             except:
                 errors["end_date"] = "Invalid date."
+        amounts = {}
+        for comp in components:
+            comp_amount = request.POST.get(f"component_{comp.id}")
+            if comp_amount:
+                try:
+                    amounts[comp] = parse_amount(comp_amount)
+                except ValueError:
+                    errors["components"] = f"Invalid amount for {comp.name}."
         if errors:
             return render(
                 request,
@@ -81,33 +228,45 @@ def add_salary_structure(request, employee_id):
                     "active_salary_structure": active_salary_structure,
                 },
             )
-        existing_structures = employee.salary_structures.filter(is_active=True)
-        for structure in existing_structures:
-            if not structure.end_date or structure.end_date > effective_date_val:
-                structure.end_date = effective_date_val - timedelta(days=1)
-                structure.is_active = False
-                structure.save()
-        salary_structure = SalaryStructure.objects.create(
-            employee=employee,
-            effective_date=effective_date_val,
-            end_date=end_date if end_date else None,
-            basic_pay=basic_pay_val,
-            description=description,
-            is_active=True,
-        )
-        for comp in components:
-            comp_amount = request.POST.get(f"component_{comp.id}")
-            if comp_amount:
-                try:
-                    amount_val = float(comp_amount)
-                except:
-                    amount_val = 0
-                SalaryStructureLine.objects.create(
-                    salary_structure=salary_structure,
-                    salary_component=comp,
-                    amount=amount_val,
+        try:
+            with transaction.atomic():
+                # Saving an active structure closes the previously active one.
+                salary_structure = SalaryStructure.objects.create(
+                    employee=employee,
+                    effective_date=effective_date_val,
+                    end_date=end_date if end_date else None,
+                    basic_pay=basic_pay_val,
+                    description=description,
+                    is_active=True,
                 )
-        return redirect("employee_detail", employee_id=employee.employee_id)
+                for comp, amount in amounts.items():
+                    SalaryStructureLine.objects.create(
+                        salary_structure=salary_structure,
+                        salary_component=comp,
+                        amount=amount,
+                    )
+        except ValidationError as exc:
+            errors = {
+                field: " ".join(messages)
+                for field, messages in exc.message_dict.items()
+            }
+        except FormulaError as exc:
+            # A formula that is valid can still fail on these amounts, for
+            # example by dividing by a component the structure lacks.
+            errors = {"components": str(exc)}
+        else:
+            return redirect("employee_detail", employee_id=employee.employee_id)
+        return render(
+            request,
+            "payroll/add_salary_structure.html",
+            {
+                "employee": employee,
+                "components": components,
+                "errors": errors,
+                "data": request.POST,
+                "active_salary_structure": active_salary_structure,
+            },
+        )
     return render(
         request,
         "payroll/add_salary_structure.html",
@@ -123,9 +282,171 @@ def add_salary_structure(request, employee_id):
 
 def old_salary_structures(request, employee_id):
     employee = get_object_or_404(Employee, employee_id=employee_id)
-    old_salary_structures = employee.salary_structures.filter(is_active=False)
+    old_salary_structures = employee.salary_structures.filter(
+        is_active=False
+    ).with_lines()
     return render(
         request,
         "payroll/old_salary_structures.html",
         {"employee": employee, "old_salary_structures": old_salary_structures},
     )
+
+
+def bank_transfer_file(request, payroll_run_id):
+    payroll_run = get_object_or_404(
+        PayrollRun, pk=payroll_run_id, status=PayrollRun.COMPLETED
+    )
+    file_format = request.GET.get("format", CSV)
+    if file_format not in FORMATS:
+        raise Http404("Unknown bank transfer format.")
+    if file_format == FIXED:
+        errors = fixed_width_errors(payroll_run)
+        if errors:
+            return HttpResponse(
+                "\n".join(errors), status=409, content_type="text/plain"
+            )
+    extension = "csv" if file_format == CSV else "txt"
+    response = StreamingHttpResponse(
+        iter_bank_transfer_file(payroll_run, file_format),
+        content_type="text/csv" if file_format == CSV else "text/plain",
+    )
+    response["Content-Disposition"] = (
+        f'attachment; filename="bank_transfer_{payroll_run.run_version}.{extension}"'
+    )
+    return response
+
+
+def payslip_detail(request, payroll_run_id, employee_id):
+    salary = get_object_or_404(
+        MonthlySalary, payroll_run_id=payroll_run_id, employee__employee_id=employee_id
+    )
+    salaries = MonthlySalary.objects.filter(pk=salary.pk)
+    (payslip,) = next(iter_payslip_chunks(salaries))
+    return HttpResponse(render_payslip(payslip))
+
+
+def payslips_zip(request, payroll_run_id):
+    payroll_run = get_object_or_404(
+        PayrollRun, pk=payroll_run_id, status=PayrollRun.COMPLETED
+    )
+    response = StreamingHttpResponse(
+        iter_payslip_zip(payroll_run), content_type="application/zip"
+    )
+    response["Content-Disposition"] = (
+        f'attachment; filename="payslips_{payroll_run.run_version}.zip"'
+    )
+    return response
+
+
+def payroll_report(request, report):
+    """
+    A report read from the payroll summaries, as a table or, with
+    ``?format=csv``, as a CSV download. ``?month=`` and ``?year=`` narrow it.
+    """
+    if report not in REPORTS:
+        raise Http404("Unknown report.")
+    try:
+        month = int(request.GET["month"]) if request.GET.get("month") else None
+        year = int(request.GET["year"]) if request.GET.get("year") else None
+    except ValueError:
+        return HttpResponseBadRequest("Invalid month or year.")
+    if month is not None and not 1 <= month <= 12:
+        return HttpResponseBadRequest("Invalid month or year.")
+    if request.GET.get("format") == "csv":
+        response = StreamingHttpResponse(
+            iter_report_csv(report, month, year), content_type="text/csv"
+        )
+        response["Content-Disposition"] = f'attachment; filename="{report}.csv"'
+        return response
+    header, *rows = report_rows(report, month, year)
+    return render(
+        request,
+        "payroll/payroll_report.html",
+        {
+            "report": report,
+            "reports": REPORTS,
+            "header": header,
+            "rows": rows,
+            "month": month,
+            "year": year,
+        },
+    )
+
+
+def payroll_runs(request):
+    """
+    Recent payroll runs and a form to start one. A POST with ``month``,
+    ``year`` and optional ``as_of`` and ``incremental`` queues a run in the
+    background and answers 202 with its progress and polling URL.
+    """
+    if request.method == "POST":
+        try:
+            month = int(request.POST["month"])
+            year = int(request.POST["year"])
+            as_of = request.POST.get("as_of") or None
+            if as_of:
+                as_of = datetime.strptime(as_of, "%Y-%m-%d").date()
+            payroll_run = submit_payroll_run(
+                month,
+                year,
+                as_of=as_of,
+                incremental=bool(request.POST.get("incremental")),
+            )
+        except (KeyError, ValueError) as exc:
+            return JsonResponse({"error": str(exc)}, status=400)
+        except PayrollRunError as exc:
+            return JsonResponse({"error": str(exc)}, status=409)
+        return JsonResponse(
+            {
+                **payroll_progress(payroll_run, processed=0),
+                "progress_url": reverse("payroll_run_progress", args=[payroll_run.pk]),
+            },
+            status=202,
+        )
+
+    runs = with_processed(PayrollRun.objects.order_by("-pk"))[:20]
+    return render(
+        request,
+        "payroll/payroll_runs.html",
+        {
+            "payroll_runs": [payroll_progress(run, run.processed or 0) for run in runs],
+        },
+    )
+
+
+async def payroll_run_progress(request, payroll_run_id):
+    """
+    Progress of a run as JSON. Async, so frequent polling under ASGI does not
+    tie up a worker thread per request.
+    """
+    try:
+        payroll_run = await PayrollRun.objects.aget(pk=payroll_run_id)
+    except PayrollRun.DoesNotExist:
+        raise Http404("No such payroll run.")
+    processed = await aprocessed_structures(payroll_run.pk)
+    return JsonResponse(payroll_progress(payroll_run, processed))
+
+
+@require_safe
+def api_resource(request, resource):
+    """
+    A page of ``resource`` as JSON, see ``payroll.api``. The response carries
+    an ETag of the page's rows, so a client repeating a request with
+    ``If-None-Match`` gets an empty 304 when nothing on the page changed,
+    without its nested lists being read or the page rendered.
+    """
+    if resource not in RESOURCES:
+        raise Http404("Unknown resource.")
+    try:
+        page = read_page(resource, request.GET)
+    except ApiError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    etag = quote_etag(page.etag)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(
+            json.dumps(page.as_dict(), cls=DjangoJSONEncoder),
+            content_type="application/json",
+        )
+    response["ETag"] = etag
+    return response
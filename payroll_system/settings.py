@@ -122,3 +122,28 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Payroll
+
+# Alias of a cache in CACHES that shares the salary component registry between
+# processes; None keeps it per process.
+PAYROLL_COMPONENT_CACHE = None
+
+# Seconds a process keeps its salary components without a shared cache before
+# reloading them to pick up changes made by other processes; None keeps them
+# until this process changes a component.
+PAYROLL_COMPONENT_TTL_SECONDS = 60
+
+# Alias of a cache in CACHES holding rendered employee pages; None disables it.
+PAYROLL_PAGE_CACHE = "default"
+
+# Threads in each web process running payroll runs started from the web.
+PAYROLL_BACKGROUND_WORKERS = 1
+
+# Seconds without a checkpoint after which an in-progress run is taken to have
+# lost its worker and is requeued.
+PAYROLL_STALE_RUN_SECONDS = 30 * 60
+
+# Seconds the sync API stays behind the clock, so rows whose transactions have
+# not committed yet are not skipped; must exceed the longest write transaction.
+PAYROLL_API_SYNC_LAG_SECONDS = 60